@@ -0,0 +1,216 @@
+"""
+Admission control for conversions.
+
+Every conversion makes provider calls, so too many at once trip the
+provider's rate limits and slow everyone down. ``AdmissionController`` puts
+a gate in front of them:
+
+* at most ``max_active`` conversions run at once, and at most ``per_client``
+  per client;
+* token buckets refill at the provider's requests- and tokens-per-minute;
+* up to ``queue_size`` more conversions may be reserved or waiting for a
+  slot; waiting ones are admitted in FIFO order.
+
+A request that would exceed any of these is rejected up front with a
+``Rejected`` carrying a ``retry_after`` estimate (the server turns that into
+429 + ``Retry-After``) instead of piling up behind the others.
+
+``reserve`` only claims capacity; a ticket joins the FIFO queue when its
+owner calls ``wait``. A background job reserved in the request but not yet
+running therefore never holds up the tickets behind it.
+
+Limits, including ``per_client``, are configured for the whole server and
+divided between its ``processes`` (gunicorn workers), since each process
+admits independently. Each process keeps at least one slot, so with more
+processes than a limit allows the server-wide limit is the process count.
+"""
+import collections
+import math
+import threading
+import time
+
+# Retry-After for a busy server is a rough estimate; background work checks back sooner than that
+RETRY_INTERVAL = 5
+
+REASONS = ('client_limit', 'queue_full', 'rate_limited', 'queue_timeout')
+
+
+class Rejected(Exception):
+    """Raised when a conversion is not admitted"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Too many conversions ({reason.replace('_', ' ')}); retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Classic token bucket refilled at ``per_minute``; 0 means unlimited"""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until ``amount`` is available (0 if it is now)"""
+        if not self.rate:
+            return 0.0
+        self._refill(now)
+        if amount > self.capacity:
+            amount = self.capacity
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount, now):
+        if self.rate:
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+
+
+class Ticket:
+    def __init__(self, client_id, tokens):
+        self.client_id = client_id
+        self.tokens = tokens
+        self.reserved = True
+        self.active = False
+        self.admitted_at = None
+
+
+class AdmissionController:
+    """Concurrency limits, rate buckets and a bounded FIFO queue for conversions"""
+
+    def __init__(self, max_active=8, per_client=2, queue_size=32, queue_timeout=120,
+                 requests_per_minute=0, tokens_per_minute=0, processes=1):
+        processes = max(1, processes)
+        self.max_active = max(1, max_active // processes)
+        self.per_client = max(1, per_client // processes)
+        self.queue_size = max(0, queue_size // processes)
+        self.queue_timeout = queue_timeout
+        self.requests = TokenBucket(requests_per_minute / processes)
+        self.tokens = TokenBucket(tokens_per_minute / processes)
+
+        self._condition = threading.Condition()
+        self._queue = collections.deque()
+        self._active = 0
+        # Tickets reserved but not yet waiting (e.g. async jobs still in the job pool's queue)
+        self._reserved = 0
+        self._per_client = collections.Counter()
+        self._admitted = 0
+        self._rejected = collections.Counter()
+        # Moving average of how long a conversion holds its slot, for Retry-After
+        self._average_hold = 30.0
+
+    def reserve(self, client_id, tokens=0):
+        """Claim capacity for one conversion, or raise Rejected; follow with ``wait``"""
+        with self._condition:
+            now = time.monotonic()
+            if self._per_client[client_id] >= self.per_client:
+                self._reject('client_limit', self._average_hold)
+            pending = len(self._queue) + self._reserved
+            if self._active + pending >= self.max_active + self.queue_size:
+                self._reject('queue_full', self._queue_wait_estimate(pending + 1))
+            rate_wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+            if rate_wait > 0:
+                self._reject('rate_limited', rate_wait)
+
+            self.requests.take(1, now)
+            self.tokens.take(tokens, now)
+            ticket = Ticket(client_id, tokens)
+            self._per_client[client_id] += 1
+            self._reserved += 1
+            return ticket
+
+    def wait(self, ticket, timeout=None):
+        """Queue ``ticket`` and block until it reaches the front and a slot is free
+
+        Raises Rejected('queue_timeout') (and gives the place up) if that
+        takes longer than ``timeout`` seconds; None waits indefinitely.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            if ticket.reserved:
+                ticket.reserved = False
+                self._reserved -= 1
+                self._queue.append(ticket)
+            while not (self._queue and self._queue[0] is ticket and self._active < self.max_active):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._queue.remove(ticket)
+                    self._release_client(ticket.client_id)
+                    self._condition.notify_all()
+                    self._reject('queue_timeout', self._queue_wait_estimate(len(self._queue) + 1))
+                self._condition.wait(remaining)
+            self._queue.popleft()
+            self._active += 1
+            self._admitted += 1
+            ticket.active = True
+            ticket.admitted_at = time.monotonic()
+            # The next in line may also fit
+            self._condition.notify_all()
+
+    def release(self, ticket):
+        """Give back a ticket's slot (or queue place, if it never ran)"""
+        with self._condition:
+            if ticket.active:
+                self._active -= 1
+                ticket.active = False
+                held = time.monotonic() - ticket.admitted_at
+                self._average_hold = 0.8 * self._average_hold + 0.2 * held
+            elif ticket.reserved:
+                ticket.reserved = False
+                self._reserved -= 1
+            elif ticket in self._queue:
+                self._queue.remove(ticket)
+            else:
+                return
+            self._release_client(ticket.client_id)
+            self._condition.notify_all()
+
+    def admit(self, client_id, tokens=0, timeout=None):
+        """``reserve`` then ``wait``; returns the ticket to ``release``"""
+        ticket = self.reserve(client_id, tokens)
+        try:
+            self.wait(ticket, self.queue_timeout if timeout is None else timeout)
+        except BaseException:
+            self.release(ticket)
+            raise
+        return ticket
+
+    def admit_eventually(self, client_id, tokens=0):
+        """``admit`` for background work: instead of failing, back off after each rejection and retry"""
+        while True:
+            try:
+                return self.admit(client_id, tokens)
+            except Rejected as e:
+                time.sleep(min(e.retry_after, RETRY_INTERVAL))
+
+    def stats(self):
+        with self._condition:
+            return {
+                'active': self._active,
+                'waiting': len(self._queue),
+                'reserved': self._reserved,
+                'max_active': self.max_active,
+                'queue_size': self.queue_size,
+                'clients': len(self._per_client),
+                'admitted': self._admitted,
+                'rejected': dict(self._rejected),
+                'average_seconds': round(self._average_hold, 2),
+            }
+
+    def _release_client(self, client_id):
+        self._per_client[client_id] -= 1
+        if self._per_client[client_id] <= 0:
+            del self._per_client[client_id]
+
+    def _queue_wait_estimate(self, position):
+        return self._average_hold * math.ceil(position / self.max_active)
+
+    def _reject(self, reason, retry_after):
+        self._rejected[reason] += 1
+        raise Rejected(reason, max(1, int(math.ceil(retry_after))))
@@ -0,0 +1,265 @@
+"""
+Batch uploads: many PDFs, or ZIP archives of them, converted as one batch.
+
+Files are streamed into the upload folder one at a time (ZIP entries are read
+straight out of the archive, never extracted as a whole) and hashed on the
+way. Identical files in a batch are converted once, and files that match an
+existing project's original are linked to it instead of converted again.
+
+Every batch shares one bounded worker pool, and each conversion still goes
+through the server's admission control, so a large batch can't starve
+interactive uploads. Progress is written to ``<directory>/<id>.json`` after
+every change, so any server process can report it, and kept for ``ttl`` seconds.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+
+CHUNK_SIZE = 1024 * 1024
+BATCH_ID_RE = re.compile(r'[0-9a-f]{32}')
+FILE_STATES = ('queued', 'converting', 'done', 'failed', 'duplicate')
+
+
+class BatchError(ValueError):
+    """Raised for a batch that can't be accepted (bad archive, too many or too large files)"""
+
+
+def is_pdf_name(name):
+    return name.lower().endswith('.pdf')
+
+
+def iter_upload_entries(filename, stream, max_files):
+    """Yield (name, file object) for a PDF upload or for each PDF inside a ZIP upload"""
+    if is_pdf_name(filename):
+        yield filename, stream
+        return
+    if not filename.lower().endswith('.zip'):
+        raise BatchError(f"{filename}: only PDF and ZIP files are allowed")
+    try:
+        archive = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile:
+        raise BatchError(f"{filename}: not a valid ZIP archive")
+    with archive:
+        entries = [
+            info for info in archive.infolist()
+            if not info.is_dir() and is_pdf_name(info.filename)
+            and not info.filename.startswith('__MACOSX/')
+            and not os.path.basename(info.filename).startswith('.')
+        ]
+        if len(entries) > max_files:
+            raise BatchError(f"{filename}: more than {max_files} PDFs")
+        for info in entries:
+            try:
+                entry = archive.open(info)
+            except (RuntimeError, NotImplementedError) as e:
+                # Encrypted entries or an unsupported compression method
+                raise BatchError(f"{filename}: can't read {info.filename} ({e})")
+            with entry:
+                yield info.filename, entry
+
+
+def save_stream(stream, path, max_bytes):
+    """Copy ``stream`` to ``path`` in chunks, hashing as it goes; returns (sha256, size)"""
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, 'wb') as f:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise BatchError(f"File larger than {max_bytes // (1024 * 1024)}MB")
+                digest.update(chunk)
+                f.write(chunk)
+    except zipfile.BadZipFile as e:
+        os.remove(path)
+        raise BatchError(f"Corrupt archive entry: {e}")
+    except BaseException:
+        os.remove(path)
+        raise
+    return digest.hexdigest(), size
+
+
+class BatchTracker:
+    """Creates batches, runs their conversions and records per-file progress"""
+
+    def __init__(self, directory, store, convert, admission, workers=2, tokens_per_conversion=0,
+                 ttl=7 * 24 * 3600):
+        self.directory = directory
+        self.store = store
+        self.convert = convert
+        self.admission = admission
+        self.tokens_per_conversion = tokens_per_conversion
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batches')
+        self._lock = threading.Lock()
+        self._batches = {}
+        self._known_digests = {}
+
+    def create(self, client_id):
+        """Start collecting files for a new batch; returns its id"""
+        self._expire()
+        batch_id = uuid.uuid4().hex
+        known = {}
+        for project in self.store.list_projects():
+            if project.get('original_pdf_sha256'):
+                known.setdefault(project['original_pdf_sha256'], project['id'])
+        with self._lock:
+            self._batches[batch_id] = {
+                'id': batch_id,
+                'client_id': client_id,
+                'status': 'receiving',
+                'created_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+                'files': [],
+            }
+            self._known_digests[batch_id] = known
+        return batch_id
+
+    def add_file(self, batch_id, name, filename, path, digest, size):
+        """Record a received file; duplicates are linked rather than queued, and their upload removed"""
+        with self._lock:
+            batch = self._batches[batch_id]
+            entry = {
+                'index': len(batch['files']),
+                'name': name,
+                'filename': filename,
+                'sha256': digest,
+                'size': size,
+                'status': 'queued',
+                'project_id': None,
+                'error': None,
+            }
+            first = next((f for f in batch['files'] if f['sha256'] == digest and 'duplicate_of' not in f), None)
+            if first is not None:
+                entry.update(status='duplicate', duplicate_of=first['index'])
+            elif digest in self._known_digests[batch_id]:
+                entry.update(status='duplicate', project_id=self._known_digests[batch_id][digest])
+            else:
+                entry['path'] = path
+            batch['files'].append(entry)
+        if entry['status'] == 'duplicate':
+            os.remove(path)
+        return entry
+
+    def start(self, batch_id):
+        """Queue the batch's unique files for conversion"""
+        with self._lock:
+            batch = self._batches[batch_id]
+            batch['status'] = 'running'
+            batch['started_at'] = time.time()
+            queued = [f for f in batch['files'] if f['status'] == 'queued']
+            if not queued:
+                self._finish(batch)
+            self._save(batch)
+        for entry in queued:
+            self._executor.submit(self._convert, batch_id, entry)
+
+    def abort(self, batch_id):
+        """Drop a batch that failed while receiving, removing its saved uploads"""
+        with self._lock:
+            batch = self._batches.pop(batch_id, None)
+            self._known_digests.pop(batch_id, None)
+        for entry in (batch or {}).get('files', []):
+            if entry.get('path') and os.path.exists(entry['path']):
+                os.remove(entry['path'])
+
+    def stats(self):
+        with self._lock:
+            running = [b for b in self._batches.values() if b['status'] == 'running']
+            return {
+                'running': len(running),
+                'queued_files': sum(1 for b in running for f in b['files'] if f['status'] == 'queued'),
+            }
+
+    def _convert(self, batch_id, entry):
+        batch = self._batches[batch_id]
+        # Batches count as their own client, so a batch doesn't use up its sender's interactive uploads
+        ticket = self.admission.admit_eventually(f"batch:{batch['client_id']}", self.tokens_per_conversion)
+        with tracing.trace(f"{batch_id}-{entry['index']}", batch=batch_id, file=entry['name']) as trace:
+            try:
+                self._update(batch, entry, status='converting', started_at=time.time())
+                project = self.convert(entry.pop('path'), entry['filename'])
+                self._update(batch, entry, status='done', project_id=project['id'], finished_at=time.time())
+            except Exception as e:
+                print(f"Error converting {entry['name']} in batch {batch_id}: {e}")
+                self._update(batch, entry, status='failed', error=str(e), finished_at=time.time())
+            finally:
+                self.admission.release(ticket)
+            trace.log(status=entry['status'])
+
+    def _update(self, batch, entry, **fields):
+        with self._lock:
+            entry.update(fields)
+            if all(f['status'] in ('done', 'failed', 'duplicate') for f in batch['files']):
+                self._finish(batch)
+            self._save(batch)
+
+    def _finish(self, batch):
+        batch['status'] = 'done'
+        batch['finished_at'] = time.time()
+        # Files that duplicated another entry share its project
+        for f in batch['files']:
+            if 'duplicate_of' in f:
+                f['project_id'] = batch['files'][f['duplicate_of']]['project_id']
+        self._known_digests.pop(batch['id'], None)
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _save(self, batch):
+        record = {k: v for k, v in batch.items() if k != 'client_id'}
+        record['files'] = [{k: v for k, v in f.items() if k != 'path'} for f in batch['files']]
+        path = os.path.join(self.directory, f"{batch['id']}.json")
+        tmp_path = f"{path}.tmp.{threading.get_ident()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(record, f)
+        os.replace(tmp_path, path)
+        if batch['status'] == 'done':
+            self._batches.pop(batch['id'], None)
+
+    def get(self, batch_id):
+        """Return a batch's progress with per-file status and aggregate throughput, or None"""
+        if not BATCH_ID_RE.fullmatch(batch_id or ''):
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{batch_id}.json")) as f:
+                batch = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return dict(batch, summary=summarize(batch))
+
+
+def summarize(batch):
+    counts = {state: 0 for state in FILE_STATES}
+    for f in batch['files']:
+        counts[f['status']] += 1
+    converted = [f for f in batch['files'] if f['status'] == 'done']
+    start = batch.get('started_at')
+    end = batch.get('finished_at') or time.time()
+    elapsed = end - start if start else 0
+    converted_bytes = sum(f['size'] for f in converted)
+    return {
+        'total': len(batch['files']),
+        'counts': counts,
+        'bytes': sum(f['size'] for f in batch['files']),
+        'elapsed_s': round(elapsed, 1),
+        'files_per_minute': round(len(converted) / elapsed * 60, 2) if elapsed else 0,
+        'mb_per_minute': round(converted_bytes / (1024 * 1024) / elapsed * 60, 3) if elapsed else 0,
+    }
@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""
+Offline evaluation of conversion providers, models and prompts.
+
+Converts every fixture PDF in the corpus with each setting and records, per
+document: wall time, provider tokens and estimated cost, output size,
+whether pdflatex compiles the result, the first LaTeX error, and a token
+edit distance to the reference ``.tex``. Results go to a JSON report and a
+CSV next to it.
+
+    cd backend
+    python benchmarks/eval_harness.py --build-corpus      # typeset outputs_test/*.tex into fixtures
+    python benchmarks/eval_harness.py --live --record \\
+        --settings anthropic,anthropic:draft,openai --prompt terse=prompts/terse.txt
+    python benchmarks/eval_harness.py                     # replay the recordings, no network
+    python benchmarks/eval_harness.py --compare benchmarks/results/eval_baseline.json --fail-on-regression 5
+
+Settings:
+    anthropic, openai        the server's provider modules
+    anthropic:draft, ...     the provider's fast draft mode
+    anthropic+NAME           anthropic with the prompt from ``--prompt NAME=FILE``
+    pix2tex                  local pix2tex OCR, page by page (needs torch)
+
+The corpus is ``benchmarks/corpus/<name>.pdf`` with ``<name>.tex`` as the
+reference. ``--live --record`` saves each conversion to
+``benchmarks/recordings/<setting>/<name>.json`` (text, seconds, tokens and a
+hash of the prompt). Without ``--live`` those recordings are replayed, so
+scoring and compile checks run anywhere, without network or API keys; a
+recording made with a different prompt is reported as an error, not scored.
+"""
+import argparse
+import csv
+import glob
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+from load_benchmark import BACKEND_DIR, RESULTS_DIR, _git_revision, percentile
+from stub_provider import RECORDINGS_GLOBS
+
+sys.path.insert(0, BACKEND_DIR)
+
+CORPUS_DIR = os.path.join(BACKEND_DIR, 'benchmarks', 'corpus')
+RECORDINGS_DIR = os.path.join(BACKEND_DIR, 'benchmarks', 'recordings')
+DEFAULT_SETTINGS = 'anthropic,anthropic:draft,openai,openai:draft'
+PROVIDER_MODULES = {
+    'anthropic': 'models.anthropic_latex',
+    'openai': 'models.openai_latex',
+}
+# List prices in USD per million input/output tokens; edit to match your plan
+PRICES = {
+    'claude-sonnet-4-20250514': (3.00, 15.00),
+    'claude-3-5-haiku-20241022': (0.80, 4.00),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4o-mini': (0.15, 0.60),
+}
+COMPILE_TIMEOUT = 60
+CSV_FIELDS = ['setting', 'fixture', 'source', 'seconds', 'input_tokens', 'output_tokens', 'cost_usd',
+              'output_chars', 'compiled', 'latex_errors', 'first_error', 'compile_seconds',
+              'edit_distance', 'similarity', 'error']
+
+COMMENT_RE = re.compile(r'(?<!\\)%.*$', re.MULTILINE)
+LATEX_TOKEN_RE = re.compile(r'\\[A-Za-z]+|\\.|[A-Za-z]+|\d+|\S')
+
+
+# Scoring
+
+def latex_tokens(text):
+    """Commands, words, numbers and symbols, ignoring comments and whitespace"""
+    return LATEX_TOKEN_RE.findall(COMMENT_RE.sub('', text))
+
+
+def edit_distance(a, b):
+    """Levenshtein distance between two token lists"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, token in enumerate(a, start=1):
+        current = [i]
+        for j, other in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (token != other)))
+        previous = current
+    return previous[-1]
+
+
+def compile_check(latex):
+    """Run pdflatex; returns (compiled, error count, first error, seconds), or None without pdflatex"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tex_file = os.path.join(temp_dir, 'document.tex')
+        with open(tex_file, 'w', encoding='utf-8') as f:
+            f.write(latex)
+        start = time.perf_counter()
+        try:
+            subprocess.run(
+                ['pdflatex', '-interaction=nonstopmode', '-output-directory', temp_dir, tex_file],
+                capture_output=True, timeout=COMPILE_TIMEOUT
+            )
+        except FileNotFoundError:
+            return None
+        except subprocess.TimeoutExpired:
+            return False, 1, 'pdflatex timed out', COMPILE_TIMEOUT
+        seconds = time.perf_counter() - start
+        try:
+            with open(os.path.join(temp_dir, 'document.log'), encoding='utf-8', errors='replace') as f:
+                errors = [line[2:].strip() for line in f if line.startswith('! ')]
+        except OSError:
+            errors = []
+        compiled = os.path.exists(os.path.join(temp_dir, 'document.pdf'))
+        return compiled, len(errors), errors[0] if errors else None, seconds
+
+
+# Running settings
+
+class Setting:
+    """One provider/model/prompt combination to evaluate"""
+
+    def __init__(self, name, prompts):
+        self.name = name
+        base, _, variant = name.partition(':')
+        self.provider, _, self.prompt_name = base.partition('+')
+        self.draft = variant == 'draft'
+        self.prompt = prompts.get(self.prompt_name) if self.prompt_name else None
+        if self.provider not in PROVIDER_MODULES and self.provider != 'pix2tex':
+            raise ValueError(f"Unknown provider in setting '{name}'")
+        if self.prompt_name and self.prompt is None:
+            raise ValueError(f"Setting '{name}' needs --prompt {self.prompt_name}=FILE")
+
+    @property
+    def model(self):
+        if self.provider == 'pix2tex':
+            return None
+        module = importlib.import_module(PROVIDER_MODULES[self.provider])
+        return module.DRAFT_MODEL if self.draft else module.MODEL
+
+    @property
+    def prompt_sha256(self):
+        """Hash of the prompt a conversion sends, to tell whether a recording still applies
+
+        Providers without a PROMPT constant build their prompts inline, so
+        their whole module is hashed instead.
+        """
+        if self.provider == 'pix2tex':
+            return None
+        if self.prompt is not None:
+            text = self.prompt
+        else:
+            module = importlib.import_module(PROVIDER_MODULES[self.provider])
+            text = getattr(module, 'PROMPT', None) or inspect.getsource(module)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def convert(self, pdf_path):
+        """Run the conversion live; returns (latex, seconds, input_tokens, output_tokens)"""
+        if self.provider == 'pix2tex':
+            start = time.perf_counter()
+            latex = pix2tex_latex(pdf_path)
+            return latex, time.perf_counter() - start, 0, 0
+
+        from metrics import PROVIDER_TOKENS
+        module = importlib.import_module(PROVIDER_MODULES[self.provider])
+        original_prompt = getattr(module, 'PROMPT', None)
+        if self.prompt is not None:
+            if original_prompt is None:
+                raise ValueError(f"{self.provider} has no PROMPT to replace")
+            module.PROMPT = self.prompt
+        before = _token_totals(PROVIDER_TOKENS, self.provider)
+        start = time.perf_counter()
+        try:
+            latex = module.generate_latex_from_pdf(pdf_path, draft=self.draft)
+        finally:
+            seconds = time.perf_counter() - start
+            if self.prompt is not None:
+                module.PROMPT = original_prompt
+        after = _token_totals(PROVIDER_TOKENS, self.provider)
+        return latex, seconds, after[0] - before[0], after[1] - before[1]
+
+
+def _token_totals(counter, provider):
+    values = counter.snapshot()
+    return (values.get(json.dumps([provider, 'input']), 0),
+            values.get(json.dumps([provider, 'output']), 0))
+
+
+def pix2tex_latex(pdf_path):
+    """Convert each page with pix2tex into a minimal document, one display formula per page"""
+    from pdf2image import convert_from_path
+    from pix2tex.cli import LatexOCR
+
+    model = LatexOCR()
+    lines = ['\\documentclass{article}', '\\usepackage{amsmath}', '\\begin{document}', '']
+    for i, page in enumerate(convert_from_path(pdf_path), start=1):
+        lines += [f"% Page {i}", '\\[', model(page), '\\]', '']
+    lines.append('\\end{document}')
+    return '\n'.join(lines)
+
+
+def recording_path(setting, fixture):
+    safe = re.sub(r'[^A-Za-z0-9._+-]', '_', setting)
+    return os.path.join(RECORDINGS_DIR, safe, f"{fixture}.json")
+
+
+def evaluate(setting, fixture, pdf_path, reference, live, record, check_compile):
+    row = {'setting': setting.name, 'fixture': fixture, 'source': 'live' if live else 'replay'}
+    path = recording_path(setting.name, fixture)
+    if live:
+        try:
+            latex, seconds, input_tokens, output_tokens = setting.convert(pdf_path)
+        except Exception as e:
+            return dict(row, error=str(e))
+        if record:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'setting': setting.name, 'model': setting.model, 'prompt_sha256': setting.prompt_sha256,
+                           'recorded_at': datetime.now().isoformat(), 'seconds': seconds, 'input_tokens': input_tokens, 'output_tokens': output_tokens,
+                           'latex': latex}, f, indent=2)
+    else:
+        try:
+            with open(path, encoding='utf-8') as f:
+                recording = json.load(f)
+        except OSError:
+            return dict(row, error='no recording')
+        # The setting name alone does not change when its prompt file does
+        if recording.get('prompt_sha256') != setting.prompt_sha256:
+            return dict(row, error='recorded with a different prompt; re-record with --live --record')
+        latex, seconds = recording['latex'], recording['seconds']
+        input_tokens, output_tokens = recording['input_tokens'], recording['output_tokens']
+
+    prices = PRICES.get(setting.model)
+    row.update(
+        seconds=round(seconds, 3),
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cost_usd=round((input_tokens * prices[0] + output_tokens * prices[1]) / 1e6, 5) if prices else 0,
+        output_chars=len(latex),
+    )
+    if check_compile:
+        result = compile_check(latex)
+        if result is not None:
+            compiled, errors, first_error, compile_seconds = result
+            row.update(compiled=compiled, latex_errors=errors, first_error=first_error,
+                       compile_seconds=round(compile_seconds, 3))
+
+    ours, theirs = latex_tokens(latex), latex_tokens(reference)
+    distance = edit_distance(ours, theirs)
+    row.update(edit_distance=distance,
+               similarity=round(1 - distance / max(len(ours), len(theirs), 1), 4))
+    return row
+
+
+# Corpus
+
+def load_corpus(directory, only=None):
+    fixtures = []
+    for pdf_path in sorted(glob.glob(os.path.join(directory, '*.pdf'))):
+        name = os.path.splitext(os.path.basename(pdf_path))[0]
+        tex_path = os.path.join(directory, f"{name}.tex")
+        if only and name not in only:
+            continue
+        if not os.path.exists(tex_path):
+            print(f"Skipping {name}: no reference {name}.tex")
+            continue
+        with open(tex_path, encoding='utf-8') as f:
+            fixtures.append((name, pdf_path, f.read()))
+    return fixtures
+
+
+def build_corpus(directory):
+    """Typeset the recorded outputs in outputs_test/ into fixture PDFs with their .tex as reference
+
+    Those outputs came from the providers themselves, so similarity against
+    them favours whichever setting produced them. Hand-check the references
+    (or replace them with the true sources) before trusting the scores.
+    """
+    os.makedirs(directory, exist_ok=True)
+    sources = sorted(path for pattern in RECORDINGS_GLOBS for path in glob.glob(pattern))
+    for source in sources:
+        name = os.path.splitext(os.path.basename(source))[0]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            shutil.copy(source, os.path.join(temp_dir, 'document.tex'))
+            try:
+                subprocess.run(['pdflatex', '-interaction=nonstopmode', 'document.tex'],
+                               cwd=temp_dir, capture_output=True, timeout=COMPILE_TIMEOUT)
+            except FileNotFoundError:
+                raise SystemExit('pdflatex not found; it is needed to build the corpus')
+            pdf = os.path.join(temp_dir, 'document.pdf')
+            if not os.path.exists(pdf):
+                print(f"  {name}: does not compile, skipped")
+                continue
+            shutil.copy(pdf, os.path.join(directory, f"{name}.pdf"))
+            shutil.copy(source, os.path.join(directory, f"{name}.tex"))
+            print(f"  {name}")
+
+
+# Reporting
+
+def summarize(rows):
+    summary = {}
+    for setting in dict.fromkeys(r['setting'] for r in rows):
+        done = [r for r in rows if r['setting'] == setting and 'similarity' in r]
+        compiled = [r for r in done if 'compiled' in r]
+        seconds = sorted(r['seconds'] for r in done)
+        first_errors = Counter(r['first_error'] for r in compiled if r.get('first_error'))
+        summary[setting] = {
+            'documents': len(done),
+            'failed': sum(1 for r in rows if r['setting'] == setting and r.get('error')),
+            'mean_seconds': round(sum(seconds) / len(seconds), 3) if seconds else None,
+            'p95_seconds': percentile(seconds, 95),
+            'input_tokens': sum(r['input_tokens'] for r in done),
+            'output_tokens': sum(r['output_tokens'] for r in done),
+            'cost_usd': round(sum(r['cost_usd'] for r in done), 4),
+            'mean_output_chars': round(sum(r['output_chars'] for r in done) / len(done)) if done else None,
+            'compile_rate': round(sum(r['compiled'] for r in compiled) / len(compiled), 3) if compiled else None,
+            'first_error_rate': round(sum(1 for r in compiled if r['latex_errors']) / len(compiled), 3) if compiled else None,
+            'top_first_errors': first_errors.most_common(3),
+            'mean_similarity': round(sum(r['similarity'] for r in done) / len(done), 4) if done else None,
+        }
+    return summary
+
+
+def print_table(summary):
+    header = (f"{'setting':<24} {'docs':>4} {'fail':>4} {'mean s':>8} {'p95 s':>8} {'tokens':>9} {'cost $':>8} "
+              f"{'compile':>7} {'1st err':>7} {'similar':>7}")
+    print(header)
+    print('-' * len(header))
+    for setting, s in summary.items():
+        print(f"{setting:<24} {s['documents']:>4} {s['failed']:>4} {s['mean_seconds']!s:>8} {s['p95_seconds']!s:>8} "
+              f"{s['input_tokens'] + s['output_tokens']:>9} {s['cost_usd']:>8} {s['compile_rate']!s:>7} "
+              f"{s['first_error_rate']!s:>7} {s['mean_similarity']!s:>7}")
+
+
+def compare(summary, baseline_path, threshold=None):
+    """Print the change against a saved report; returns True if within ``threshold`` percent"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)['summary']
+    ok = True
+    print(f"\nCompared with {baseline_path}:")
+    for setting, s in summary.items():
+        before = baseline.get(setting)
+        if not before:
+            continue
+        changes = []
+        for key, worse_if_higher in (('documents', False), ('failed', True), ('mean_similarity', False),
+                                     ('compile_rate', False), ('first_error_rate', True), ('mean_seconds', True),
+                                     ('cost_usd', True)):
+            if before.get(key) is None:
+                continue
+            if s.get(key) is None:
+                # Nothing left to measure (every document failed or lost its recording)
+                changes.append(f"{key} {before[key]} -> None")
+                if threshold is not None:
+                    ok = False
+                continue
+            if before[key]:
+                change = (s[key] - before[key]) / before[key] * 100
+            else:
+                # From zero (e.g. no errors before) any increase counts in full
+                change = 100.0 if s[key] else 0.0
+            changes.append(f"{key} {before[key]} -> {s[key]} ({change:+.1f}%)")
+            regression = change if worse_if_higher else -change
+            if threshold is not None and regression > threshold:
+                ok = False
+        print(f"  {setting:<24} " + ', '.join(changes))
+    return ok
+
+
+def write_csv(rows, path):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({key: row.get(key) for key in CSV_FIELDS})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate conversion providers, models and prompts on a fixture corpus')
+    parser.add_argument('--settings', default=DEFAULT_SETTINGS, help=f"comma-separated (default: {DEFAULT_SETTINGS})")
+    parser.add_argument('--prompt', action='append', default=[], metavar='NAME=FILE',
+                        help='add the setting anthropic+NAME using the prompt in FILE (repeatable)')
+    parser.add_argument('--corpus', default=CORPUS_DIR, help='directory of <name>.pdf + <name>.tex fixtures')
+    parser.add_argument('--fixtures', help='comma-separated fixture names to run (default: all)')
+    parser.add_argument('--build-corpus', action='store_true', help='typeset outputs_test/*.tex into the corpus and exit')
+    parser.add_argument('--live', action='store_true', help='call the providers (network, API keys) instead of replaying')
+    parser.add_argument('--record', action='store_true', help='with --live, save responses for later replay')
+    parser.add_argument('--no-compile', action='store_true', help='skip the pdflatex check')
+    parser.add_argument('--output', help='where to save the report (default: benchmarks/results/eval_<timestamp>.json)')
+    parser.add_argument('--compare', help='earlier report to compare against')
+    parser.add_argument('--fail-on-regression', type=float, metavar='PERCENT',
+                        help='exit 1 if a setting got worse than --compare by more than PERCENT')
+    args = parser.parse_args()
+
+    if args.build_corpus:
+        print(f"Building corpus in {args.corpus}")
+        build_corpus(args.corpus)
+        return
+    if args.record and not args.live:
+        parser.error('--record needs --live')
+
+    prompts = {}
+    for spec in args.prompt:
+        name, _, path = spec.partition('=')
+        if not name or not path:
+            parser.error(f"--prompt expects NAME=FILE, got '{spec}'")
+        with open(path, encoding='utf-8') as f:
+            prompts[name] = f.read()
+    names = [s.strip() for s in args.settings.split(',') if s.strip()]
+    names += [f"anthropic+{name}" for name in prompts if f"anthropic+{name}" not in names]
+    try:
+        settings = [Setting(name, prompts) for name in names]
+    except ValueError as e:
+        parser.error(str(e))
+
+    fixtures = load_corpus(args.corpus, set(args.fixtures.split(',')) if args.fixtures else None)
+    if not fixtures:
+        raise SystemExit(f"No fixtures in {args.corpus}; run with --build-corpus or add <name>.pdf + <name>.tex")
+    if args.live:
+        try:
+            from dotenv import load_dotenv
+            load_dotenv(os.path.join(BACKEND_DIR, '.env'))
+        except ImportError:
+            pass
+    check_compile = not args.no_compile and shutil.which('pdflatex') is not None
+    if not args.no_compile and not check_compile:
+        print('pdflatex not found; compile checks skipped')
+
+    print(f"{len(fixtures)} fixtures x {len(settings)} settings ({'live' if args.live else 'replay'})\n")
+    rows = []
+    for setting in settings:
+        for name, pdf_path, reference in fixtures:
+            row = evaluate(setting, name, pdf_path, reference, args.live, args.record, check_compile)
+            rows.append(row)
+            if row.get('error'):
+                print(f"  {setting.name} {name}: {row['error']}")
+            else:
+                print(f"  {setting.name} {name}: {row['seconds']}s, similarity {row['similarity']}, "
+                      f"compiled {row.get('compiled', '-')}")
+
+    summary = summarize(rows)
+    print()
+    print_table(summary)
+
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'settings': vars(args),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'git_revision': _git_revision(),
+        },
+        'summary': summary,
+        'results': rows,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"eval_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    csv_path = os.path.splitext(output)[0] + '.csv'
+    write_csv(rows, csv_path)
+    print(f"\nReport saved to {output} and {csv_path}")
+
+    if args.compare and not compare(summary, args.compare, args.fail_on_regression):
+        print(f"Regression beyond {args.fail_on_regression}%")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
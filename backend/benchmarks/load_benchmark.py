@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end load benchmark.
+
+Starts the stub provider and a LaScribe server on throwaway storage, then
+drives the API at each requested concurrency and reports throughput,
+p50/p95/p99 latency and server memory per scenario. No API credit is used.
+
+    cd backend
+    python benchmarks/load_benchmark.py                        # all scenarios, dev server
+    python benchmarks/load_benchmark.py --server gunicorn --workers 2 --threads 8 \\
+        --scenarios upload,crud --concurrency 1,8,32 --latency 3
+    python benchmarks/load_benchmark.py --compare benchmarks/results/baseline.json
+
+Scenarios:
+    upload   POST /api/upload-pdf with a generated PDF (provider call via the stub)
+    compile  POST /api/compile-latex with a recorded .tex (needs pdflatex)
+    crud     mix of list, get, search, PATCH delta and PUT on existing projects
+
+Results are written to ``benchmarks/results/<timestamp>.json``; ``--compare``
+prints the change against an earlier run and ``--fail-on-regression`` makes
+the command fail if throughput or p95 latency got worse by more than that
+many percent.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from stub_provider import load_recordings, start_stub
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, 'benchmarks', 'results')
+SCENARIOS = ('upload', 'compile', 'crud')
+SERVER_START_TIMEOUT = 60
+
+
+def make_pdf(pages=3):
+    """A minimal valid PDF with ``pages`` text pages"""
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>']
+    kids = ' '.join(f"{3 + 2 * i} 0 R" for i in range(pages))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>")
+    font_id = 3 + 2 * pages
+    for i in range(pages):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {4 + 2 * i} 0 R >>"
+        )
+        stream = f"BT /F1 18 Tf 72 720 Td (Benchmark page {i + 1}: x^2 + y^2 = z^2) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append('<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode('latin-1')
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('latin-1')
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode('latin-1')
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode('latin-1')
+    return bytes(out)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def process_tree_rss(pid):
+    """Resident memory in bytes of ``pid`` and its children (Linux /proc), or None"""
+    try:
+        pids = [pid]
+        children_path = f"/proc/{pid}/task/{pid}/children"
+        if os.path.exists(children_path):
+            with open(children_path) as f:
+                pids += [int(child) for child in f.read().split()]
+        total = 0
+        for p in pids:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+        return total
+    except (OSError, ValueError):
+        return None
+
+
+class Client:
+    """Tiny stdlib HTTP client; returns (status, body bytes, headers)"""
+
+    def __init__(self, base_url, timeout=300):
+        self.base_url = base_url
+        self.timeout = timeout
+
+    def request(self, method, path, body=None, headers=None):
+        data = body
+        headers = dict(headers or {})
+        if body is not None and not isinstance(body, bytes):
+            data = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        request = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.read(), response.headers
+        except urllib.error.HTTPError as e:
+            return e.code, e.read(), e.headers
+
+    def json(self, method, path, body=None):
+        status, data, _ = self.request(method, path, body)
+        return status, json.loads(data or b'null')
+
+    def upload(self, filename, pdf_bytes):
+        boundary = uuid.uuid4().hex
+        body = (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: application/pdf\r\n\r\n"
+        ).encode('utf-8') + pdf_bytes + f"\r\n--{boundary}--\r\n".encode('utf-8')
+        return self.request('POST', '/api/upload-pdf', body,
+                            {'Content-Type': f"multipart/form-data; boundary={boundary}"})
+
+
+class ServerProcess:
+    """A LaScribe server on temporary storage, pointed at the stub provider"""
+
+    def __init__(self, kind, provider_url, provider='anthropic', workers=2, threads=8, admission=False):
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.storage = tempfile.mkdtemp(prefix='lascribe-bench-')
+
+        env = dict(os.environ)
+        env.update({
+            'LASCRIBE_PROJECTS_FOLDER': os.path.join(self.storage, 'projects'),
+            'LASCRIBE_UPLOAD_FOLDER': os.path.join(self.storage, 'uploads'),
+            'LASCRIBE_OUTPUT_FOLDER': os.path.join(self.storage, 'outputs'),
+            'LASCRIBE_ORIGINALS_FOLDER': os.path.join(self.storage, 'originals'),
+            'LASCRIBE_PROVIDER': provider,
+            'LASCRIBE_HOST': '127.0.0.1',
+            'LASCRIBE_PORT': str(self.port),
+            'LASCRIBE_DEBUG': 'false',
+            'LASCRIBE_TRACE_LOG': 'false',
+            'ANTHROPIC_BASE_URL': provider_url,
+            'ANTHROPIC_API_KEY': 'stub',
+            'OPENAI_BASE_URL': f"{provider_url}/v1",
+            'OPENAI_API_KEY': 'stub',
+        })
+        if not admission:
+            # All benchmark traffic comes from one client; measure the server, not the limits
+            env.update({
+                'LASCRIBE_ADMISSION_MAX_ACTIVE': '100000',
+                'LASCRIBE_ADMISSION_PER_CLIENT': '100000',
+                'LASCRIBE_PROVIDER_RPM': '0',
+                'LASCRIBE_PROVIDER_TPM': '0',
+            })
+        if kind == 'gunicorn':
+            env.update({
+                'LASCRIBE_BIND': f"127.0.0.1:{self.port}",
+                'WEB_CONCURRENCY': str(workers),
+                'LASCRIBE_THREADS': str(threads),
+            })
+            command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app']
+        else:
+            command = [sys.executable, '-c',
+                       "from config import load_config; from server import create_app; "
+                       "config = load_config(); "
+                       "create_app(config).run(host=config['HOST'], port=config['PORT'], threaded=True)"]
+        self.log = open(os.path.join(self.storage, 'server.log'), 'w')
+        self.process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=self.log, stderr=subprocess.STDOUT)
+        self._wait_until_ready()
+
+    def _wait_until_ready(self):
+        client = Client(self.base_url, timeout=2)
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                if client.request('GET', '/api/health')[0] == 200:
+                    return
+            except OSError:
+                pass
+            time.sleep(0.2)
+        self.stop()
+        with open(os.path.join(self.storage, 'server.log')) as f:
+            raise SystemExit(f"Server did not start:\n{f.read()[-4000:]}")
+
+    def rss(self):
+        return process_tree_rss(self.process.pid)
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.log.close()
+        shutil.rmtree(self.storage, ignore_errors=True)
+
+
+class Scenario:
+    def __init__(self, client, recordings, seed=0):
+        self.client = client
+        self.recordings = recordings
+        self.random = random.Random(seed)
+        self.pdf = make_pdf(pages=3)
+        self.project_ids = []
+        self._lock = threading.Lock()
+
+    def setup(self, name):
+        """Seed projects for the crud scenario (through uploads, the only way the API creates them)"""
+        if name != 'crud' or self.project_ids:
+            return
+        for i in range(10):
+            status, data, _ = self.client.upload(f"seed-{i}.pdf", self.pdf)
+            if status == 200:
+                self.project_ids.append(json.loads(data)['project_id'])
+        if not self.project_ids:
+            raise RuntimeError('Could not seed projects for the crud scenario')
+
+    def run_once(self, name):
+        """Issue one request of scenario ``name``; returns True on success, 'rejected' on 429"""
+        if name == 'upload':
+            status, _, _ = self.client.upload('benchmark.pdf', self.pdf)
+            return 'rejected' if status == 429 else status == 200
+        if name == 'compile':
+            status, _, _ = self.client.request('POST', '/api/compile-latex',
+                                               {'latex': self.random.choice(self.recordings)})
+            return status == 200
+        return self._crud_once()
+
+    def _crud_once(self):
+        with self._lock:
+            project_id = self.random.choice(self.project_ids)
+            roll = self.random.random()
+        if roll < 0.4:
+            status, _ = self.client.json('GET', '/api/projects?fields=summary&limit=30')
+        elif roll < 0.6:
+            status, _ = self.client.json('GET', f"/api/projects/{project_id}")
+        elif roll < 0.7:
+            status, _ = self.client.json('GET', '/api/projects/search?q=%5Cfrac+integral')
+        elif roll < 0.9:
+            status, body = self.client.json('GET', f"/api/projects/{project_id}")
+            if status != 200:
+                return False
+            project = body['project']
+            edit = f"% benchmark edit {uuid.uuid4().hex[:8]}\n"
+            status, _ = self.client.json('PATCH', f"/api/projects/{project_id}", {
+                'delta': [[0, 0, edit]],
+                'base_revision': project['revision'],
+            })
+            # A concurrent edit of the same project is an expected conflict, not a failure
+            return status in (200, 409)
+        else:
+            status, body = self.client.json('GET', f"/api/projects/{project_id}")
+            if status != 200:
+                return False
+            status, _ = self.client.json('PUT', f"/api/projects/{project_id}", {
+                'latex_code': body['project']['latex_code'],
+            })
+        return status == 200
+
+
+def run_level(scenario, name, concurrency, total_requests, server):
+    """Run ``total_requests`` of one scenario with ``concurrency`` clients"""
+    latencies = []
+    errors = 0
+    rejected = 0
+    lock = threading.Lock()
+    peak_rss = [server.rss() or 0]
+    stop_sampling = threading.Event()
+
+    def sample_memory():
+        while not stop_sampling.wait(0.25):
+            rss = server.rss()
+            if rss:
+                peak_rss[0] = max(peak_rss[0], rss)
+
+    def one_request(_):
+        nonlocal errors, rejected
+        start = time.perf_counter()
+        try:
+            ok = scenario.run_once(name)
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            if ok == 'rejected':
+                rejected += 1
+                return
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    sampler = threading.Thread(target=sample_memory, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one_request, range(total_requests)))
+    wall = time.perf_counter() - started
+    stop_sampling.set()
+    sampler.join()
+
+    latencies.sort()
+    ms = lambda seconds: round(seconds * 1000, 1) if seconds is not None else None
+    return {
+        'scenario': name,
+        'concurrency': concurrency,
+        'requests': total_requests,
+        'errors': errors,
+        'rejected': rejected,
+        'duration_s': round(wall, 3),
+        'throughput_rps': round((total_requests - errors - rejected) / wall, 2) if wall else 0,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'max_ms': ms(latencies[-1] if latencies else None),
+        'peak_rss_mb': round(peak_rss[0] / (1024 * 1024), 1) if peak_rss[0] else None,
+    }
+
+
+def print_table(results):
+    header = f"{'scenario':<9} {'conc':>4} {'reqs':>5} {'err':>4} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'RSS MB':>7}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['scenario']:<9} {r['concurrency']:>4} {r['requests']:>5} {r['errors']:>4} "
+              f"{r['throughput_rps']:>8} {r['p50_ms']!s:>9} {r['p95_ms']!s:>9} {r['p99_ms']!s:>9} "
+              f"{r['peak_rss_mb']!s:>7}")
+
+
+def compare(results, baseline_path, threshold=None):
+    """Print the change against a saved run; returns True if within ``threshold`` percent"""
+    with open(baseline_path) as f:
+        baseline = {(r['scenario'], r['concurrency']): r for r in json.load(f)['results']}
+    ok = True
+    print(f"\nCompared with {baseline_path}:")
+    for r in results:
+        before = baseline.get((r['scenario'], r['concurrency']))
+        if not before:
+            continue
+        changes = []
+        for key, worse_if_higher in (('throughput_rps', False), ('p95_ms', True)):
+            if not before.get(key) or r.get(key) is None:
+                continue
+            change = (r[key] - before[key]) / before[key] * 100
+            changes.append(f"{key} {before[key]} -> {r[key]} ({change:+.1f}%)")
+            regression = change if worse_if_higher else -change
+            if threshold is not None and regression > threshold:
+                ok = False
+        print(f"  {r['scenario']:<9} c={r['concurrency']:<3} " + ', '.join(changes))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline load benchmark against a stub LLM provider')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated: upload,compile,crud')
+    parser.add_argument('--concurrency', default='1,4,16', help='comma-separated client concurrency levels')
+    parser.add_argument('--requests', type=int, default=40, help='requests per scenario and concurrency level')
+    parser.add_argument('--latency', type=float, default=1.0, help='stub provider mean latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.25, help='stub provider latency jitter in seconds')
+    parser.add_argument('--provider', choices=['anthropic', 'openai'], default='anthropic')
+    parser.add_argument('--server', choices=['dev', 'gunicorn'], default='dev')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    parser.add_argument('--admission', action='store_true',
+                        help="keep the server's admission limits (429s are counted as rejected)")
+    parser.add_argument('--output', help='where to save results (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--fail-on-regression', type=float, metavar='PERCENT',
+                        help='exit 1 if throughput or p95 is worse than --compare by more than PERCENT')
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    levels = [int(c) for c in args.concurrency.split(',')]
+
+    recordings = load_recordings()
+    stub, provider, provider_url = start_stub(latency=args.latency, jitter=args.jitter, seed=0)
+    print(f"Stub provider at {provider_url} ({args.latency}s ± {args.jitter}s, {len(recordings)} recordings)")
+    server = ServerProcess(args.server, provider_url, args.provider, args.workers, args.threads, args.admission)
+    print(f"Server ({args.server}) at {server.base_url}, idle RSS "
+          f"{(server.rss() or 0) / (1024 * 1024):.1f} MB\n")
+
+    results = []
+    try:
+        scenario = Scenario(Client(server.base_url), recordings)
+        for name in scenarios:
+            scenario.setup(name)
+            for concurrency in levels:
+                result = run_level(scenario, name, concurrency, args.requests, server)
+                results.append(result)
+                print(f"  {name} c={concurrency}: {result['throughput_rps']} req/s, "
+                      f"p95 {result['p95_ms']} ms, {result['errors']} errors, {result['rejected']} rejected")
+    finally:
+        server.stop()
+        stub.shutdown()
+
+    print()
+    print_table(results)
+
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'settings': vars(args),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'git_revision': _git_revision(),
+        },
+        'provider_requests': provider.requests,
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.compare and not compare(results, args.compare, args.fail_on_regression):
+        print(f"Regression beyond {args.fail_on_regression}%")
+        sys.exit(1)
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Worker startup benchmark.
+
+Measures, in fresh interpreters, how long ``import server`` and
+``create_app()`` take (what every gunicorn worker pays on boot), and lists the
+slowest imports from ``python -X importtime``.
+
+    cd backend
+    python benchmarks/startup_benchmark.py --runs 10
+    python benchmarks/startup_benchmark.py --compare benchmarks/results/startup-baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, 'benchmarks', 'results')
+
+PROBE = """
+import json, os, time
+start = time.perf_counter()
+import server
+imported = time.perf_counter()
+app = server.create_app()
+created = time.perf_counter()
+print(json.dumps({'import_ms': (imported - start) * 1000, 'create_app_ms': (created - imported) * 1000}))
+os._exit(0)
+"""
+
+
+def run_probe(storage, importtime=False):
+    env = dict(os.environ)
+    env.update({
+        'LASCRIBE_PROJECTS_FOLDER': os.path.join(storage, 'projects'),
+        'LASCRIBE_UPLOAD_FOLDER': os.path.join(storage, 'uploads'),
+        'LASCRIBE_OUTPUT_FOLDER': os.path.join(storage, 'outputs'),
+        'LASCRIBE_ORIGINALS_FOLDER': os.path.join(storage, 'originals'),
+    })
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', PROBE]
+    result = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"Startup probe failed:\n{result.stderr[-4000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(importtime_output, limit=15):
+    """Modules imported by the probe (and their direct imports), by cumulative import time"""
+    totals = {}
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        # The name is indented by two spaces per nesting level after one separator space
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= 1:
+            totals[name.strip()] = max(totals.get(name.strip(), 0), int(fields[1]))
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [{'module': name, 'cumulative_ms': round(us / 1000, 1)} for name, us in ranked]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure server import and app start-up time')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', help='where to save results (default: benchmarks/results/startup-<timestamp>.json)')
+    parser.add_argument('--compare', help='earlier startup results file to compare against')
+    args = parser.parse_args()
+
+    samples = []
+    with tempfile.TemporaryDirectory(prefix='lascribe-startup-') as storage:
+        for _ in range(args.runs):
+            samples.append(run_probe(storage)[0])
+        _, importtime_output = run_probe(storage, importtime=True)
+
+    summary = {}
+    for key in ('import_ms', 'create_app_ms'):
+        values = sorted(sample[key] for sample in samples)
+        summary[key] = {
+            'median': round(statistics.median(values), 1),
+            'min': round(values[0], 1),
+            'max': round(values[-1], 1),
+        }
+    imports = slowest_imports(importtime_output)
+
+    print(f"import server : median {summary['import_ms']['median']} ms "
+          f"(min {summary['import_ms']['min']}, max {summary['import_ms']['max']})")
+    print(f"create_app()  : median {summary['create_app_ms']['median']} ms "
+          f"(min {summary['create_app_ms']['min']}, max {summary['create_app_ms']['max']})")
+    print("\nSlowest imports (cumulative):")
+    for entry in imports:
+        print(f"  {entry['cumulative_ms']:>8} ms  {entry['module']}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['summary']
+        print(f"\nCompared with {args.compare}:")
+        for key in summary:
+            before, after = baseline[key]['median'], summary[key]['median']
+            change = (after - before) / before * 100 if before else 0
+            print(f"  {key}: {before} -> {after} ms ({change:+.1f}%)")
+
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'runs': args.runs,
+        'environment': {'python': platform.python_version(), 'platform': platform.platform()},
+        'summary': summary,
+        'slowest_imports': imports,
+        'samples': samples,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"startup-{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Anthropic and OpenAI APIs, for benchmarks.
+
+Answers ``POST /v1/messages`` (Anthropic) and ``POST /v1/chat/completions``
+(OpenAI) by replaying recorded ``.tex`` outputs from ``outputs_test/`` after a
+configurable delay, with plausible ``usage`` token counts. Point the server at
+it with ``ANTHROPIC_BASE_URL=http://127.0.0.1:<port>`` or
+``OPENAI_BASE_URL=http://127.0.0.1:<port>/v1``.
+
+    python benchmarks/stub_provider.py --port 8089 --latency 2 --jitter 0.5
+"""
+import argparse
+import glob
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RECORDINGS_GLOBS = [
+    os.path.join(BACKEND_DIR, 'outputs_test', '*.tex'),
+    os.path.join(BACKEND_DIR, 'models', 'outputs_test', '*.tex'),
+]
+CHARS_PER_TOKEN = 4
+
+
+def load_recordings(patterns=RECORDINGS_GLOBS):
+    paths = sorted(path for pattern in patterns for path in glob.glob(pattern))
+    if not paths:
+        raise SystemExit('No recorded .tex files found in outputs_test/')
+    recordings = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            recordings.append(f.read())
+    return recordings
+
+
+class StubProvider:
+    """Replays recordings round-robin with ``latency`` ± ``jitter`` seconds of delay"""
+
+    def __init__(self, recordings, latency=0.0, jitter=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._recordings = itertools.cycle(recordings)
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def next_completion(self):
+        with self._lock:
+            self.requests += 1
+            text = next(self._recordings)
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+        time.sleep(delay)
+        return text
+
+    def make_handler(self):
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                input_tokens = max(1, len(body) // CHARS_PER_TOKEN)
+                if self.path.rstrip('/').endswith('/messages'):
+                    text = provider.next_completion()
+                    self._send_json({
+                        'id': f"msg_{uuid.uuid4().hex}",
+                        'type': 'message',
+                        'role': 'assistant',
+                        'model': 'stub',
+                        'content': [{'type': 'text', 'text': text}],
+                        'stop_reason': 'end_turn',
+                        'stop_sequence': None,
+                        'usage': {'input_tokens': input_tokens, 'output_tokens': len(text) // CHARS_PER_TOKEN},
+                    })
+                elif self.path.rstrip('/').endswith('/chat/completions'):
+                    text = provider.next_completion()
+                    output_tokens = len(text) // CHARS_PER_TOKEN
+                    self._send_json({
+                        'id': f"chatcmpl-{uuid.uuid4().hex}",
+                        'object': 'chat.completion',
+                        'created': int(time.time()),
+                        'model': 'stub',
+                        'choices': [{
+                            'index': 0,
+                            'message': {'role': 'assistant', 'content': text},
+                            'finish_reason': 'stop',
+                        }],
+                        'usage': {
+                            'prompt_tokens': input_tokens,
+                            'completion_tokens': output_tokens,
+                            'total_tokens': input_tokens + output_tokens,
+                        },
+                    })
+                else:
+                    self._send_json({'error': {'type': 'not_found', 'message': self.path}}, status=404)
+
+            def _send_json(self, payload, status=200):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def start_stub(host='127.0.0.1', port=0, latency=0.0, jitter=0.0, seed=None):
+    """Start the stub in a background thread; returns (server, provider, base_url)"""
+    provider = StubProvider(load_recordings(), latency, jitter, seed)
+    server = ThreadingHTTPServer((host, port), provider.make_handler())
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, provider, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stub Anthropic/OpenAI API replaying recorded LaTeX')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=2.0, help='mean response delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.5, help='uniform ± jitter in seconds')
+    args = parser.parse_args()
+
+    server, provider, base_url = start_stub(args.host, args.port, args.latency, args.jitter)
+    print(f"Stub provider listening on {base_url}")
+    print(f"  ANTHROPIC_BASE_URL={base_url}")
+    print(f"  OPENAI_BASE_URL={base_url}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Content-addressed blob storage.
+
+Blobs are stored once per SHA-256 of their uncompressed content, fanned out
+as ``<root>/<first two hex digits>/<digest><suffix>``. Text blobs are
+compressed with zstd when the ``zstandard`` package is installed and gzip
+otherwise; already-compressed data such as PDFs can be stored raw.
+"""
+import gzip
+import hashlib
+import os
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSORS = ('zstd', 'gzip', 'none')
+SUFFIXES = {'zstd': '.zst', 'gzip': '.gz', 'none': ''}
+CHUNK_SIZE = 1024 * 1024
+
+
+def sha256_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """Deduplicating, compressed blob store keyed by SHA-256"""
+
+    def __init__(self, directory, compression='auto', fsync=True):
+        if compression == 'auto':
+            compression = 'zstd' if zstandard else 'gzip'
+        if compression not in COMPRESSORS:
+            raise ValueError(f"Unknown compression '{compression}'")
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+        self.directory = directory
+        self.compression = compression
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, digest, compression=None):
+        suffix = SUFFIXES[compression or self.compression]
+        return os.path.join(self.directory, digest[:2], digest + suffix)
+
+    def _find(self, digest):
+        """Return (path, compression) for a stored blob, whatever it was written with"""
+        for compression in COMPRESSORS:
+            path = self._path(digest, compression)
+            if os.path.exists(path):
+                return path, compression
+        return None, None
+
+    def compress(self, data):
+        if self.compression == 'zstd':
+            return zstandard.ZstdCompressor(level=10).compress(data)
+        if self.compression == 'gzip':
+            return gzip.compress(data, compresslevel=9)
+        return data
+
+    def put(self, data):
+        """Store ``data`` and return its digest; identical content is stored once"""
+        digest = sha256_digest(data)
+        if self._find(digest)[0]:
+            return digest
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(self.compress(data))
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return digest
+
+    def put_file(self, source_path):
+        """Store a file's content and return its digest
+
+        Uncompressed blobs are hashed and copied in chunks, so large files are
+        never held in memory.
+        """
+        if self.compression != 'none':
+            with open(source_path, 'rb') as f:
+                return self.put(f.read())
+
+        tmp_path = os.path.join(self.directory, f"incoming.tmp.{os.getpid()}.{threading.get_ident()}")
+        digest = hashlib.sha256()
+        try:
+            with open(source_path, 'rb') as source, open(tmp_path, 'wb') as f:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            digest = digest.hexdigest()
+            if not self._find(digest)[0]:
+                path = self._path(digest)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            return digest
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def get(self, digest):
+        """Return a blob's content; raises KeyError if it is missing"""
+        path, compression = self._find(digest)
+        if path is None:
+            raise KeyError(digest)
+        with open(path, 'rb') as f:
+            data = f.read()
+        if compression == 'zstd':
+            if zstandard is None:
+                raise RuntimeError(f"Blob {digest} is zstd-compressed but 'zstandard' is not installed")
+            return zstandard.ZstdDecompressor().decompress(data)
+        if compression == 'gzip':
+            return gzip.decompress(data)
+        return data
+
+    def path(self, digest):
+        """Return the on-disk path of an uncompressed blob, or None"""
+        path, compression = self._find(digest)
+        return path if compression == 'none' else None
+
+    def modified_time(self, digest):
+        """When a blob was first written, as a POSIX timestamp"""
+        path, _ = self._find(digest)
+        return os.path.getmtime(path) if path else None
+
+    def stored_size(self, digest):
+        """Bytes a blob occupies on disk"""
+        path, _ = self._find(digest)
+        return os.path.getsize(path) if path else 0
+
+    def exists(self, digest):
+        return self._find(digest)[0] is not None
+
+    def delete(self, digest):
+        path, _ = self._find(digest)
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def digests(self):
+        """Iterate over every stored digest"""
+        for fanout in os.listdir(self.directory):
+            fanout_dir = os.path.join(self.directory, fanout)
+            if not os.path.isdir(fanout_dir):
+                continue
+            for name in os.listdir(fanout_dir):
+                if '.tmp.' in name:
+                    continue
+                yield name.split('.', 1)[0]
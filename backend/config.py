@@ -0,0 +1,92 @@
+"""
+Server configuration.
+
+Every setting has a default here and can be overridden with a ``LASCRIBE_``
+prefixed environment variable, e.g. ``LASCRIBE_PROJECTS_FOLDER=/data/projects``
+or ``LASCRIBE_CORS_ORIGINS=https://a.example,https://b.example``. Values are
+parsed according to the type of their default (bool, int or comma-separated list).
+"""
+import os
+
+try:
+    from dotenv import load_dotenv
+except ImportError:
+    load_dotenv = None
+
+DEFAULTS = {
+    # Storage
+    'PROJECTS_FOLDER': 'projects',
+    'UPLOAD_FOLDER': 'uploads',
+    'OUTPUT_FOLDER': 'outputs',
+    'ORIGINALS_FOLDER': 'uploads/originals',
+    'KEEP_ORIGINALS': True,  # needed to regenerate pages and serve /original-pdf
+    'MAX_CONTENT_LENGTH': 16 * 1024 * 1024,  # 16MB max file size
+
+    # HTTP
+    'STATIC_FOLDER': '../frontend/dist',
+    'CORS_ORIGINS': ['http://localhost:8080', 'http://127.0.0.1:8080'],
+    'HOST': 'localhost',
+    'PORT': 5001,
+    'DEBUG': False,
+
+    # Conversion
+    'PROVIDER': 'anthropic',
+    'CONVERSION_WORKERS': 4,
+    'COMPILE_WORKERS': os.cpu_count() or 2,
+    'COMPILE_TIMEOUT': 30,
+    'PROVIDER_TIMEOUT': 300,
+    'PROVIDER_MAX_CONNECTIONS': 20,
+    'PROGRESSIVE_CONVERSION': False,  # draft with the fast model first, refine in the background
+    'REFINE_WORKERS': 2,              # background refinements per process
+    'REFINE_SHARE': 25,               # percent of conversion slots and provider budget kept for refinements
+
+    # Admission control for conversions (server-wide; split across ADMISSION_PROCESSES)
+    'ADMISSION_MAX_ACTIVE': 8,
+    'ADMISSION_PER_CLIENT': 2,
+    'ADMISSION_QUEUE_SIZE': 32,
+    'ADMISSION_QUEUE_TIMEOUT': 120,
+    'ADMISSION_PROCESSES': int(os.environ.get('WEB_CONCURRENCY', 1)),
+    'ADMISSION_TOKENS_PER_CONVERSION': 12000,  # estimated input + output tokens
+    'PROVIDER_RPM': 50,      # 0 disables the limit
+    'PROVIDER_TPM': 400000,
+    'TRUST_PROXY_HEADERS': False,  # take the client from X-Forwarded-For
+    'JOB_TTL': 3600,
+
+    # Batch uploads (many PDFs or ZIP archives in one request)
+    'BATCH_WORKERS': 2,        # conversions per process shared by every batch
+    'BATCH_MAX_FILES': 200,
+    'BATCH_MAX_CONTENT_LENGTH': 256 * 1024 * 1024,  # whole request; each PDF is still held to MAX_CONTENT_LENGTH
+
+    # Observability
+    'TRACE_LOG': True,        # one JSON line per request with its spans
+    'PROFILE_ENABLED': False,  # allow ?profile=1 / X-Profile: 1 to cProfile a request
+    'PROFILE_TOKEN': '',       # if set, profiling also needs X-Profile-Token
+}
+
+TRUE_VALUES = {'1', 'true', 'yes', 'on'}
+
+
+def _parse(value, default):
+    if isinstance(default, bool):
+        return value.strip().lower() in TRUE_VALUES
+    if isinstance(default, int):
+        return int(value)
+    if isinstance(default, list):
+        return [item.strip() for item in value.split(',') if item.strip()]
+    return value
+
+
+def load_config(**overrides):
+    """Return the settings dict: defaults, then ``overrides``, then the environment
+
+    A ``.env`` file in the working directory is loaded first (API keys live there).
+    """
+    if load_dotenv is not None:
+        load_dotenv()
+    config = dict(DEFAULTS)
+    config.update(overrides)
+    for key, value in config.items():
+        env_value = os.environ.get(f"LASCRIBE_{key}")
+        if env_value is not None:
+            config[key] = _parse(env_value, value)
+    return config
@@ -0,0 +1,32 @@
+"""
+gunicorn settings for wsgi.py; see "Production" and its "Worker sizing" section in the README.
+
+Workers are separate processes, each with its own ProjectStore handle, search
+index and job pool; the store's file lock and log replay keep them consistent.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('LASCRIBE_BIND', '0.0.0.0:5001')
+
+# Threads handle I/O-bound requests (provider calls, file serving) within a worker
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count(), 4)))
+threads = int(os.environ.get('LASCRIBE_THREADS', 8))
+
+# Workers inherit this, so server-wide admission limits are split between them
+os.environ.setdefault('WEB_CONCURRENCY', str(workers))
+
+# Synchronous conversions can take minutes; async ones return immediately
+timeout = int(os.environ.get('LASCRIBE_WORKER_TIMEOUT', 300))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers occasionally to bound memory growth from PDF rendering
+max_requests = 1000
+max_requests_jitter = 100
+
+# Don't preload: each worker must open its own store files, locks and thread pools
+preload_app = False
+
+accesslog = '-'
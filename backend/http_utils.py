@@ -0,0 +1,27 @@
+"""Shared HTTP response helpers for the Flask apps"""
+import gzip
+
+from flask import request
+
+GZIP_MIN_SIZE = 1024
+GZIP_MIME_TYPES = {'application/json', 'text/plain', 'text/html', 'text/css', 'application/javascript'}
+
+
+def gzip_response(response, min_size=GZIP_MIN_SIZE):
+    """Gzip a buffered text/JSON response when the client accepts it (after_request hook)"""
+    if (response.direct_passthrough
+            or response.status_code < 200 or response.status_code >= 300
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in GZIP_MIME_TYPES
+            or 'gzip' not in request.headers.get('Accept-Encoding', '').lower()):
+        return response
+
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Content-Length'] = str(len(response.get_data()))
+    response.vary.add('Accept-Encoding')
+    return response
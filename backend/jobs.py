@@ -0,0 +1,155 @@
+"""
+Background jobs for long-running work (conversions and compiles).
+
+Jobs run on a bounded thread pool so request threads return immediately with
+a job id. Job status is written to ``<directory>/<id>.json`` (atomically), so
+with several server processes any of them can answer a status poll. Jobs can
+leave artifacts next to their status file; both are removed after ``ttl``
+seconds. Each job runs under its own trace, linked to the submitting request's
+id, and its span timings are saved with its status.
+
+Jobs run in the process that submitted them, which is recorded as the job's
+``owner``. ``recover`` fails the unfinished jobs of processes that have exited
+(a worker restart loses its in-memory pool), so they don't stay queued forever.
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+
+JOB_ID_RE = re.compile(r'[0-9a-f]{32}')
+
+
+class JobQueue:
+    """Bounded worker pool whose job status is visible to every process"""
+
+    def __init__(self, directory, workers=4, ttl=3600):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='jobs')
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queued = 0
+
+    def submit(self, kind, fn, *args, details=None):
+        """Queue ``fn(job_id, *args)``; its return value (a JSON-able dict) becomes the job result
+
+        ``details`` are saved with the job's status, for ``recover`` to clean up after it.
+        """
+        self._expire()
+        job_id = uuid.uuid4().hex
+        job = dict(details or {}, id=job_id, kind=kind, status='queued', created_at=time.time(),
+                   owner=process_token(os.getpid()))
+        parent = tracing.current()
+        if parent is not None:
+            job['request_id'] = parent.request_id
+        self._write(job_id, job)
+        with self._lock:
+            self._queued += 1
+        self._executor.submit(self._run, job_id, kind, fn, args)
+        return job_id
+
+    def _run(self, job_id, kind, fn, args):
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+        job = self.get(job_id) or {'id': job_id, 'kind': kind}
+        job.update(status='running', started_at=time.time())
+        self._write(job_id, job)
+        with tracing.trace(job_id, job=kind, parent_request_id=job.get('request_id')) as trace:
+            try:
+                job['result'] = fn(job_id, *args)
+                job['status'] = 'done'
+            except Exception as e:
+                print(f"Error in {kind} job {job_id}: {e}")
+                job['status'] = 'failed'
+                job['error'] = str(e)
+            finally:
+                with self._lock:
+                    self._active -= 1
+            trace.log(status=job['status'])
+        job['timings_ms'] = {name: round(ms, 1) for name, ms in trace.totals().items()}
+        job['finished_at'] = time.time()
+        self._write(job_id, job)
+
+    def get(self, job_id):
+        """Return a job's status dict, or None if unknown or expired"""
+        if not JOB_ID_RE.fullmatch(job_id or ''):
+            return None
+        try:
+            with open(self._status_path(job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def recover(self):
+        """Fail queued or running jobs whose owning process has exited; returns those jobs"""
+        orphans = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            job = self.get(name[:-5])
+            if job is None or job['status'] not in ('queued', 'running') or 'owner' not in job:
+                continue
+            if process_token(int(job['owner'].split(':')[0])) == job['owner']:
+                continue
+            job.update(status='failed', error='The server process running this job exited', finished_at=time.time())
+            self._write(job['id'], job)
+            orphans.append(job)
+        return orphans
+
+    def artifact_path(self, job_id, name):
+        """Where a job stores a result file called ``name``"""
+        return os.path.join(self.directory, f"{job_id}.{name}")
+
+    def stats(self):
+        with self._lock:
+            return {'active': self._active, 'queued': self._queued}
+
+    def _status_path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _write(self, job_id, job):
+        path = self._status_path(job_id)
+        tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+def process_token(pid):
+    """Identify a running process as '<pid>:<start time>', or None if it isn't running
+
+    The start time tells a pid reused after a restart apart from the original
+    process. Without /proc the token is just the pid.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # The command name may contain spaces; field 22 (start time) counts from after it
+            return f"{pid}:{f.read().rsplit(')', 1)[1].split()[19]}"
+    except OSError:
+        if os.path.isdir('/proc/self'):
+            return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return None
+    except PermissionError:
+        pass
+    return str(pid)
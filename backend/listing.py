@@ -0,0 +1,96 @@
+"""
+Project listing helpers: field projection and cursor-based pagination.
+
+Listings default to lightweight summaries so that browsing projects does not
+ship every document body. Cursors are opaque to clients; they encode the sort
+key and id of the last project on the previous page (keyset pagination), so
+pages stay stable while projects are created or deleted.
+"""
+import base64
+import json
+
+SUMMARY_FIELDS = ['id', 'name', 'filename', 'created_at', 'updated_at', 'latex_size', 'latex_stored_size',
+                  'page_count', 'revision', 'original_pdf_sha256', 'compiled_pdf_sha256', 'refinement']
+SORT_FIELDS = {'updated_at', 'created_at', 'name'}
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class ListingError(ValueError):
+    """Raised for malformed listing query parameters"""
+
+
+def summarize_project(project, fields=None):
+    """Project a project dict onto ``fields`` (summary fields by default)"""
+    fields = fields or SUMMARY_FIELDS
+    summary = {}
+    for field in fields:
+        if field == 'latex_size':
+            summary[field] = project.get('latex_size', len(project.get('latex_code', '')))
+        elif field == 'page_count':
+            summary[field] = project.get('page_count')
+        elif field in project:
+            summary[field] = project[field]
+    return summary
+
+
+def parse_fields(value):
+    """Parse a ``fields=`` parameter into a field list, or None for full projects"""
+    if not value or value == 'summary':
+        return list(SUMMARY_FIELDS)
+    if value == 'all':
+        return None
+    fields = [f.strip() for f in value.split(',') if f.strip()]
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
+
+def encode_cursor(sort, key, project_id):
+    raw = json.dumps([sort, key, project_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, key, project_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise ListingError('Invalid cursor')
+    # Keys are compared with the projects' (str, str) sort keys; anything else would raise TypeError there
+    if not isinstance(key, str) or not isinstance(project_id, str):
+        raise ListingError('Invalid cursor')
+    if cursor_sort != sort:
+        raise ListingError('Cursor does not match sort order')
+    return key, project_id
+
+
+def paginate_projects(projects, sort='updated_at', order='desc', limit=DEFAULT_LIMIT, cursor=None):
+    """Return one page of ``projects`` and the cursor for the next page (or None)"""
+    if sort not in SORT_FIELDS:
+        raise ListingError(f"Cannot sort by '{sort}'")
+    if order not in ('asc', 'desc'):
+        raise ListingError("Order must be 'asc' or 'desc'")
+    try:
+        limit = max(1, min(int(limit), MAX_LIMIT))
+    except (TypeError, ValueError):
+        raise ListingError('Limit must be an integer')
+
+    def sort_key(project):
+        return (project.get(sort) or '', project['id'])
+
+    ordered = sorted(projects, key=sort_key, reverse=(order == 'desc'))
+
+    if cursor:
+        after = tuple(decode_cursor(cursor, sort))
+        if order == 'desc':
+            ordered = [p for p in ordered if sort_key(p) < after]
+        else:
+            ordered = [p for p in ordered if sort_key(p) > after]
+
+    page = ordered[:limit]
+    next_cursor = None
+    if len(ordered) > limit:
+        last = page[-1]
+        next_cursor = encode_cursor(sort, last.get(sort) or '', last['id'])
+    return page, next_cursor
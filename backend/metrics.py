@@ -0,0 +1,312 @@
+"""
+Prometheus metrics for the API server.
+
+Counters, gauges and histograms are kept in memory per process. With several server
+processes (gunicorn workers) each one writes its values to
+``<directory>/<pid>.json`` every few seconds, and ``Exporter.collect()`` adds
+up every process's file, so a scrape of ``/api/metrics`` sees the whole server whichever
+worker answers it. Files left by exited workers are folded into
+``retired.json`` so counters never go backwards; their gauges are dropped,
+since a gauge describes a live process.
+
+Instrumenting code uses the module-level metrics and ``timed()``:
+
+    with timed('pdflatex'):
+        subprocess.run(...)
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from tracing import record_span
+
+FLUSH_INTERVAL = 5
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+RETIRED_FILE = 'retired.json'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def snapshot(self):
+        with self._lock:
+            return {json.dumps(key): _copy(value) for key, value in self._values.items()}
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value, **labels):
+        """Mirror a cumulative count kept elsewhere (e.g. an lru_cache's hits)"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # [per-bucket counts..., sum, count]
+            entry = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """Call ``collector()`` before every snapshot, to copy in values kept elsewhere"""
+        self._collectors.append(collector)
+
+    def snapshot(self):
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+        return {metric.name: metric.snapshot() for metric in self.metrics}
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'lascribe_stage_seconds',
+    'Time spent in each stage: upload_ingest, provider_call, postprocess, persist, pdflatex',
+    ['stage']
+))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'lascribe_http_request_seconds', 'HTTP request latency by route', ['method', 'route']
+))
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    'lascribe_http_requests_total', 'HTTP requests by route and status', ['method', 'route', 'status']
+))
+PROVIDER_TOKENS = REGISTRY.register(Counter(
+    'lascribe_provider_tokens_total', 'Tokens reported by the model provider', ['provider', 'direction']
+))
+UPLOAD_BYTES = REGISTRY.register(Counter(
+    'lascribe_upload_bytes_total', 'Bytes of PDF uploaded'
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    'lascribe_cache_requests_total', 'Cache lookups by cache and result (hit or miss)', ['cache', 'result']
+))
+ADMISSION_REJECTIONS = REGISTRY.register(Counter(
+    'lascribe_admission_rejections_total', 'Conversions turned away with 429, by reason', ['reason']
+))
+ERRORS = REGISTRY.register(Counter(
+    'lascribe_errors_total', 'Errors by stage and exception class', ['stage', 'error']
+))
+ADMISSION_ACTIVE = REGISTRY.register(Gauge(
+    'lascribe_admission_active', 'Conversions running, summed over server processes'
+))
+ADMISSION_WAITING = REGISTRY.register(Gauge(
+    'lascribe_admission_waiting', 'Conversions queued for a slot, summed over server processes'
+))
+ADMISSION_CAPACITY = REGISTRY.register(Gauge(
+    'lascribe_admission_capacity', 'Conversion slots, summed over server processes'
+))
+JOBS_ACTIVE = REGISTRY.register(Gauge(
+    'lascribe_jobs_active', 'Background jobs running, summed over server processes'
+))
+JOBS_QUEUED = REGISTRY.register(Gauge(
+    'lascribe_jobs_queued', 'Background jobs waiting for a worker, summed over server processes'
+))
+
+
+@contextmanager
+def timed(stage):
+    """Observe the block's duration under ``stage`` (and as a trace span); exceptions are counted by class and re-raised"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        ERRORS.inc(stage=stage, error=type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        record_span(stage, elapsed)
+
+
+def record_usage(provider, input_tokens, output_tokens):
+    PROVIDER_TOKENS.inc(input_tokens or 0, provider=provider, direction='input')
+    PROVIDER_TOKENS.inc(output_tokens or 0, provider=provider, direction='output')
+
+
+class Exporter:
+    """Shares this process's metrics with the others through ``directory``"""
+
+    def __init__(self, directory, registry=REGISTRY, interval=FLUSH_INTERVAL):
+        self.directory = directory
+        self.registry = registry
+        os.makedirs(directory, exist_ok=True)
+        self._path = os.path.join(directory, f"{os.getpid()}.json")
+        self._thread = threading.Thread(target=self._flush_loop, args=(interval,), daemon=True)
+        self._thread.start()
+
+    def _flush_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error writing metrics: {e}")
+
+    def flush(self, snapshot=None):
+        tmp_path = f"{self._path}.tmp.{threading.get_ident()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot or self.registry.snapshot(), f)
+        os.replace(tmp_path, self._path)
+
+    def collect(self):
+        """Sum of every live process's snapshot plus retired ones"""
+        own = self.registry.snapshot()
+        self.flush(own)
+        gauges = {metric.name for metric in self.registry.metrics if metric.kind == 'gauge'}
+        total = {}
+        with open(os.path.join(self.directory, 'metrics.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            retired_path = os.path.join(self.directory, RETIRED_FILE)
+            retired = _load(retired_path) or {}
+            retired_changed = False
+            for name in os.listdir(self.directory):
+                if not name.endswith('.json') or name == RETIRED_FILE:
+                    continue
+                path = os.path.join(self.directory, name)
+                snapshot = own if path == self._path else _load(path)
+                if snapshot is None:
+                    continue
+                if path != self._path and not _pid_alive(int(name[:-5])):
+                    _merge(retired, {name: series for name, series in snapshot.items() if name not in gauges})
+                    retired_changed = True
+                    os.remove(path)
+                    continue
+                _merge(total, snapshot)
+            if retired_changed:
+                with open(retired_path + '.tmp', 'w') as f:
+                    json.dump(retired, f)
+                os.replace(retired_path + '.tmp', retired_path)
+        _merge(total, retired)
+        return total
+
+
+def render(snapshot=None, registry=REGISTRY, extra_gauges=None):
+    """Prometheus text exposition of ``snapshot`` (default: this process only)"""
+    snapshot = snapshot if snapshot is not None else registry.snapshot()
+    lines = []
+    for metric in registry.metrics:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for key, value in sorted(snapshot.get(metric.name, {}).items()):
+            labels = list(zip(metric.labels, json.loads(key)))
+            if metric.kind in ('counter', 'gauge'):
+                lines.append(f"{metric.name}{_format_labels(labels)} {_format_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets, value[:-2]):
+                cumulative += count
+                lines.append(f"{metric.name}_bucket{_format_labels(labels + [('le', _format_number(bound))])} {cumulative}")
+            lines.append(f"{metric.name}_bucket{_format_labels(labels + [('le', '+Inf')])} {value[-1]}")
+            lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_number(value[-2])}")
+            lines.append(f"{metric.name}_count{_format_labels(labels)} {value[-1]}")
+    for name, (help_text, value) in (extra_gauges or {}).items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_format_number(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+def _merge(total, snapshot):
+    for name, series in snapshot.items():
+        target = total.setdefault(name, {})
+        for key, value in series.items():
+            if key not in target:
+                target[key] = _copy(value)
+            elif isinstance(value, list):
+                target[key] = [a + b for a, b in zip(target[key], value)]
+            else:
+                target[key] += value
+
+
+def _copy(value):
+    return list(value) if isinstance(value, list) else value
+
+
+def _load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = [
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    ]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Move LaTeX bodies out of projects.json into the compressed blob store.
+
+The server also does this in the background at startup; run this script to
+migrate ahead of time or, with --dry-run, to see the disk savings on a copy
+of the store without touching it.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+from project_store import ProjectStore
+
+
+def format_bytes(size):
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+def migrate(directory):
+    store = ProjectStore(directory, compact_interval=0)
+    try:
+        before = store.disk_usage()
+        report = store.migrate_to_blobs()
+        store.compact()
+        after = store.disk_usage()
+    finally:
+        store.close()
+    return before, report, after
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--directory', default='projects', help='project store directory')
+    parser.add_argument('--dry-run', action='store_true', help='migrate a temporary copy and only report')
+    args = parser.parse_args()
+
+    if args.dry_run:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            copy = os.path.join(temp_dir, 'projects')
+            shutil.copytree(args.directory, copy)
+            before, report, after = migrate(copy)
+    else:
+        before, report, after = migrate(args.directory)
+
+    total_before = sum(before.values())
+    total_after = sum(after.values())
+    print(f"Projects migrated:     {report['projects_migrated']}")
+    print(f"Inline LaTeX in JSON:  {format_bytes(report['inline_bytes'])}")
+    print(f"Compressed blobs:      {format_bytes(report['blob_bytes'])}")
+    print(f"Snapshot:              {format_bytes(before['snapshot_bytes'])} -> {format_bytes(after['snapshot_bytes'])}")
+    print(f"Total on disk:         {format_bytes(total_before)} -> {format_bytes(total_after)}")
+    if total_before:
+        print(f"Saved:                 {format_bytes(total_before - total_after)} "
+              f"({100 * (total_before - total_after) / total_before:.0f}%)")
+    if args.dry_run:
+        print("Dry run: nothing was changed")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,41 @@
 import os
 import sys
 import base64
+import threading
 from pathlib import Path
-from anthropic import Anthropic
-from dotenv import load_dotenv
 from datetime import datetime
 
-# Load environment variables
-load_dotenv()
+try:
+    from metrics import record_usage, timed
+    from tracing import span
+except ImportError:
+    # Run as a standalone script; metrics are only collected by the server
+    from contextlib import nullcontext as timed
+    from contextlib import nullcontext as span
 
-# Configure Anthropic client
-client = Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
+    def record_usage(provider, input_tokens, output_tokens):
+        pass
 
-def generate_latex_from_pdf(pdf_path):
-    """Generate LaTeX code from PDF using Anthropic Claude Sonnet 4"""
-    
-    try:
-        # Load and base64-encode the PDF file
-        with open(pdf_path, "rb") as f:
-            pdf_data = base64.standard_b64encode(f.read()).decode("utf-8")
-        
-        # Create the prompt text
-        prompt_text = """
+try:
+    from models.text import strip_code_fences
+except ImportError:
+    # Run as a standalone script from models/
+    from text import strip_code_fences
+
+# HTTP client settings; the server overrides these from its config with configure()
+CLIENT_SETTINGS = {
+    'timeout': 300.0,         # a long document can take minutes to generate
+    'connect_timeout': 10.0,
+    'max_connections': 20,
+    'max_retries': 2,
+}
+
+# Full-quality model, and the faster one used for progressive conversion drafts
+MODEL = "claude-sonnet-4-20250514"
+DRAFT_MODEL = "claude-3-5-haiku-20241022"
+
+# Instructions sent with the PDF (benchmarks/eval_harness.py compares variants of it)
+PROMPT = """
 Please convert this mathematical document to clean, compilable LaTeX code.
 
 CRITICAL REQUIREMENTS:
@@ -49,55 +63,159 @@ MATHEMATICAL CONTENT:
 - Use proper subscripts and superscripts
 
 DOCUMENT STRUCTURE:
+- Begin the LaTeX for each page of the PDF with a comment line "% Page N" (N = 1, 2, ...)
 - Use \\section* or \\subsection* for headers as appropriate
 - Organize content clearly with proper problem numbering
 - Maintain readability with appropriate line breaks
 - Ensure all mathematical expressions are properly enclosed
 
 The output should be publication-quality LaTeX that compiles without errors.
-        """
+"""
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+class ProviderNotConfigured(RuntimeError):
+    """Raised when the API key is missing"""
+
+
+def configure(**settings):
+    """Update CLIENT_SETTINGS; the client is rebuilt on next use"""
+    global _client
+    with _client_lock:
+        CLIENT_SETTINGS.update(settings)
+        _client = None
+
+
+def is_configured():
+    return bool(os.getenv('ANTHROPIC_API_KEY'))
+
+
+def get_client():
+    """Return this process's Anthropic client, creating it on first use
+
+    The SDK is imported here rather than at module load so importing this
+    module stays cheap. The client keeps a pool of keep-alive connections and
+    is rebuilt after a fork, so worker processes never share sockets.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            api_key = os.getenv('ANTHROPIC_API_KEY')
+            if not api_key:
+                raise ProviderNotConfigured('ANTHROPIC_API_KEY is not set')
+            import httpx
+            from anthropic import Anthropic
+
+            _client = Anthropic(
+                api_key=api_key,
+                max_retries=CLIENT_SETTINGS['max_retries'],
+                http_client=httpx.Client(
+                    timeout=httpx.Timeout(CLIENT_SETTINGS['timeout'], connect=CLIENT_SETTINGS['connect_timeout']),
+                    limits=httpx.Limits(
+                        max_connections=CLIENT_SETTINGS['max_connections'],
+                        max_keepalive_connections=CLIENT_SETTINGS['max_connections'],
+                        keepalive_expiry=60
+                    )
+                )
+            )
+            _client_pid = os.getpid()
+        return _client
+
+def generate_latex_from_pdf(pdf_path, draft=False):
+    """Generate LaTeX code from PDF using Anthropic Claude Sonnet 4 (or the faster DRAFT_MODEL)"""
+    # Configuration errors should fail the request, not become the document
+    client = get_client()
+    
+    try:
+        # Load and base64-encode the PDF file
+        with span('base64_encode'), open(pdf_path, "rb") as f:
+            pdf_data = base64.standard_b64encode(f.read()).decode("utf-8")
         
-        response = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=8000,  # Increased for longer documents
-            temperature=0,    # Set to 0 for more consistent formatting
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "document",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "application/pdf",
-                                "data": pdf_data
+        with timed('provider_call'):
+            response = client.messages.create(
+                model=DRAFT_MODEL if draft else MODEL,
+                max_tokens=8000,  # Increased for longer documents
+                temperature=0,    # Set to 0 for more consistent formatting
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "document",
+                                "source": {
+                                    "type": "base64",
+                                    "media_type": "application/pdf",
+                                    "data": pdf_data
+                                }
+                            },
+                            {
+                                "type": "text",
+                                "text": PROMPT
                             }
-                        },
-                        {
-                            "type": "text",
-                            "text": prompt_text
-                        }
-                    ]
-                }
-            ]
-        )
-        
-        # Clean up the response to remove any markdown artifacts
-        latex_content = response.content[0].text.strip()
+                        ]
+                    }
+                ]
+            )
+        record_usage('anthropic', response.usage.input_tokens, response.usage.output_tokens)
         
-        # Remove markdown code blocks if they appear
-        if latex_content.startswith("```latex"):
-            latex_content = latex_content[8:]  # Remove ```latex
-        if latex_content.startswith("```"):
-            latex_content = latex_content[3:]   # Remove ```
-        if latex_content.endswith("```"):
-            latex_content = latex_content[:-3]  # Remove trailing ```
-            
-        return latex_content.strip()
+        return strip_code_fences(response.content[0].text)
         
     except Exception as e:
         print(f"Error processing PDF: {e}")
-        return f"% Error processing PDF: {e}"
+        raise
+
+def generate_latex_from_image(image_path, page_num, model=MODEL):
+    """Generate the LaTeX body for one page (or part of a page) rendered as a PNG"""
+    client = get_client()
+
+    with span('base64_encode'), open(image_path, "rb") as f:
+        image_data = base64.standard_b64encode(f.read()).decode("utf-8")
+
+    prompt_text = f"""
+This image is page {page_num} (or part of it) of a mathematical document.
+Convert its content to LaTeX that will be pasted into the body of an existing document.
+
+- Output ONLY LaTeX body content: no \\documentclass, no preamble, no \\begin{{document}} or \\end{{document}}
+- No markdown code blocks and no explanations
+- Use amsmath environments (align, cases, ...) for equations, \\frac{{}}{{}} for fractions and \\textbf{{}} for problem labels
+- Preserve all mathematical symbols and notation exactly
+"""
+
+    try:
+        with timed('provider_call'):
+            response = client.messages.create(
+                model=model,
+                max_tokens=4000,
+                temperature=0,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "image",
+                                "source": {
+                                    "type": "base64",
+                                    "media_type": "image/png",
+                                    "data": image_data
+                                }
+                            },
+                            {
+                                "type": "text",
+                                "text": prompt_text
+                            }
+                        ]
+                    }
+                ]
+            )
+        record_usage('anthropic', response.usage.input_tokens, response.usage.output_tokens)
+        return strip_code_fences(response.content[0].text)
+
+    except Exception as e:
+        print(f"Error processing page {page_num}: {e}")
+        raise
 
 def process_pdf_to_latex(pdf_path, output_dir="outputs_test"):
     """Process PDF and generate LaTeX output"""
@@ -133,6 +251,9 @@ def process_pdf_to_latex(pdf_path, output_dir="outputs_test"):
     return output_file, final_document
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    
     # Default PDF file
     pdf_file = "Hw2.pdf"
     
@@ -2,19 +2,92 @@ import os
 import sys
 import base64
 from pathlib import Path
-from pdf2image import convert_from_path
-from openai import OpenAI
-from dotenv import load_dotenv
 from datetime import datetime
+import shutil
+import tempfile
+import threading
 
-# Load environment variables
-load_dotenv()
+try:
+    from metrics import record_usage, timed
+    from tracing import span
+except ImportError:
+    # Run as a standalone script; metrics are only collected by the server
+    from contextlib import nullcontext as timed
+    from contextlib import nullcontext as span
 
-# Configure OpenAI client
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    def record_usage(provider, input_tokens, output_tokens):
+        pass
+
+try:
+    from models.text import strip_code_fences
+except ImportError:
+    # Run as a standalone script from models/
+    from text import strip_code_fences
+
+# HTTP client settings; the server overrides these from its config with configure()
+CLIENT_SETTINGS = {
+    'timeout': 300.0,
+    'connect_timeout': 10.0,
+    'max_connections': 20,
+    'max_retries': 2,
+}
+
+# Full-quality model, and the faster one used for progressive conversion drafts
+MODEL = "gpt-4o"
+DRAFT_MODEL = "gpt-4o-mini"
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+class ProviderNotConfigured(RuntimeError):
+    """Raised when the API key is missing"""
+
+
+def configure(**settings):
+    """Update CLIENT_SETTINGS; the client is rebuilt on next use"""
+    global _client
+    with _client_lock:
+        CLIENT_SETTINGS.update(settings)
+        _client = None
+
+
+def is_configured():
+    return bool(os.getenv('OPENAI_API_KEY'))
+
+
+def get_client():
+    """Return this process's OpenAI client, creating it on first use (see anthropic_latex.get_client)"""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            api_key = os.getenv('OPENAI_API_KEY')
+            if not api_key:
+                raise ProviderNotConfigured('OPENAI_API_KEY is not set')
+            import httpx
+            from openai import OpenAI
+
+            _client = OpenAI(
+                api_key=api_key,
+                max_retries=CLIENT_SETTINGS['max_retries'],
+                http_client=httpx.Client(
+                    timeout=httpx.Timeout(CLIENT_SETTINGS['timeout'], connect=CLIENT_SETTINGS['connect_timeout']),
+                    limits=httpx.Limits(
+                        max_connections=CLIENT_SETTINGS['max_connections'],
+                        max_keepalive_connections=CLIENT_SETTINGS['max_connections'],
+                        keepalive_expiry=60
+                    )
+                )
+            )
+            _client_pid = os.getpid()
+        return _client
 
 def pdf_to_images(pdf_path, output_dir="temp_images"):
     """Convert PDF pages to images"""
+    # Imported here so the server doesn't load poppler bindings until a conversion needs them
+    from pdf2image import convert_from_path
+    
     os.makedirs(output_dir, exist_ok=True)
     
     print(f"Converting '{pdf_path}' to images...")
@@ -50,7 +123,7 @@ def improve_entire_latex_document(latex_content, total_pages):
     6. Add appropriate line breaks and spacing for readability
     7. Fix any missing or incorrect mathematical symbols
     8. Ensure consistent formatting throughout the entire document
-    9. Maintain the page-by-page structure with clear page separators
+    9. Maintain the page-by-page structure: keep every "% Page N" comment line exactly as it is
     10. Optimize the overall document flow and presentation
     
     Original LaTeX document:
@@ -60,31 +133,34 @@ def improve_entire_latex_document(latex_content, total_pages):
     """
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt}
-                    ],
-                }
-            ],
-            max_tokens=4000,
-            temperature=0.1
-        )
+        with timed('provider_call'):
+            response = get_client().chat.completions.create(
+                model=MODEL,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": prompt}
+                        ],
+                    }
+                ],
+                max_tokens=4000,
+                temperature=0.1
+            )
+        record_usage('openai', response.usage.prompt_tokens, response.usage.completion_tokens)
         
-        return response.choices[0].message.content.strip()
+        return strip_code_fences(response.choices[0].message.content)
         
     except Exception as e:
         print(f"Error improving document formatting: {e}")
         return latex_content  # Return original if improvement fails
 
-def generate_latex_from_image(image_path, page_num):
-    """Generate LaTeX code from a single image using OpenAI GPT-4o"""
+def generate_latex_from_image(image_path, page_num, model=MODEL):
+    """Generate LaTeX code from a single image using OpenAI GPT-4o (or ``model``)"""
     
     # Encode image to base64
-    base64_image = encode_image_to_base64(image_path)
+    with span('base64_encode'):
+        base64_image = encode_image_to_base64(image_path)
     data_url = f"data:image/png;base64,{base64_image}"
     
     # Create the prompt
@@ -92,6 +168,7 @@ def generate_latex_from_image(image_path, page_num):
     You are an expert at converting mathematical equations and expressions from images to LaTeX code.
     
     Please analyze the image on page {page_num} and convert all mathematical content to clean, properly formatted LaTeX code.
+    The code will be pasted into the body of an existing document.
     
     Requirements:
     1. Convert all mathematical expressions, equations, formulas, and symbols to LaTeX
@@ -100,31 +177,67 @@ def generate_latex_from_image(image_path, page_num):
     4. Maintain the structure and layout of the original content
     5. Only return the LaTeX code, no explanations or additional text
     6. If there are multiple equations, separate them appropriately
+    7. Output only body content: no \\documentclass, no preamble, no \\begin{{document}} or \\end{{document}}
+    8. Do not wrap the code in markdown code blocks
     
     Return only the LaTeX code:
     """
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {"type": "image_url", "image_url": {"url": data_url}},
-                    ],
-                }
-            ],
-            max_tokens=2000,
-            temperature=0.1
-        )
+        with timed('provider_call'):
+            response = get_client().chat.completions.create(
+                model=model,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": prompt},
+                            {"type": "image_url", "image_url": {"url": data_url}},
+                        ],
+                    }
+                ],
+                max_tokens=2000,
+                temperature=0.1
+            )
+        record_usage('openai', response.usage.prompt_tokens, response.usage.completion_tokens)
         
-        return response.choices[0].message.content.strip()
+        return strip_code_fences(response.choices[0].message.content)
         
     except Exception as e:
         print(f"Error processing page {page_num}: {e}")
-        return f"% Error processing page {page_num}: {e}"
+        raise
+
+def generate_latex_from_pdf(pdf_path, draft=False):
+    """Generate a complete LaTeX document from a PDF and return it as a string
+
+    A draft uses DRAFT_MODEL per page and skips the whole-document improvement pass.
+    """
+    # Configuration errors should fail the request, not become the document
+    get_client()
+    temp_dir = tempfile.mkdtemp(prefix='openai_latex_')
+    try:
+        with span('rasterize'):
+            image_paths = pdf_to_images(pdf_path, temp_dir)
+        
+        latex_content = [
+            "\\documentclass{article}",
+            "\\usepackage{amsmath}",
+            "\\usepackage{amssymb}",
+            "\\usepackage{graphicx}",
+            "\\begin{document}",
+            ""
+        ]
+        for i, image_path in enumerate(image_paths):
+            latex_content.append(f"% Page {i + 1}")
+            latex_content.append(generate_latex_from_image(image_path, i + 1, DRAFT_MODEL if draft else MODEL))
+            latex_content.append("")
+        latex_content.append("\\end{document}")
+        
+        if draft:
+            return '\n'.join(latex_content)
+        return improve_entire_latex_document('\n'.join(latex_content), len(image_paths))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
 
 def process_pdf_to_latex(pdf_path, output_dir="outputs_test", save_both_versions=False):
     """Process entire PDF and generate LaTeX output with two-pass improvement"""
@@ -156,7 +269,11 @@ def process_pdf_to_latex(pdf_path, output_dir="outputs_test", save_both_versions
         page_num = i + 1
         print(f"Processing page {page_num}/{len(image_paths)}...")
         
-        initial_latex = generate_latex_from_image(image_path, page_num)
+        try:
+            initial_latex = generate_latex_from_image(image_path, page_num)
+        except Exception as e:
+            # Keep going so the other pages still come out
+            initial_latex = f"% Error processing page {page_num}: {e}"
         
         latex_content.append(f"% Page {page_num}")
         latex_content.append(initial_latex)
@@ -192,13 +309,15 @@ def process_pdf_to_latex(pdf_path, output_dir="outputs_test", save_both_versions
     print(f"\n✅ Improved LaTeX output saved to: {improved_output_file}")
     
     # Clean up temporary images
-    import shutil
     shutil.rmtree(temp_dir, ignore_errors=True)
     print("Temporary images removed.")
     
     return improved_output_file
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    
     # Default PDF file
     pdf_file = "Hw 2.pdf"
     
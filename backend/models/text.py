@@ -0,0 +1,13 @@
+"""Post-processing shared by the provider modules"""
+
+
+def strip_code_fences(text):
+    """Clean up a response: remove markdown code block markers if the model added them"""
+    latex_content = text.strip()
+    if latex_content.startswith("```latex"):
+        latex_content = latex_content[8:]  # Remove ```latex
+    if latex_content.startswith("```"):
+        latex_content = latex_content[3:]   # Remove ```
+    if latex_content.endswith("```"):
+        latex_content = latex_content[:-3]  # Remove trailing ```
+    return latex_content.strip()
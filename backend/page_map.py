@@ -0,0 +1,64 @@
+"""
+Mapping between PDF pages and the LaTeX converted from them.
+
+Conversions start each page's LaTeX with a ``% Page N`` comment line. The
+markers travel with the text, so the mapping survives edits. Offsets stored
+at conversion time would go stale after the first keystroke. ``page_span``
+finds the text belonging to a page so that page can be regenerated and
+spliced back in place.
+
+``render_page`` rasterizes one page, or a region of it, for the provider.
+"""
+import re
+
+PAGE_MARKER_RE = re.compile(r'^[ \t]*% Page (\d+)[ \t]*$', re.MULTILINE)
+END_DOCUMENT_RE = re.compile(r'^[ \t]*\\end\{document\}', re.MULTILINE)
+RENDER_DPI = 200
+
+
+class PageMapError(ValueError):
+    """Raised for a page or region that can't be located"""
+
+
+def page_span(latex, page):
+    """(start, end) offsets of ``page``'s content: after its marker line, up to the next marker or \\end{document}"""
+    markers = list(PAGE_MARKER_RE.finditer(latex))
+    for i, marker in enumerate(markers):
+        if int(marker.group(1)) != page:
+            continue
+        start = marker.end() + 1 if latex[marker.end():marker.end() + 1] == '\n' else marker.end()
+        if i + 1 < len(markers):
+            return start, markers[i + 1].start()
+        end_document = END_DOCUMENT_RE.search(latex, start)
+        return start, end_document.start() if end_document else len(latex)
+    raise PageMapError(f"No '% Page {page}' marker in the LaTeX; send the span to replace instead")
+
+
+def parse_region(value):
+    """Validate a region given as [left, top, right, bottom] fractions of the page"""
+    if value is None:
+        return None
+    try:
+        left, top, right, bottom = (float(v) for v in value)
+    except (TypeError, ValueError):
+        raise PageMapError('Region must be [left, top, right, bottom] fractions of the page')
+    if not (0 <= left < right <= 1 and 0 <= top < bottom <= 1):
+        raise PageMapError('Region must be [left, top, right, bottom] with 0 <= left < right <= 1 and 0 <= top < bottom <= 1')
+    return left, top, right, bottom
+
+
+def render_page(pdf_path, page, output_path, region=None, dpi=RENDER_DPI):
+    """Rasterize one page (cropped to ``region`` if given) to a PNG at ``output_path``"""
+    # Imported here so the server doesn't load poppler bindings until a regeneration needs them
+    from pdf2image import convert_from_path
+
+    images = convert_from_path(pdf_path, dpi=dpi, first_page=page, last_page=page)
+    if not images:
+        raise PageMapError(f"Page {page} is not in the PDF")
+    image = images[0]
+    if region:
+        left, top, right, bottom = region
+        width, height = image.size
+        image = image.crop((int(left * width), int(top * height), int(right * width), int(bottom * height)))
+    image.save(output_path, 'PNG')
+    return output_path
@@ -0,0 +1,15 @@
+"""Small PDF helpers that don't need a PDF library"""
+import re
+
+PAGE_OBJECT_RE = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+
+
+def count_pdf_pages(pdf_path):
+    """Count page objects in a PDF, or return None if it can't be determined"""
+    try:
+        with open(pdf_path, 'rb') as f:
+            count = len(PAGE_OBJECT_RE.findall(f.read()))
+    except OSError:
+        return None
+    # Compressed object streams hide page objects from a byte scan
+    return count or None
@@ -0,0 +1,247 @@
+"""
+Thumbnail and page-preview cache for PDFs.
+
+Previews are rendered in a background thread pool and stored on disk under the
+SHA-256 of the PDF they came from:
+
+    <cache>/<first two hex digits>/<digest>/thumbnail.png
+    <cache>/<first two hex digits>/<digest>/page-<n>.png
+    <cache>/<first two hex digits>/<digest>/manifest.json
+
+Because entries are keyed by content they never go stale; the cache is bounded
+by ``max_bytes`` and evicts the least recently used entries (by directory
+mtime, refreshed on every hit). Rendering uses pdf2image (poppler), which is
+imported lazily; without it previews are simply unavailable.
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+THUMBNAIL_WIDTH = 240
+PAGE_DPI = 72
+MAX_PREVIEW_PAGES = 50
+STAGING_DIR = 'staging'
+# Staged sources and half-rendered entries older than this were left by a crashed process
+STALE_SECONDS = 3600
+DIGEST_RE = re.compile(r'[0-9a-f]{64}')
+
+
+def is_digest(value):
+    """True if ``value`` looks like a SHA-256 hex digest (safe to use in a path)"""
+    return bool(DIGEST_RE.fullmatch(value or ''))
+
+
+class PreviewCache:
+    """Bounded on-disk cache of PDF thumbnails and page images"""
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, workers=2):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.staging_dir = os.path.join(directory, STAGING_DIR)
+        os.makedirs(self.staging_dir, exist_ok=True)
+        self._remove_stale()
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='previews')
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._failed = {}
+        self._sizes = {}
+        for digest, entry_dir in self._entries():
+            self._sizes[digest] = _directory_size(entry_dir)
+
+    def _entry_dir(self, digest):
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def _entries(self):
+        for fanout in os.listdir(self.directory):
+            fanout_dir = os.path.join(self.directory, fanout)
+            if fanout == STAGING_DIR or not os.path.isdir(fanout_dir):
+                continue
+            for name in os.listdir(fanout_dir):
+                if not name.endswith('.tmp'):
+                    yield name, os.path.join(fanout_dir, name)
+
+    def _remove_stale(self):
+        cutoff = time.time() - STALE_SECONDS
+        paths = [os.path.join(self.staging_dir, name) for name in os.listdir(self.staging_dir)]
+        for fanout in os.listdir(self.directory):
+            fanout_dir = os.path.join(self.directory, fanout)
+            if fanout != STAGING_DIR and os.path.isdir(fanout_dir):
+                paths += [os.path.join(fanout_dir, name) for name in os.listdir(fanout_dir) if name.endswith('.tmp')]
+        for path in paths:
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path, ignore_errors=True)
+                    else:
+                        os.remove(path)
+            except OSError:
+                pass
+
+    def _claim(self, digest):
+        """Mark ``digest`` pending; False if it is already cached or being rendered by this process"""
+        with self._lock:
+            if digest in self._sizes or digest in self._pending:
+                return False
+            self._pending.add(digest)
+            self._failed.pop(digest, None)
+            return True
+
+    def _unclaim(self, digest, error):
+        with self._lock:
+            self._pending.discard(digest)
+            self._failed[digest] = str(error)
+
+    def schedule(self, digest, source_path):
+        """Render previews for the PDF at ``source_path`` in the background
+
+        The source is hard-linked (or copied) into the cache first, so callers
+        may delete it as soon as this returns. Every render stages its own
+        copy, so concurrent renders of one PDF (in this or another process)
+        never remove each other's source.
+        """
+        if not self._claim(digest):
+            return
+        staged = os.path.join(self.staging_dir, f"{digest}.{uuid.uuid4().hex}.pdf")
+        try:
+            try:
+                os.link(source_path, staged)
+            except OSError:
+                shutil.copyfile(source_path, staged)
+        except OSError as e:
+            self._unclaim(digest, e)
+            return
+        self._executor.submit(self._render, digest, staged)
+
+    def schedule_bytes(self, digest, data):
+        """Like ``schedule`` for a PDF held in memory"""
+        if not self._claim(digest):
+            return
+        fd, staged = tempfile.mkstemp(dir=self.staging_dir, prefix=f"{digest}.", suffix='.pdf')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+        except OSError as e:
+            os.remove(staged)
+            self._unclaim(digest, e)
+            return
+        self._executor.submit(self._render, digest, staged)
+
+    def _render(self, digest, source):
+        entry_dir = self._entry_dir(digest)
+        tmp_dir = None
+        try:
+            from pdf2image import convert_from_path, pdfinfo_from_path
+
+            # Render into a directory of our own and rename it into place when complete
+            os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+            tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(entry_dir), prefix=f"{digest}.", suffix='.tmp')
+            page_count = pdfinfo_from_path(source).get('Pages', 0)
+            rendered = min(page_count, MAX_PREVIEW_PAGES)
+
+            thumbnail = convert_from_path(source, first_page=1, last_page=1, size=(THUMBNAIL_WIDTH, None))
+            thumbnail[0].save(os.path.join(tmp_dir, 'thumbnail.png'), 'PNG', optimize=True)
+
+            # Render one page at a time to keep memory flat on long documents
+            for page in range(1, rendered + 1):
+                image = convert_from_path(source, dpi=PAGE_DPI, first_page=page, last_page=page)[0]
+                image.save(os.path.join(tmp_dir, f"page-{page}.png"), 'PNG', optimize=True)
+
+            with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+                json.dump({'page_count': page_count, 'rendered_pages': rendered, 'rendered_at': time.time()}, f)
+
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError:
+                if not os.path.isdir(entry_dir):
+                    raise
+                # Another process rendered the same PDF first; the entries are identical
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            with self._lock:
+                self._sizes[digest] = _directory_size(entry_dir)
+            self._evict()
+        except Exception as e:
+            print(f"Error rendering previews for {digest}: {e}")
+            if tmp_dir:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            with self._lock:
+                self._failed[digest] = str(e)
+        finally:
+            with self._lock:
+                self._pending.discard(digest)
+            try:
+                os.remove(source)
+            except OSError:
+                pass
+
+    def _evict(self):
+        with self._lock:
+            total = sum(self._sizes.values())
+            if total <= self.max_bytes:
+                return
+            by_age = sorted(self._sizes, key=lambda d: _mtime(self._entry_dir(d)))
+            for digest in by_age:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(self._entry_dir(digest), ignore_errors=True)
+                total -= self._sizes.pop(digest)
+
+    def status(self, digest):
+        """Return the preview manifest for ``digest`` with a 'status' of ready, pending, failed or missing"""
+        with self._lock:
+            if digest in self._pending:
+                return {'status': 'pending'}
+            if digest in self._failed:
+                return {'status': 'failed', 'error': self._failed[digest]}
+        try:
+            with open(os.path.join(self._entry_dir(digest), 'manifest.json')) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {'status': 'missing'}
+        return dict(manifest, status='ready')
+
+    def get(self, digest, name):
+        """Return the path of a cached image (``thumbnail.png`` or ``page-<n>.png``), or None"""
+        entry_dir = self._entry_dir(digest)
+        path = os.path.join(entry_dir, name)
+        if not os.path.exists(path):
+            return None
+        try:
+            # Mark as recently used for eviction
+            os.utime(entry_dir)
+        except OSError:
+            pass
+        return path
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._sizes),
+                'bytes': sum(self._sizes.values()),
+                'max_bytes': self.max_bytes,
+                'pending': len(self._pending),
+            }
+
+
+def _directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0
@@ -0,0 +1,560 @@
+"""
+Append-only project storage.
+
+Projects live in two files inside the storage directory:
+
+- ``projects.json``: a snapshot (the same JSON array format the app always used)
+- ``projects.log``: one JSON mutation record per line, applied on top of the snapshot
+
+Every write appends a small record to the log instead of rewriting every project,
+and the in-memory state is rebuilt by replaying the log over the snapshot.
+A background thread periodically compacts the log back into the snapshot.
+
+Writers hold an exclusive ``flock`` on ``projects.lock`` while appending, so
+several server processes can share one directory without losing each other's
+edits. Each process catches up on records written by the others before it
+reads or writes.
+
+Reads are served from an in-memory dict keyed by project id. The log only
+grows between compactions and compaction replaces it with a new inode, so a
+single ``stat`` comparing (inode, size) with what we last replayed tells us
+whether another process has written anything. With ``max_staleness`` set,
+even that ``stat`` is skipped for reads within the staleness window.
+
+Every change to a project's LaTeX bumps its ``revision``. Edits can be sent
+as deltas against a base revision (``patch_project``), which are logged as
+deltas rather than full documents; a stale base revision raises
+``RevisionConflict``. Each revision is also recorded in a per-project
+``RevisionHistory`` under ``history/``.
+
+LaTeX bodies are kept out of the metadata: each body is written to a
+compressed, content-addressed ``BlobStore`` under ``blobs/`` and projects
+only hold ``latex_blob`` (the SHA-256), ``latex_size`` (characters) and
+``latex_stored_size`` (compressed bytes). Listings and metadata updates never
+touch document text; ``get_project`` loads the body through a small LRU.
+Projects written before blob storage keep an inline ``latex_code`` until
+``migrate_to_blobs`` moves them over. Compaction deletes blobs no project
+references any more.
+
+Files attached to projects (such as the original PDF) go into their own
+``BlobStore`` per field, passed as ``attachments``; the project stores the
+digest in that field. Attachments are reference counted from the live
+projects, so identical uploads are stored once and a blob is removed when the
+last project referencing it is deleted.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from blob_store import BlobStore
+from revisions import RevisionHistory, apply_delta, make_delta
+
+SNAPSHOT_NAME = 'projects.json'
+LOG_NAME = 'projects.log'
+LOCK_NAME = 'projects.lock'
+HISTORY_DIR = 'history'
+BLOB_DIR = 'blobs'
+BODY_CACHE_SIZE = 256
+
+
+class RevisionConflict(Exception):
+    """Raised when an update is based on a revision that is no longer current"""
+
+    def __init__(self, project):
+        super().__init__(f"Project is at revision {project['revision']}")
+        self.project = project
+
+
+class ProjectStore:
+    """File-backed project store with an append-only mutation log"""
+
+    def __init__(self, directory, compact_threshold=4 * 1024 * 1024, compact_interval=60, fsync=True,
+                 max_staleness=0, attachments=None):
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_NAME)
+        self.log_path = os.path.join(directory, LOG_NAME)
+        self.lock_path = os.path.join(directory, LOCK_NAME)
+        self.compact_threshold = compact_threshold
+        self.fsync = fsync
+        self.max_staleness = max_staleness
+
+        os.makedirs(directory, exist_ok=True)
+        self.history = RevisionHistory(os.path.join(directory, HISTORY_DIR))
+        self.blobs = BlobStore(os.path.join(directory, BLOB_DIR), fsync=fsync)
+        self.attachments = attachments or {}
+        # Blobs are immutable, so cached bodies never need invalidating
+        self._read_body = lru_cache(maxsize=BODY_CACHE_SIZE)(self._read_body_uncached)
+
+        self._projects = {}
+        self._lock = threading.RLock()
+        self._lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._log_fd = None
+        self._log_inode = None
+        self._log_offset = 0
+        self._checked_at = 0.0
+
+        # Bumped for every applied record; cheap to compare for derived caches
+        self.version = 0
+        self._listeners = []
+        self._stats = {
+            'cache_hits': 0,
+            'cache_reloads': 0,
+            'full_reloads': 0,
+            'reload_seconds_total': 0.0,
+            'last_reload_seconds': 0.0,
+        }
+
+        # Group commit: a writer only fsyncs if nobody has synced its record yet
+        self._sync_lock = threading.Lock()
+        self._written_seq = 0
+        self._synced_seq = 0
+
+        with self._lock, self._file_lock(exclusive=True):
+            self._reload(repair=True)
+
+        self._stop = threading.Event()
+        self._compactor = None
+        if compact_interval:
+            self._compactor = threading.Thread(
+                target=self._compact_loop, args=(compact_interval,), daemon=True
+            )
+            self._compactor.start()
+
+    # Public API
+
+    def list_projects(self, include_latex=False):
+        """Return all projects in creation order, without LaTeX bodies unless asked"""
+        with self._lock:
+            self._refresh()
+            projects = list(self._projects.values())
+        if include_latex:
+            return [self._hydrate(p) for p in projects]
+        return [self._metadata(p) for p in projects]
+
+    def get_project(self, project_id, include_latex=True):
+        """Return a single project (with its LaTeX unless asked not to), or None if it does not exist"""
+        with self._lock:
+            self._refresh()
+            project = self._projects.get(project_id)
+        if project is None:
+            return None
+        return self._hydrate(project) if include_latex else self._metadata(project)
+
+    def refresh(self):
+        """Catch up with writes made by other processes"""
+        with self._lock:
+            self._refresh()
+
+    def subscribe(self, listener):
+        """Call ``listener(project_id)`` whenever a project changes, in this or another process
+
+        ``project_id`` is None after a full reload, when any project may have
+        changed. Listeners run with the store locked, so they must be quick and
+        must not call back into the store.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def stats(self):
+        """Return cache counters and sizes for monitoring"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['projects'] = len(self._projects)
+            stats['version'] = self.version
+            stats['log_bytes'] = self._log_offset
+            body_cache = self._read_body.cache_info()
+            stats['body_cache_hits'] = body_cache.hits
+            stats['body_cache_misses'] = body_cache.misses
+            return stats
+
+    def create_project(self, project, attachments=None):
+        """Persist a new project at revision 1
+
+        ``attachments`` maps attachment fields to files to store; the project
+        gets the stored file's digest in that field.
+        """
+        project = dict(project, revision=1)
+        text = project.pop('latex_code', '')
+        # Copy attachments before taking the lock; they are deduplicated by hash
+        refs = {field: self.attachments[field].put_file(path) for field, path in (attachments or {}).items()}
+        with self._lock, self._file_lock(exclusive=True):
+            self._catch_up(repair=True)
+            for field, digest in refs.items():
+                if not self.attachments[field].exists(digest):
+                    # Collected by a concurrent delete of the last project sharing it
+                    self.attachments[field].put_file(attachments[field])
+            project.update(refs)
+            project.update(self._store_body(text))
+            seq = self._write({'op': 'create', 'project': project})
+            self.history.record(project['id'], 1, text, updated_at=project.get('updated_at'))
+        self._sync(seq)
+        return dict(project, latex_code=text)
+
+    def update_project(self, project_id, fields, base_revision=None):
+        """Apply ``fields`` to a project, returning the updated project or None
+
+        Raises RevisionConflict if ``base_revision`` is given and stale.
+        """
+        with self._lock, self._file_lock(exclusive=True):
+            self._catch_up(repair=True)
+            if project_id not in self._projects:
+                return None
+            current = dict(self._projects[project_id])
+            self._check_revision(current, base_revision)
+            fields = dict(fields)
+            text = fields.pop('latex_code', None)
+            if text is not None:
+                delta = make_delta(self._body(current), text)
+                fields['revision'] = current['revision'] + 1
+                fields.update(self._store_body(text))
+            seq = self._write({'op': 'update', 'id': project_id, 'fields': fields})
+            if text is not None:
+                self._record_history(current, text, delta)
+            project = self._projects[project_id]
+        self._sync(seq)
+        return self._hydrate(project)
+
+    def patch_project(self, project_id, base_revision, delta, fields=None):
+        """Apply a text delta made against ``base_revision``, returning the project or None
+
+        Raises RevisionConflict on a stale base revision and DeltaError if the
+        delta does not apply to the current text.
+        """
+        with self._lock, self._file_lock(exclusive=True):
+            self._catch_up(repair=True)
+            if project_id not in self._projects:
+                return None
+            current = dict(self._projects[project_id])
+            self._check_revision(current, base_revision)
+            text = apply_delta(self._body(current), delta)
+            fields = dict(fields or {}, **self._store_body(text))
+            seq = self._write({
+                'op': 'patch',
+                'id': project_id,
+                'revision': current['revision'] + 1,
+                'delta': delta,
+                'fields': fields,
+            })
+            self._record_history(current, text, delta)
+            project = self._projects[project_id]
+        self._sync(seq)
+        return dict(self._metadata(project), latex_code=text)
+
+    def delete_project(self, project_id):
+        """Delete a project and its history, returning False if it did not exist"""
+        with self._lock, self._file_lock(exclusive=True):
+            self._catch_up(repair=True)
+            if project_id not in self._projects:
+                return False
+            project = self._projects[project_id]
+            seq = self._write({'op': 'delete', 'id': project_id})
+            self.history.delete(project_id)
+            for field, blobs in self.attachments.items():
+                if project.get(field) and not self.count_references(field, project[field]):
+                    blobs.delete(project[field])
+        self._sync(seq)
+        return True
+
+    def count_references(self, field, digest):
+        """Number of projects whose ``field`` holds ``digest``"""
+        with self._lock:
+            return sum(1 for p in self._projects.values() if p.get(field) == digest)
+
+    def compact(self):
+        """Fold the mutation log into a fresh snapshot, start an empty log and drop unused blobs"""
+        with self._lock, self._file_lock(exclusive=True):
+            self._catch_up(repair=True)
+            self._write_atomic(
+                self.snapshot_path,
+                json.dumps(list(self._projects.values()), indent=2).encode('utf-8'),
+            )
+            # A crash between the two renames leaves old records in the log;
+            # replaying them over the new snapshot is harmless (see _apply).
+            self._write_atomic(self.log_path, b'')
+            self._open_log()
+
+            # Blobs are only written under this lock, so anything unreferenced now is garbage
+            self._collect(self.blobs, 'latex_blob')
+            for field, blobs in self.attachments.items():
+                self._collect(blobs, field)
+
+    def _collect(self, blobs, field):
+        """Delete blobs no project references; caller holds the exclusive lock"""
+        live = {p[field] for p in self._projects.values() if p.get(field)}
+        for digest in list(blobs.digests()):
+            if digest not in live:
+                blobs.delete(digest)
+
+    def migrate_to_blobs(self):
+        """Move inline LaTeX bodies into the blob store and report the space used"""
+        report = {'projects_migrated': 0, 'inline_bytes': 0, 'blob_bytes': 0}
+        digests = set()
+        with self._lock:
+            self._refresh()
+            pending = [p['id'] for p in self._projects.values() if 'latex_blob' not in p]
+
+        # One project per lock acquisition so requests aren't stalled behind the migration
+        for project_id in pending:
+            with self._lock, self._file_lock(exclusive=True):
+                self._catch_up(repair=True)
+                project = self._projects.get(project_id)
+                if project is None or 'latex_blob' in project:
+                    continue
+                text = project.get('latex_code', '')
+                fields = self._store_body(text)
+                seq = self._write({'op': 'update', 'id': project_id, 'fields': fields})
+            self._sync(seq)
+            report['projects_migrated'] += 1
+            report['inline_bytes'] += len(json.dumps(text).encode('utf-8'))
+            if fields['latex_blob'] not in digests:
+                digests.add(fields['latex_blob'])
+                report['blob_bytes'] += fields['latex_stored_size']
+        return report
+
+    def disk_usage(self):
+        """Bytes used by the snapshot, the log and the blob store"""
+        def size(path):
+            try:
+                return os.path.getsize(path)
+            except FileNotFoundError:
+                return 0
+        with self._lock:
+            return {
+                'snapshot_bytes': size(self.snapshot_path),
+                'log_bytes': size(self.log_path),
+                'blob_bytes': sum(self.blobs.stored_size(d) for d in self.blobs.digests()),
+            }
+
+    def close(self):
+        """Stop the background compactor and release file handles"""
+        self._stop.set()
+        if self._compactor:
+            self._compactor.join()
+        with self._lock:
+            if self._log_fd is not None:
+                os.close(self._log_fd)
+                self._log_fd = None
+            os.close(self._lock_fd)
+
+    # Bodies
+
+    def _store_body(self, text):
+        """Write a LaTeX body to the blob store; returns the metadata fields referencing it"""
+        digest = self.blobs.put(text.encode('utf-8'))
+        return {
+            'latex_blob': digest,
+            'latex_size': len(text),
+            'latex_stored_size': self.blobs.stored_size(digest),
+        }
+
+    def _read_body_uncached(self, digest):
+        return self.blobs.get(digest).decode('utf-8')
+
+    def _body(self, project):
+        if 'latex_blob' in project:
+            return self._read_body(project['latex_blob'])
+        return project.get('latex_code', '')
+
+    def _metadata(self, project):
+        metadata = {k: v for k, v in project.items() if k != 'latex_code'}
+        metadata.setdefault('latex_size', len(project.get('latex_code', '')))
+        return metadata
+
+    def _hydrate(self, project):
+        return dict(self._metadata(project), latex_code=self._body(project))
+
+    # Log handling
+
+    def _check_revision(self, project, base_revision):
+        if base_revision is not None and base_revision != project['revision']:
+            raise RevisionConflict(dict(project))
+
+    def _record_history(self, previous, text, delta):
+        """Record the revision just applied to ``previous``'s project"""
+        project = self._projects[previous['id']]
+        if not self.history.has_history(project['id']):
+            # Projects from before revision tracking start with a snapshot of their base
+            self.history.record(project['id'], previous['revision'], self._body(previous),
+                                updated_at=previous.get('updated_at'))
+        self.history.record(project['id'], project['revision'], text, delta,
+                            updated_at=project.get('updated_at'))
+
+    def _write(self, record):
+        """Append a record to the log and apply it; caller holds the exclusive lock"""
+        data = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+        os.write(self._log_fd, data)
+        self._log_offset += len(data)
+        self._apply(record)
+        self._written_seq += 1
+        return self._written_seq
+
+    def _sync(self, seq):
+        """fsync the log once for every record written up to ``seq``"""
+        if not self.fsync:
+            return
+        with self._sync_lock:
+            if self._synced_seq >= seq:
+                return
+            with self._lock:
+                target = self._written_seq
+                # dup so a concurrent compaction can swap the log while we sync
+                fd = os.dup(self._log_fd)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._synced_seq = target
+
+    def _apply(self, record):
+        # Records must stay idempotent: after an interrupted compaction the
+        # same records can be replayed on top of a snapshot that already has them.
+        op = record.get('op')
+        if op == 'create':
+            project = dict(record['project'])
+            project.setdefault('revision', 1)
+            self._projects[project['id']] = project
+        elif op == 'update':
+            project = self._projects.get(record['id'])
+            if project is not None:
+                project.update(record['fields'])
+        elif op == 'patch':
+            project = self._projects.get(record['id'])
+            # Only apply on top of the exact base revision the delta was made against
+            if project is not None and project['revision'] == record['revision'] - 1:
+                if 'latex_blob' not in record['fields']:
+                    # Patches logged before blob storage carry only the delta
+                    project['latex_code'] = apply_delta(project.get('latex_code', ''), record['delta'])
+                project['revision'] = record['revision']
+                project.update(record['fields'])
+        elif op == 'delete':
+            self._projects.pop(record['id'], None)
+        else:
+            print(f"Skipping unknown project log record: {op}")
+            return
+        project = self._projects.get(record.get('id') or record.get('project', {}).get('id'))
+        if project is not None and 'latex_blob' in project:
+            # Once a body lives in the blob store, the inline copy is stale
+            project.pop('latex_code', None)
+        self.version += 1
+        self._notify(record.get('id') or record['project']['id'])
+
+    def _notify(self, project_id):
+        for listener in self._listeners:
+            try:
+                listener(project_id)
+            except Exception as e:
+                print(f"Error in project store listener: {e}")
+
+    def _reload(self, repair=False):
+        """Rebuild state from the snapshot and the whole log"""
+        projects = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r') as f:
+                for project in json.load(f):
+                    project.setdefault('revision', 1)
+                    projects[project['id']] = project
+        self._projects = projects
+        self.version += 1
+        self._notify(None)
+        self._stats['full_reloads'] += 1
+        self._open_log()
+        self._log_offset = 0
+        self._catch_up(repair=repair)
+
+    def _open_log(self):
+        if self._log_fd is not None:
+            os.close(self._log_fd)
+        self._log_fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._log_inode = os.fstat(self._log_fd).st_ino
+        self._log_offset = 0
+
+    def _refresh(self):
+        """Catch up with other processes if the log changed since we last read it"""
+        now = time.monotonic()
+        if self.max_staleness and now - self._checked_at < self.max_staleness:
+            self._stats['cache_hits'] += 1
+            return
+        self._checked_at = now
+
+        try:
+            stat = os.stat(self.log_path)
+        except FileNotFoundError:
+            stat = None
+        if stat is not None and stat.st_ino == self._log_inode and stat.st_size == self._log_offset:
+            self._stats['cache_hits'] += 1
+            return
+
+        start = time.perf_counter()
+        with self._file_lock(exclusive=False):
+            self._catch_up()
+        elapsed = time.perf_counter() - start
+        self._stats['cache_reloads'] += 1
+        self._stats['reload_seconds_total'] += elapsed
+        self._stats['last_reload_seconds'] = elapsed
+
+    def _catch_up(self, repair=False):
+        """Replay records appended since we last looked; caller holds a file lock"""
+        try:
+            stat = os.stat(self.log_path)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or stat.st_ino != self._log_inode:
+            # Another process compacted the log; start over from its snapshot
+            self._reload(repair=repair)
+            return
+        if stat.st_size <= self._log_offset:
+            return
+
+        with open(self.log_path, 'rb') as f:
+            f.seek(self._log_offset)
+            data = f.read()
+
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                print(f"Skipping corrupt project log record at offset {self._log_offset}")
+                continue
+            self._apply(record)
+        self._log_offset += end
+
+        if end < len(data) and repair:
+            # Torn write from a crash mid-append: drop it so new records start on a clean line
+            print(f"Truncating {len(data) - end} bytes of incomplete project log record")
+            os.truncate(self.log_path, self._log_offset)
+
+    @contextmanager
+    def _file_lock(self, exclusive):
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _write_atomic(self, path, data):
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        dir_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def _compact_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                if os.path.getsize(self.log_path) >= self.compact_threshold:
+                    self.compact()
+            except Exception as e:
+                print(f"Error compacting project log: {e}")
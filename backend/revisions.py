@@ -0,0 +1,134 @@
+"""
+Text deltas and per-project revision history.
+
+A delta is a list of ``[start, end, text]`` edits against a base text: each
+edit replaces ``base[start:end]`` with ``text``. Offsets are Unicode code
+points, edits are sorted and must not overlap.
+
+History for each project is an append-only JSON-lines file holding one delta
+per revision plus a full snapshot every ``snapshot_every`` revisions, so any
+revision can be rebuilt from the nearest snapshot without storing every
+version in full.
+"""
+import json
+import os
+
+
+class DeltaError(ValueError):
+    """Raised when a delta does not apply to its base text"""
+
+
+def is_integer(value):
+    """True for a JSON integer; ``bool`` is an int subclass but never an offset or revision"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def apply_delta(text, delta):
+    """Return ``text`` with the edits in ``delta`` applied"""
+    if not isinstance(delta, list):
+        raise DeltaError('Delta must be a list of [start, end, text] edits')
+    parts = []
+    position = 0
+    for edit in delta:
+        try:
+            start, end, insert = edit
+        except (TypeError, ValueError):
+            raise DeltaError(f'Malformed edit: {edit!r}')
+        if (not is_integer(start) or not is_integer(end) or not isinstance(insert, str)
+                or start < position or end < start or end > len(text)):
+            raise DeltaError(f'Edit out of range: {edit!r}')
+        parts.append(text[position:start])
+        parts.append(insert)
+        position = end
+    parts.append(text[position:])
+    return ''.join(parts)
+
+
+def make_delta(old, new):
+    """Build a single-edit delta turning ``old`` into ``new`` (common prefix/suffix)"""
+    if old == new:
+        return []
+    limit = min(len(old), len(new))
+    start = 0
+    while start < limit and old[start] == new[start]:
+        start += 1
+    old_end, new_end = len(old), len(new)
+    while old_end > start and new_end > start and old[old_end - 1] == new[new_end - 1]:
+        old_end -= 1
+        new_end -= 1
+    return [[start, old_end, new[start:new_end]]]
+
+
+def delta_size(delta):
+    """Characters inserted or removed by a delta"""
+    return sum(len(insert) + (end - start) for start, end, insert in delta)
+
+
+class RevisionHistory:
+    """Append-only revision history, one JSON-lines file per project"""
+
+    def __init__(self, directory, snapshot_every=20):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, project_id):
+        return os.path.join(self.directory, f"{project_id}.jsonl")
+
+    def record(self, project_id, revision, text, delta=None, updated_at=None):
+        """Append ``revision``; stores a full snapshot if no delta or on snapshot boundaries"""
+        entry = {'revision': revision, 'updated_at': updated_at}
+        if delta is None or revision % self.snapshot_every == 1:
+            entry['text'] = text
+        else:
+            entry['delta'] = delta
+        with open(self._path(project_id), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+
+    def _entries(self, project_id):
+        try:
+            with open(self._path(project_id), 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries
+
+    def list_revisions(self, project_id):
+        """Return revision metadata, oldest first"""
+        revisions = []
+        for entry in self._entries(project_id):
+            revisions.append({
+                'revision': entry['revision'],
+                'updated_at': entry.get('updated_at'),
+                'snapshot': 'text' in entry,
+                'change_size': len(entry['text']) if 'text' in entry else delta_size(entry['delta']),
+            })
+        return revisions
+
+    def get_text(self, project_id, revision):
+        """Rebuild the LaTeX text at ``revision``, or None if it isn't in the history"""
+        entries = [e for e in self._entries(project_id) if e['revision'] <= revision]
+        if not entries or entries[-1]['revision'] != revision:
+            return None
+        snapshots = [i for i, e in enumerate(entries) if 'text' in e]
+        if not snapshots:
+            return None
+        text = entries[snapshots[-1]]['text']
+        for entry in entries[snapshots[-1] + 1:]:
+            text = apply_delta(text, entry['delta'])
+        return text
+
+    def has_history(self, project_id):
+        return os.path.exists(self._path(project_id))
+
+    def delete(self, project_id):
+        try:
+            os.remove(self._path(project_id))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,167 @@
+"""
+Full-text search over projects.
+
+An in-memory inverted index over project names and LaTeX bodies, ranked with
+BM25. LaTeX commands are indexed as their own tokens (``\\frac``, ``\\int``,
+``\\mathbb``) next to plain words, so both "eigenvalue" and "\\sum" find
+documents. Name matches count ``NAME_WEIGHT`` times as much as body matches.
+
+The index subscribes to the ``ProjectStore``: every create/update/delete,
+including ones made by other worker processes, marks that project dirty, and
+dirty projects are re-indexed on the next search. A metadata-only update
+doesn't change the project's signature and costs nothing to re-check.
+"""
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+TOKEN_RE = re.compile(r'\\[A-Za-z]+|[A-Za-z0-9]+')
+NAME_WEIGHT = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+SNIPPET_WIDTH = 160
+
+
+def tokenize(text):
+    """Split text into lowercase words and LaTeX command tokens"""
+    return [token.lower() for token in TOKEN_RE.findall(text or '')]
+
+
+def make_snippet(text, terms, width=SNIPPET_WIDTH):
+    """Return a whitespace-collapsed excerpt of ``text`` around the first matched term"""
+    lowered = text.lower()
+    positions = [lowered.find(term) for term in terms]
+    positions = [p for p in positions if p >= 0]
+    center = min(positions) if positions else 0
+    start = max(0, center - width // 2)
+    end = min(len(text), start + width)
+    snippet = ' '.join(text[start:end].split())
+    if start > 0:
+        snippet = '…' + snippet
+    if end < len(text):
+        snippet = snippet + '…'
+    return snippet
+
+
+class SearchIndex:
+    """BM25 inverted index kept in sync with a ProjectStore"""
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._postings = defaultdict(dict)  # term -> {project_id: weighted term frequency}
+        self._doc_terms = {}                # project_id -> Counter of weighted terms
+        self._doc_lengths = {}
+        self._signatures = {}
+        self._total_length = 0
+
+        self._pending_lock = threading.Lock()
+        self._pending = set()
+        self._rebuild = True
+        store.subscribe(self._mark_dirty)
+
+    def _mark_dirty(self, project_id):
+        with self._pending_lock:
+            if project_id is None:
+                self._rebuild = True
+            else:
+                self._pending.add(project_id)
+
+    def _sync(self):
+        """Re-index projects that changed since the last search; caller holds self._lock"""
+        # Replays other workers' writes, which marks their projects dirty
+        self.store.refresh()
+        with self._pending_lock:
+            pending, self._pending = self._pending, set()
+            rebuild, self._rebuild = self._rebuild, False
+        if rebuild:
+            current = {p['id'] for p in self.store.list_projects()}
+            pending |= current | (set(self._doc_terms) - current)
+
+        for project_id in pending:
+            project = self.store.get_project(project_id)
+            if project is None:
+                self._remove(project_id)
+                continue
+            signature = (project.get('name'), project.get('latex_blob') or project.get('revision'))
+            if self._signatures.get(project_id) == signature:
+                continue
+            self._remove(project_id)
+            self._add(project_id, project)
+            self._signatures[project_id] = signature
+
+    def _add(self, project_id, project):
+        terms = Counter(tokenize(project.get('latex_code')))
+        for token in tokenize(project.get('name')):
+            terms[token] += NAME_WEIGHT
+        for term, count in terms.items():
+            self._postings[term][project_id] = count
+        self._doc_terms[project_id] = terms
+        length = sum(terms.values())
+        self._doc_lengths[project_id] = length
+        self._total_length += length
+
+    def _remove(self, project_id):
+        terms = self._doc_terms.pop(project_id, None)
+        self._signatures.pop(project_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(project_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(project_id, 0)
+
+    def refresh(self):
+        """Bring the index up to date now instead of on the next search"""
+        with self._lock:
+            self._sync()
+
+    def search(self, query, limit=20):
+        """Return up to ``limit`` (project_id, score, terms) tuples, best first"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            self._sync()
+            doc_count = len(self._doc_terms)
+            if not doc_count:
+                return []
+            average_length = self._total_length / doc_count
+            scores = defaultdict(float)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for project_id, frequency in postings.items():
+                    length_norm = 1 - BM25_B + BM25_B * self._doc_lengths[project_id] / average_length
+                    scores[project_id] += idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * length_norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(project_id, score, terms) for project_id, score in ranked]
+
+    def search_projects(self, query, limit=20):
+        """Search and return result dicts with project summaries and snippets"""
+        start = time.perf_counter()
+        results = []
+        for project_id, score, terms in self.search(query, limit):
+            project = self.store.get_project(project_id)
+            if project is None:
+                continue
+            results.append({
+                'id': project_id,
+                'name': project.get('name'),
+                'filename': project.get('filename'),
+                'updated_at': project.get('updated_at'),
+                'score': round(score, 4),
+                'snippet': make_snippet(project.get('latex_code', ''), terms),
+            })
+        return results, (time.perf_counter() - start) * 1000
+
+    def stats(self):
+        with self._lock:
+            return {'documents': len(self._doc_terms), 'terms': len(self._postings)}
@@ -0,0 +1,1056 @@
+"""
+LaScribe API server.
+
+``create_app()`` builds the Flask app from ``config.load_config()``; app.py and
+app2.py run it under the development server, wsgi.py under gunicorn.
+
+Conversions and compiles are slow (an LLM call, a pdflatex run), so both can
+run as background jobs: send ``?async=1`` (or ``Prefer: respond-async``) and
+the request returns 202 with a job id to poll at ``/api/jobs/<id>`` instead of
+holding a request thread for the whole conversion.
+"""
+from flask import Blueprint, Flask, Response, current_app, g, request, jsonify, send_file
+from flask_cors import CORS
+import os
+import tempfile
+import subprocess
+import io
+import importlib
+import threading
+import time
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+from config import load_config
+from project_store import ProjectStore, RevisionConflict
+from blob_store import BlobStore, sha256_digest, sha256_file
+from revisions import DeltaError, is_integer
+from search_index import SearchIndex
+from previews import PreviewCache, is_digest
+from jobs import JobQueue
+from batches import BatchError, BatchTracker, iter_upload_entries, save_stream
+from admission import AdmissionController, Rejected
+from metrics import (
+    ADMISSION_ACTIVE, ADMISSION_CAPACITY, ADMISSION_REJECTIONS, ADMISSION_WAITING, CACHE_REQUESTS, ERRORS,
+    HTTP_REQUEST_SECONDS, HTTP_REQUESTS, JOBS_ACTIVE, JOBS_QUEUED, REGISTRY, UPLOAD_BYTES, Exporter, render, timed
+)
+from listing import DEFAULT_LIMIT, ListingError, paginate_projects, parse_fields, summarize_project
+from http_utils import gzip_response
+from static_assets import StaticManifest
+import tracing
+from tracing import RequestProfiler, span
+from pdf_utils import count_pdf_pages
+from page_map import PageMapError, page_span, parse_region, render_page
+import uuid
+from datetime import datetime
+
+# Modules providing generate_latex_from_pdf(pdf_path, draft=False), configure() and
+# is_configured(), selected by the PROVIDER setting; conversions raise on any failure
+PROVIDERS = {
+    'anthropic': 'models.anthropic_latex',
+    'openai': 'models.openai_latex',
+}
+
+# Times to re-locate a page and retry when the project is edited while its page regenerates
+SPLICE_ATTEMPTS = 3
+
+# Content-addressed responses never change for a given hash, so clients may cache them for good
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+ALLOWED_EXTENSIONS = {'pdf'}
+
+api = Blueprint('api', __name__)
+
+
+class CompileError(Exception):
+    """Raised when pdflatex fails or is unavailable"""
+
+
+def load_provider(provider):
+    """Import the selected provider module (cheap: its SDK client is created on first use)"""
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown provider '{provider}' (expected one of {', '.join(PROVIDERS)})")
+    return importlib.import_module(PROVIDERS[provider])
+
+
+class Services:
+    """Storage, indexes and worker pools shared by every request in a process"""
+
+    def __init__(self, config):
+        self.config = config
+        for folder in (config['UPLOAD_FOLDER'], config['OUTPUT_FOLDER']):
+            os.makedirs(folder, exist_ok=True)
+
+        # Original PDFs are stored once per SHA-256 and shared between projects
+        self.originals = None
+        attachments = {}
+        if config['KEEP_ORIGINALS']:
+            self.originals = BlobStore(config['ORIGINALS_FOLDER'], compression='none')
+            attachments['original_pdf_sha256'] = self.originals
+        self.store = ProjectStore(config['PROJECTS_FOLDER'], attachments=attachments)
+        self.search_index = SearchIndex(self.store)
+
+        # Thumbnails and page images for uploaded and compiled PDFs, keyed by SHA-256
+        self.previews = PreviewCache(os.path.join(config['OUTPUT_FOLDER'], 'previews'))
+
+        self.jobs = JobQueue(
+            os.path.join(config['OUTPUT_FOLDER'], 'jobs'),
+            workers=config['CONVERSION_WORKERS'],
+            ttl=config['JOB_TTL']
+        )
+        # Refinements of progressive drafts get their own pool so they never hold up new uploads;
+        # they share the job directory, so /api/jobs/<id> reports them too
+        self.refinements = JobQueue(
+            os.path.join(config['OUTPUT_FOLDER'], 'jobs'),
+            workers=config['REFINE_WORKERS'],
+            ttl=config['JOB_TTL']
+        )
+        # Conversions call the provider; keep them within its limits and ours. Refinements
+        # get their own share of the slots and rate budget, so they can't crowd out uploads.
+        refine_share = config['REFINE_SHARE'] / 100
+        refine_active = max(1, int(config['ADMISSION_MAX_ACTIVE'] * refine_share))
+        self.admission = AdmissionController(
+            max_active=max(1, config['ADMISSION_MAX_ACTIVE'] - refine_active),
+            per_client=config['ADMISSION_PER_CLIENT'],
+            queue_size=config['ADMISSION_QUEUE_SIZE'],
+            queue_timeout=config['ADMISSION_QUEUE_TIMEOUT'],
+            requests_per_minute=config['PROVIDER_RPM'] * (1 - refine_share),
+            tokens_per_minute=config['PROVIDER_TPM'] * (1 - refine_share),
+            processes=config['ADMISSION_PROCESSES']
+        )
+        self.refine_admission = AdmissionController(
+            max_active=refine_active,
+            per_client=refine_active,
+            queue_size=config['ADMISSION_QUEUE_SIZE'],
+            queue_timeout=config['ADMISSION_QUEUE_TIMEOUT'],
+            requests_per_minute=config['PROVIDER_RPM'] * refine_share,
+            tokens_per_minute=config['PROVIDER_TPM'] * refine_share,
+            processes=config['ADMISSION_PROCESSES']
+        )
+        # pdflatex is CPU-bound; more concurrent runs than cores only adds latency
+        self.compile_slots = threading.BoundedSemaphore(config['COMPILE_WORKERS'])
+        self.provider = load_provider(config['PROVIDER'])
+        self.provider.configure(
+            timeout=float(config['PROVIDER_TIMEOUT']),
+            max_connections=config['PROVIDER_MAX_CONNECTIONS']
+        )
+        if not self.provider.is_configured():
+            print(f"Warning: no API key for provider '{config['PROVIDER']}'; conversions will fail until one is set")
+        self.generate_latex_from_pdf = self.provider.generate_latex_from_pdf
+
+        # Batch uploads share one small pool and still pass admission control per file
+        self.batches = BatchTracker(
+            os.path.join(config['OUTPUT_FOLDER'], 'batches'),
+            self.store,
+            self.convert_upload,
+            self.admission,
+            workers=config['BATCH_WORKERS'],
+            tokens_per_conversion=config['ADMISSION_TOKENS_PER_CONVERSION']
+        )
+
+    def warm_up(self):
+        """Clean up after exited processes' jobs, move older LaTeX bodies into the blob store, then build the search index"""
+        try:
+            self.recover_jobs()
+        except Exception as e:
+            print(f"Error recovering jobs: {e}")
+        try:
+            self.store.migrate_to_blobs()
+            self.search_index.refresh()
+        except Exception as e:
+            print(f"Error warming up project storage: {e}")
+
+    def recover_jobs(self):
+        """Fail jobs left unfinished by an exited process, with their pending refinements, and remove their uploads"""
+        for job in self.jobs.recover():
+            print(f"Failed {job['kind']} job {job['id']}: its server process exited")
+            if job['kind'] == 'refine' and job.get('project_id'):
+                self.store.update_project(job['project_id'], {'refinement': 'failed'})
+            if job.get('upload'):
+                path = os.path.join(self.config['UPLOAD_FOLDER'], job['upload'])
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def convert_upload(self, filepath, filename, progressive=False):
+        """Convert a saved upload to LaTeX and create its project; the upload is removed afterwards
+
+        With ``progressive`` the project starts as a draft from the provider's
+        fast model and a refine job (its id in ``refine_job_id``) replaces it
+        with the full-quality conversion later.
+        """
+        keep_upload = False
+        try:
+            print(f"Processing PDF: {filepath}")
+            latex_content = self.generate_latex_from_pdf(filepath, draft=progressive)
+
+            with timed('postprocess'):
+                now = datetime.now().isoformat()
+                project = {
+                    'id': str(uuid.uuid4()),
+                    'name': filename.replace('.pdf', ''),
+                    'filename': filename,
+                    'latex_code': latex_content,
+                    'latex_size': len(latex_content),
+                    'page_count': count_pdf_pages(filepath),
+                    'created_at': now,
+                    'updated_at': now
+                }
+                if not self.originals:
+                    project['original_pdf_sha256'] = sha256_file(filepath)
+                if progressive:
+                    project['refinement'] = 'pending'
+
+            with timed('persist'):
+                if self.originals:
+                    # Keep the original PDF in the content-addressed store
+                    project = self.store.create_project(project, attachments={'original_pdf_sha256': filepath})
+                else:
+                    project = self.store.create_project(project)
+
+            digest = project['original_pdf_sha256']
+            # With originals kept the upload is now a blob; otherwise keep only its previews
+            self.previews.schedule(digest, self.originals.path(digest) if self.originals else filepath)
+
+            if progressive:
+                # Without kept originals the refine job takes over the upload and removes it
+                keep_upload = not self.originals
+                pdf_path = filepath if keep_upload else self.originals.path(digest)
+                details = {'project_id': project['id']}
+                if keep_upload:
+                    details.update(upload_details(filepath))
+                project['refine_job_id'] = self.refinements.submit(
+                    'refine', self.refine_job, project['id'], project['revision'], pdf_path, keep_upload,
+                    details=details
+                )
+            return project
+        finally:
+            if not keep_upload:
+                os.remove(filepath)
+
+    def refine_job(self, job_id, project_id, base_revision, pdf_path, remove_pdf):
+        """Replace a progressive draft with the full-quality conversion, unless it was edited meanwhile"""
+        try:
+            ticket = self.refine_admission.admit_eventually('refine', self.config['ADMISSION_TOKENS_PER_CONVERSION'])
+            try:
+                # Don't spend a full conversion on a draft the user has already edited
+                project = self.store.get_project(project_id, include_latex=False)
+                if project is None or project['revision'] != base_revision:
+                    latex_content = None
+                else:
+                    latex_content = self.generate_latex_from_pdf(pdf_path)
+            finally:
+                self.refine_admission.release(ticket)
+        except Exception:
+            self.store.update_project(project_id, {'refinement': 'failed'})
+            raise
+        finally:
+            if remove_pdf:
+                os.remove(pdf_path)
+
+        if latex_content is None:
+            self.store.update_project(project_id, {'refinement': 'skipped'})
+            return {'project_id': project_id, 'refinement': 'skipped'}
+        try:
+            with timed('persist'):
+                project = self.store.update_project(project_id, {
+                    'latex_code': latex_content,
+                    'latex_size': len(latex_content),
+                    'refinement': 'done',
+                    'updated_at': datetime.now().isoformat()
+                }, base_revision=base_revision)
+        except RevisionConflict:
+            # The user has started editing the draft; keep their work
+            self.store.update_project(project_id, {'refinement': 'skipped'})
+            return {'project_id': project_id, 'refinement': 'skipped'}
+        if project is None:
+            return {'project_id': project_id, 'refinement': 'skipped'}
+        return {'project_id': project_id, 'revision': project['revision'], 'refinement': 'done'}
+
+    def regenerate_page(self, project_id, page, region=None, replace_span=None, base_revision=None):
+        """Re-convert one page (or a region of it) from the project's original PDF and splice it in
+
+        The new LaTeX replaces ``replace_span`` ([start, end] code points at
+        ``base_revision``) if given, else the page's ``% Page N`` section.
+        Returns the updated project, or None if it doesn't exist. Raises
+        PageMapError, RevisionConflict or DeltaError.
+        """
+        project = self.store.get_project(project_id)
+        if project is None:
+            return None
+        pdf_path = self.originals.path(project['original_pdf_sha256']) if self.originals else None
+        if not pdf_path:
+            raise PageMapError('The original PDF was not kept (LASCRIBE_KEEP_ORIGINALS)')
+        if project.get('page_count') and not 1 <= page <= project['page_count']:
+            raise PageMapError(f"Page must be between 1 and {project['page_count']}")
+        if replace_span is None:
+            # Fail before spending provider time on a page that can't be spliced
+            page_span(project['latex_code'], page)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            image_path = os.path.join(temp_dir, f'page_{page}.png')
+            with span('rasterize'):
+                render_page(pdf_path, page, image_path, region)
+            fragment = self.provider.generate_latex_from_image(image_path, page).strip()
+
+        fields = {'updated_at': datetime.now().isoformat()}
+        if replace_span is not None:
+            start, end = replace_span
+            revision = project['revision'] if base_revision is None else base_revision
+            with timed('persist'):
+                return self.store.patch_project(project_id, revision, [[start, end, fragment]], fields)
+
+        for attempt in range(SPLICE_ATTEMPTS):
+            start, end = page_span(project['latex_code'], page)
+            try:
+                with timed('persist'):
+                    return self.store.patch_project(
+                        project_id, project['revision'], [[start, end, fragment + '\n\n']], fields
+                    )
+            except RevisionConflict:
+                # Edited meanwhile; the page marker moves with the text, so find it again
+                project = self.store.get_project(project_id)
+                if project is None:
+                    return None
+        raise RevisionConflict(project)
+
+    def compile_latex(self, latex_code, project_id=None):
+        """Compile LaTeX with pdflatex and return (pdf_data, digest); raises CompileError"""
+        print(f"Received LaTeX code length: {len(latex_code)}")
+        timeout = self.config['COMPILE_TIMEOUT']
+
+        with self.compile_slots, tempfile.TemporaryDirectory() as temp_dir:
+            tex_file = os.path.join(temp_dir, 'document.tex')
+            with open(tex_file, 'w', encoding='utf-8') as f:
+                f.write(latex_code)
+
+            try:
+                with timed('pdflatex'):
+                    result = subprocess.run(
+                        ['pdflatex', '-interaction=nonstopmode', '-output-directory', temp_dir, tex_file],
+                        capture_output=True,
+                        text=True,
+                        timeout=timeout
+                    )
+            except subprocess.TimeoutExpired:
+                print("LaTeX compilation timed out")
+                raise CompileError(f'Compilation timed out ({timeout} seconds). Try with a simpler document.')
+            except FileNotFoundError:
+                print("pdflatex not found")
+                raise CompileError('pdflatex not found. Please install LaTeX distribution.')
+
+            print(f"pdflatex return code: {result.returncode}")
+            pdf_file = os.path.join(temp_dir, 'document.pdf')
+            if not os.path.exists(pdf_file):
+                error_msg = result.stderr if result.stderr else 'Unknown compilation error'
+                print(f"LaTeX compilation failed: {error_msg}")
+                ERRORS.inc(stage='pdflatex', error='LatexError')
+                raise CompileError(f'LaTeX compilation failed: {error_msg}')
+
+            with open(pdf_file, 'rb') as f:
+                pdf_data = f.read()
+
+        # Render previews of the result in the background
+        digest = sha256_digest(pdf_data)
+        self.previews.schedule_bytes(digest, pdf_data)
+        if project_id:
+            self.store.update_project(project_id, {'compiled_pdf_sha256': digest})
+        return pdf_data, digest
+
+    def convert_job(self, job_id, filepath, filename, ticket, progressive=False):
+        try:
+            # Queued jobs wait for their slot here rather than in the request
+            self.admission.wait(ticket)
+            project = self.convert_upload(filepath, filename, progressive)
+        finally:
+            self.admission.release(ticket)
+        result = {'project_id': project['id'], 'revision': project['revision'], 'filename': filename}
+        if progressive:
+            result.update(refinement=project['refinement'], refine_job_id=project['refine_job_id'])
+        return result
+
+    def regenerate_job(self, job_id, ticket, project_id, page, region, replace_span, base_revision):
+        try:
+            self.admission.wait(ticket)
+            project = self.regenerate_page(project_id, page, region, replace_span, base_revision)
+        finally:
+            self.admission.release(ticket)
+        if project is None:
+            raise PageMapError('Project not found')
+        return {'project_id': project_id, 'page': page, 'revision': project['revision']}
+
+    def compile_job(self, job_id, latex_code, project_id=None):
+        pdf_data, digest = self.compile_latex(latex_code, project_id)
+        with open(self.jobs.artifact_path(job_id, 'pdf'), 'wb') as f:
+            f.write(pdf_data)
+        return {'pdf_sha256': digest, 'pdf_url': f"/api/jobs/{job_id}/result.pdf"}
+
+
+def services():
+    return current_app.extensions['lascribe']
+
+
+def wants_async():
+    """True if the client asked for a background job instead of waiting for the result"""
+    return (request.args.get('async', '').lower() in ('1', 'true')
+            or 'respond-async' in request.headers.get('Prefer', ''))
+
+
+def wants_progressive():
+    """True if the upload should return a fast draft first (``?progressive=1``, default from config)"""
+    value = request.args.get('progressive')
+    if value is None:
+        return current_app.config['PROGRESSIVE_CONVERSION']
+    return value.lower() in ('1', 'true')
+
+
+def client_id():
+    """Who a request counts against for per-client limits"""
+    if current_app.config['TRUST_PROXY_HEADERS']:
+        forwarded = request.headers.get('X-Forwarded-For', '')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.remote_addr or 'unknown'
+
+
+def too_many_requests(rejection):
+    ADMISSION_REJECTIONS.inc(reason=rejection.reason)
+    response = jsonify({'error': str(rejection), 'reason': rejection.reason, 'retry_after': rejection.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(rejection.retry_after)
+    return response
+
+
+def job_accepted(job_id):
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': f"/api/jobs/{job_id}"
+    }), 202
+
+
+def upload_details(filepath):
+    """Job details naming the upload a job removes when done, so ``recover_jobs`` can remove it instead"""
+    return {'upload': os.path.basename(filepath)}
+
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+@api.route('/api/upload-pdf', methods=['POST'])
+def upload_pdf():
+    try:
+        # Check if file was uploaded
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file provided'}), 400
+
+        file = request.files['file']
+
+        # Check if file was selected
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+
+        # Check if file type is allowed
+        if not allowed_file(file.filename):
+            return jsonify({'error': 'Only PDF files are allowed'}), 400
+
+        # Turn the request away now if the conversion can't run soon
+        svc = services()
+        ticket = svc.admission.reserve(client_id(), svc.config['ADMISSION_TOKENS_PER_CONVERSION'])
+        try:
+            if not wants_async():
+                svc.admission.wait(ticket, svc.admission.queue_timeout)
+
+            # Save the uploaded file under a unique name so same-named uploads don't collide
+            filename = secure_filename(file.filename)
+            filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], f"{uuid.uuid4()}.pdf")
+            with timed('upload_ingest'):
+                file.save(filepath)
+            UPLOAD_BYTES.inc(os.path.getsize(filepath))
+
+            progressive = wants_progressive()
+            if wants_async():
+                job_id = svc.jobs.submit('conversion', svc.convert_job, filepath, filename, ticket, progressive,
+                                         details=upload_details(filepath))
+                # The job releases the ticket when it finishes
+                ticket = None
+                return job_accepted(job_id)
+
+            project = svc.convert_upload(filepath, filename, progressive)
+        finally:
+            if ticket is not None:
+                svc.admission.release(ticket)
+
+        result = {
+            'success': True,
+            'latex': project['latex_code'],
+            'filename': filename,
+            'project_id': project['id'],
+            'revision': project['revision']
+        }
+        if progressive:
+            result.update(refinement=project['refinement'], refine_job_id=project['refine_job_id'])
+        return jsonify(result)
+
+    except Rejected as e:
+        return too_many_requests(e)
+    except Exception as e:
+        print(f"Error processing PDF: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/batches', methods=['POST'])
+def upload_batch():
+    """Convert many PDFs at once: any number of PDF and ZIP files in the ``files`` field"""
+    svc = services()
+    batch_id = None
+    try:
+        # Batches may be far larger than a single upload (Flask 3.1+)
+        request.max_content_length = svc.config['BATCH_MAX_CONTENT_LENGTH']
+        uploads = [f for f in request.files.getlist('files') if f.filename]
+        if not uploads:
+            return jsonify({'error': 'No files provided'}), 400
+
+        max_files = svc.config['BATCH_MAX_FILES']
+        batch_id = svc.batches.create(client_id())
+        count = 0
+        with timed('upload_ingest'):
+            for upload in uploads:
+                for name, stream in iter_upload_entries(upload.filename, upload.stream, max_files):
+                    count += 1
+                    if count > max_files:
+                        raise BatchError(f"A batch may contain at most {max_files} PDFs")
+                    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], f"{uuid.uuid4()}.pdf")
+                    digest, size = save_stream(stream, filepath, current_app.config['MAX_CONTENT_LENGTH'])
+                    UPLOAD_BYTES.inc(size)
+                    filename = secure_filename(os.path.basename(name)) or 'document.pdf'
+                    svc.batches.add_file(batch_id, name, filename, filepath, digest, size)
+        svc.batches.start(batch_id)
+
+        return jsonify({
+            'success': True,
+            'batch_id': batch_id,
+            'status_url': f"/api/batches/{batch_id}"
+        }), 202
+
+    except BatchError as e:
+        if batch_id:
+            svc.batches.abort(batch_id)
+        return jsonify({'error': str(e)}), 400
+    except RequestEntityTooLarge:
+        if batch_id:
+            svc.batches.abort(batch_id)
+        limit = svc.config['BATCH_MAX_CONTENT_LENGTH'] // (1024 * 1024)
+        return jsonify({'error': f'Batch larger than {limit}MB'}), 413
+    except Exception as e:
+        if batch_id:
+            svc.batches.abort(batch_id)
+        print(f"Error receiving batch: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/batches/<batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    """Per-file progress of a batch, with aggregate throughput"""
+    batch = services().batches.get(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    return jsonify(dict(batch, success=True))
+
+@api.route('/api/compile-latex', methods=['POST'])
+def compile_latex():
+    """Compile LaTeX code to PDF using pdflatex"""
+    try:
+        data = request.get_json()
+        if not data or 'latex' not in data:
+            return jsonify({'error': 'No LaTeX code provided'}), 400
+
+        svc = services()
+        if wants_async():
+            return job_accepted(svc.jobs.submit('compile', svc.compile_job, data['latex'], data.get('project_id')))
+
+        pdf_data, digest = svc.compile_latex(data['latex'], data.get('project_id'))
+        response = send_file(
+            io.BytesIO(pdf_data),
+            mimetype='application/pdf',
+            as_attachment=False
+        )
+        response.headers['X-PDF-SHA256'] = digest
+        return response
+
+    except CompileError as e:
+        return jsonify({'error': str(e)}), 500
+    except Exception as e:
+        print(f"Error compiling LaTeX: {e}")
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+@api.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Poll a background conversion or compile"""
+    job = services().jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(dict(job, success=True))
+
+@api.route('/api/jobs/<job_id>/result.pdf', methods=['GET'])
+def get_job_pdf(job_id):
+    """Download the PDF produced by a finished compile job"""
+    jobs = services().jobs
+    job = jobs.get(job_id)
+    if job is None or job['status'] != 'done' or job['kind'] != 'compile':
+        return jsonify({'error': 'Compiled PDF not available'}), 404
+
+    response = send_file(
+        jobs.artifact_path(job_id, 'pdf'),
+        mimetype='application/pdf',
+        as_attachment=False,
+        conditional=True,
+        etag=job['result']['pdf_sha256']
+    )
+    response.headers['X-PDF-SHA256'] = job['result']['pdf_sha256']
+    return response
+
+@api.route('/api/projects', methods=['GET'])
+def get_projects():
+    """List projects, newest first, as paginated summaries"""
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        with span('store'):
+            projects = services().store.list_projects(include_latex=fields is None or 'latex_code' in fields)
+        with span('paginate'):
+            page, next_cursor = paginate_projects(
+                projects,
+                sort=request.args.get('sort', 'updated_at'),
+                order=request.args.get('order', 'desc'),
+                limit=request.args.get('limit', DEFAULT_LIMIT),
+                cursor=request.args.get('cursor')
+            )
+        return jsonify({
+            'success': True,
+            'projects': page if fields is None else [summarize_project(p, fields) for p in page],
+            'next_cursor': next_cursor
+        })
+    except ListingError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error loading projects: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/projects/search', methods=['GET'])
+def search_projects():
+    """Full-text search over project names, LaTeX text and math commands"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'No search query provided'}), 400
+        try:
+            limit = max(1, min(int(request.args.get('limit', 20)), 100))
+        except ValueError:
+            return jsonify({'error': 'Limit must be an integer'}), 400
+
+        with span('search'):
+            results, took_ms = services().search_index.search_projects(query, limit)
+        return jsonify({
+            'success': True,
+            'query': query,
+            'results': results,
+            'took_ms': round(took_ms, 2)
+        })
+    except Exception as e:
+        print(f"Error searching projects: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/projects/<project_id>', methods=['GET'])
+def get_project(project_id):
+    """Get a specific project"""
+    try:
+        with span('store'):
+            project = services().store.get_project(project_id)
+
+        if project:
+            return jsonify({
+                'success': True,
+                'project': project
+            })
+        else:
+            return jsonify({'error': 'Project not found'}), 404
+    except Exception as e:
+        print(f"Error loading project: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/projects/<project_id>', methods=['PUT', 'PATCH'])
+def update_project(project_id):
+    """Update a project's LaTeX code, either in full or as a delta against a base revision"""
+    try:
+        data = request.get_json()
+        if not data or ('latex_code' not in data and 'delta' not in data):
+            return jsonify({'error': 'No LaTeX code or delta provided'}), 400
+
+        store = services().store
+        base_revision = data.get('base_revision')
+        if base_revision is not None and not is_integer(base_revision):
+            return jsonify({'error': 'base_revision must be an integer'}), 400
+        fields = {'updated_at': datetime.now().isoformat()}
+
+        if 'delta' in data:
+            if base_revision is None:
+                return jsonify({'error': 'base_revision is required with a delta'}), 400
+            with span('store'):
+                project = store.patch_project(project_id, base_revision, data['delta'], fields)
+        else:
+            fields['latex_code'] = data['latex_code']
+            with span('store'):
+                project = store.update_project(project_id, fields, base_revision=base_revision)
+
+        if project is None:
+            return jsonify({'error': 'Project not found'}), 404
+
+        if 'delta' in data:
+            # The client already has the text; don't echo the whole document back
+            project = {k: v for k, v in project.items() if k != 'latex_code'}
+
+        return jsonify({
+            'success': True,
+            'project': project
+        })
+    except RevisionConflict as e:
+        return jsonify({
+            'error': 'Revision conflict',
+            'revision': e.project['revision'],
+            'project': e.project
+        }), 409
+    except DeltaError as e:
+        return jsonify({'error': f'Invalid delta: {e}'}), 400
+    except Exception as e:
+        print(f"Error updating project: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/projects/<project_id>/regenerate', methods=['POST'])
+def regenerate_project_page(project_id):
+    """Re-convert one page or region of a project from its original PDF and splice the result in"""
+    try:
+        data = request.get_json() or {}
+        page = data.get('page')
+        if not is_integer(page) or page < 1:
+            return jsonify({'error': 'A page number (1-based) is required'}), 400
+        region = parse_region(data.get('region'))
+        replace_span = data.get('span')
+        if replace_span is not None and (not isinstance(replace_span, list) or len(replace_span) != 2):
+            return jsonify({'error': 'span must be [start, end]'}), 400
+        if region is not None and replace_span is None:
+            return jsonify({'error': 'A region needs the span of LaTeX it replaces'}), 400
+        base_revision = data.get('base_revision')
+        if base_revision is not None and not is_integer(base_revision):
+            return jsonify({'error': 'base_revision must be an integer'}), 400
+
+        svc = services()
+        project = svc.store.get_project(project_id, include_latex=False)
+        if project is None:
+            return jsonify({'error': 'Project not found'}), 404
+        # One page costs roughly its share of a whole conversion
+        tokens = svc.config['ADMISSION_TOKENS_PER_CONVERSION'] // (project.get('page_count') or 1)
+        ticket = svc.admission.reserve(client_id(), tokens)
+        try:
+            if wants_async():
+                job_id = svc.jobs.submit('regenerate', svc.regenerate_job, ticket, project_id, page, region,
+                                         replace_span, base_revision)
+                ticket = None
+                return job_accepted(job_id)
+
+            svc.admission.wait(ticket, svc.admission.queue_timeout)
+            project = svc.regenerate_page(project_id, page, region, replace_span, base_revision)
+        finally:
+            if ticket is not None:
+                svc.admission.release(ticket)
+
+        if project is None:
+            return jsonify({'error': 'Project not found'}), 404
+        return jsonify({
+            'success': True,
+            'project': project
+        })
+    except Rejected as e:
+        return too_many_requests(e)
+    except PageMapError as e:
+        return jsonify({'error': str(e)}), 400
+    except RevisionConflict as e:
+        return jsonify({
+            'error': 'Revision conflict',
+            'revision': e.project['revision'],
+            'project': e.project
+        }), 409
+    except DeltaError as e:
+        return jsonify({'error': f'Invalid span: {e}'}), 400
+    except Exception as e:
+        print(f"Error regenerating page: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/projects/<project_id>/history', methods=['GET'])
+def get_project_history(project_id):
+    """List a project's revisions"""
+    try:
+        store = services().store
+        project = store.get_project(project_id)
+        if not project:
+            return jsonify({'error': 'Project not found'}), 404
+
+        return jsonify({
+            'success': True,
+            'revision': project['revision'],
+            'revisions': store.history.list_revisions(project_id)
+        })
+    except Exception as e:
+        print(f"Error loading project history: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/projects/<project_id>/revisions/<int:revision>', methods=['GET'])
+def get_project_revision(project_id, revision):
+    """Get a project's LaTeX code as of an earlier revision"""
+    try:
+        latex_code = services().store.history.get_text(project_id, revision)
+        if latex_code is None:
+            return jsonify({'error': 'Revision not found'}), 404
+
+        return jsonify({
+            'success': True,
+            'revision': revision,
+            'latex_code': latex_code
+        })
+    except Exception as e:
+        print(f"Error loading project revision: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/projects/<project_id>', methods=['DELETE'])
+def delete_project(project_id):
+    """Delete a project"""
+    try:
+        with span('store'):
+            deleted = services().store.delete_project(project_id)
+        if not deleted:
+            return jsonify({'error': 'Project not found'}), 404
+
+        return jsonify({
+            'success': True,
+            'message': 'Project deleted successfully'
+        })
+    except Exception as e:
+        print(f"Error deleting project: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/projects/<project_id>/original-pdf', methods=['GET'])
+def get_original_pdf(project_id):
+    """Get the original PDF file for a project, with caching and range request support"""
+    try:
+        svc = services()
+        project = svc.store.get_project(project_id, include_latex=False)
+
+        if not project:
+            return jsonify({'error': 'Project not found'}), 404
+
+        digest = project.get('original_pdf_sha256')
+        if digest and svc.originals and svc.originals.path(digest):
+            # conditional=True answers If-None-Match/If-Modified-Since with 304
+            # and Range requests with 206, so the viewer can load progressively
+            response = send_file(
+                svc.originals.path(digest),
+                mimetype='application/pdf',
+                as_attachment=False,
+                download_name=project.get('filename'),
+                conditional=True,
+                etag=digest,
+                last_modified=svc.originals.modified_time(digest),
+                max_age=IMMUTABLE_MAX_AGE
+            )
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+            return response
+
+        # Projects uploaded before content-addressed storage kept a plain path
+        if 'original_pdf_path' in project and os.path.exists(project['original_pdf_path']):
+            return send_file(
+                project['original_pdf_path'],
+                mimetype='application/pdf',
+                as_attachment=False,
+                conditional=True
+            )
+
+        return jsonify({'error': 'Original PDF not found'}), 404
+    except Exception as e:
+        print(f"Error serving original PDF: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/previews/<digest>', methods=['GET'])
+def get_preview_status(digest):
+    """Report whether previews for a PDF (by SHA-256) are ready, with their URLs"""
+    if not is_digest(digest):
+        return jsonify({'error': 'Invalid digest'}), 404
+
+    manifest = services().previews.status(digest)
+    if manifest['status'] == 'ready':
+        manifest['thumbnail_url'] = f"/api/previews/{digest}/thumbnail.png"
+        manifest['page_urls'] = [
+            f"/api/previews/{digest}/pages/{page}.png"
+            for page in range(1, manifest['rendered_pages'] + 1)
+        ]
+    return jsonify(dict(manifest, success=True))
+
+@api.route('/api/previews/<digest>/thumbnail.png', methods=['GET'])
+@api.route('/api/previews/<digest>/pages/<int:page>.png', methods=['GET'])
+def get_preview_image(digest, page=None):
+    """Serve a cached thumbnail or page image; content-addressed, so cacheable forever"""
+    name = 'thumbnail.png' if page is None else f"page-{page}.png"
+    path = services().previews.get(digest, name) if is_digest(digest) else None
+    CACHE_REQUESTS.inc(cache='preview', result='hit' if path else 'miss')
+    if not path:
+        return jsonify({'error': 'Preview not available'}), 404
+
+    response = send_file(
+        path,
+        mimetype='image/png',
+        conditional=True,
+        etag=f"{digest}-{name}",
+        max_age=IMMUTABLE_MAX_AGE
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@api.route('/api/health', methods=['GET'])
+def health_check():
+    """Health check endpoint"""
+    svc = services()
+    return jsonify({
+        'status': 'healthy',
+        'message': 'LaScribe API is running',
+        'provider': {'name': svc.config['PROVIDER'], 'configured': svc.provider.is_configured()},
+        'store': svc.store.stats(),
+        'jobs': svc.jobs.stats(),
+        'refinements': svc.refinements.stats(),
+        'refine_admission': svc.refine_admission.stats(),
+        'admission': svc.admission.stats(),
+        'batches': svc.batches.stats(),
+        'static': current_app.extensions['lascribe_static'].stats()
+    })
+
+@api.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics, summed over every server process"""
+    svc = services()
+    # Shared storage looks the same from every process, so these aren't summed
+    gauges = {
+        'lascribe_projects': ('Projects in the store', svc.store.stats()['projects']),
+        'lascribe_preview_cache_bytes': ('Bytes used by the preview cache', svc.previews.stats()['bytes']),
+    }
+    snapshot = current_app.extensions['lascribe_metrics'].collect()
+    return Response(render(snapshot, extra_gauges=gauges), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def start_request():
+    """Start the request's trace (and its profile, if asked for and allowed)"""
+    g.request_started = time.perf_counter()
+    g.trace = tracing.Trace(
+        tracing.new_request_id(request.headers.get('X-Request-ID')),
+        method=request.method,
+        path=request.path
+    )
+    g.trace_token = tracing.activate(g.trace)
+
+    profiler = current_app.extensions['lascribe_profiler']
+    wants_profile = request.args.get('profile') == '1' or request.headers.get('X-Profile') == '1'
+    if (current_app.config['PROFILE_ENABLED'] and wants_profile
+            and profiler.allowed(request.headers.get('X-Profile-Token'))):
+        g.profile = profiler.start()
+
+def finish_request(response):
+    """Record request metrics and return the trace in response headers"""
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUESTS.inc(method=request.method, route=route, status=response.status_code)
+    if 'request_started' in g:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, method=request.method, route=route)
+
+    trace = g.get('trace')
+    if trace is not None:
+        if g.get('profile') is not None:
+            response.headers['X-Profile'] = current_app.extensions['lascribe_profiler'].stop(g.pop('profile'), trace.request_id)
+        response.headers['X-Request-ID'] = trace.request_id
+        response.headers['Server-Timing'] = trace.server_timing()
+        # Lets the frontend's cross-origin JS read Server-Timing
+        response.headers['Timing-Allow-Origin'] = ', '.join(current_app.config['CORS_ORIGINS'])
+        g.status = response.status_code
+    return response
+
+def end_request(error):
+    """Log the request's trace; runs even if the request failed"""
+    if g.get('profile') is not None:
+        current_app.extensions['lascribe_profiler'].stop(g.pop('profile'), g.trace.request_id)
+    trace = g.get('trace')
+    if trace is None:
+        return
+    if current_app.config['TRACE_LOG']:
+        route = request.url_rule.rule if request.url_rule else None
+        trace.log(route=route, status=g.get('status', 500), error=str(error) if error else None)
+    tracing.deactivate(g.trace_token)
+
+def serve_frontend(path):
+    """Serve the frontend application from the in-memory manifest; unknown paths get index.html"""
+    manifest = current_app.extensions['lascribe_static']
+    asset = manifest.get(path) if path else None
+    if asset is None and not path.startswith('assets/'):
+        # Client-side routes; a missing bundle must 404 rather than return HTML
+        asset = manifest.get('index.html')
+    if asset is None:
+        return jsonify({'error': 'Not found'}), 404
+    return asset.response()
+
+
+def collect_store_metrics(store):
+    """Copy the project store's cache counters into the metrics registry"""
+    stats = store.stats()
+    CACHE_REQUESTS.set_total(stats['cache_hits'], cache='project_snapshot', result='hit')
+    CACHE_REQUESTS.set_total(stats['cache_reloads'], cache='project_snapshot', result='miss')
+    CACHE_REQUESTS.set_total(stats['body_cache_hits'], cache='latex_body', result='hit')
+    CACHE_REQUESTS.set_total(stats['body_cache_misses'], cache='latex_body', result='miss')
+
+
+def collect_process_metrics(svc):
+    """Copy this process's admission and job occupancy into gauges, summed over processes on export"""
+    admission = svc.admission.stats()
+    ADMISSION_ACTIVE.set(admission['active'])
+    ADMISSION_WAITING.set(admission['waiting'])
+    ADMISSION_CAPACITY.set(admission['max_active'])
+    jobs = svc.jobs.stats()
+    JOBS_ACTIVE.set(jobs['active'])
+    JOBS_QUEUED.set(jobs['queued'])
+
+
+def create_app(config=None):
+    """Build the app; ``config`` defaults to ``load_config()``"""
+    config = config or load_config()
+    # Static files go through serve_frontend rather than Flask's static route
+    app = Flask(__name__, static_folder=None)
+    app.config.update(config)
+    CORS(
+        app,
+        origins=config['CORS_ORIGINS'],
+        expose_headers=['X-PDF-SHA256', 'X-Request-ID', 'Server-Timing', 'X-Profile']
+    )
+    app.after_request(gzip_response)
+
+    svc = Services(app.config)
+    app.extensions['lascribe'] = svc
+    app.extensions['lascribe_metrics'] = Exporter(os.path.join(config['OUTPUT_FOLDER'], 'metrics'))
+    REGISTRY.add_collector(lambda: collect_store_metrics(svc.store))
+    REGISTRY.add_collector(lambda: collect_process_metrics(svc))
+    app.extensions['lascribe_profiler'] = RequestProfiler(
+        os.path.join(config['OUTPUT_FOLDER'], 'profiles'),
+        token=config['PROFILE_TOKEN']
+    )
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.teardown_request(end_request)
+    # Run in the background so startup isn't delayed
+    threading.Thread(target=svc.warm_up, daemon=True).start()
+
+    # The dist folder is indexed (and compressed) once; restart to pick up a new build
+    app.extensions['lascribe_static'] = StaticManifest(os.path.join(app.root_path, config['STATIC_FOLDER']))
+
+    app.register_blueprint(api)
+    app.add_url_rule('/', 'serve_frontend', serve_frontend, defaults={'path': ''})
+    app.add_url_rule('/<path:path>', 'serve_frontend', serve_frontend)
+    return app
@@ -0,0 +1,138 @@
+"""
+In-memory manifest of the built frontend (``frontend/dist``).
+
+The dist folder is indexed once at startup: each file's bytes, content type,
+ETag and gzip/brotli variants are kept in memory, so serving an asset is a dict
+lookup with no filesystem calls. Variants come from ``<file>.gz`` / ``<file>.br``
+when the build produced them and are otherwise compressed here (brotli only if
+the ``brotli`` package is installed).
+
+Vite's content-hashed bundles (``assets/index-a1B2c3D4.js``) never change, so
+they are served as immutable; everything else, ``index.html`` in particular,
+is revalidated with its ETag.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from flask import Response, request, send_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+    'application/json', 'application/manifest+json', 'image/svg+xml', 'application/xml',
+}
+COMPRESS_MIN_SIZE = 1024
+MAX_INLINE_SIZE = 2 * 1024 * 1024  # larger files are served from disk
+HASHED_NAME_RE = re.compile(r'-[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+ENCODINGS = ('br', 'gzip')
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+class StaticAsset:
+    """One file from the dist folder, with its compressed variants"""
+
+    def __init__(self, path, relative_path):
+        self.path = path
+        self.mimetype = mimetypes.guess_type(relative_path)[0] or 'application/octet-stream'
+        self.immutable = relative_path.startswith('assets/') and bool(HASHED_NAME_RE.search(relative_path))
+        self.modified_time = os.path.getmtime(path)
+        self.size = os.path.getsize(path)
+        self.data = None
+        self.variants = {}
+
+        if self.size > MAX_INLINE_SIZE:
+            self.etag = f"{int(self.modified_time)}-{self.size}"
+            return
+
+        with open(path, 'rb') as f:
+            self.data = f.read()
+        self.etag = hashlib.sha256(self.data).hexdigest()[:20]
+        for encoding in ENCODINGS:
+            variant = self._load_variant(encoding)
+            if variant is not None and len(variant) < self.size:
+                self.variants[encoding] = variant
+
+    def _load_variant(self, encoding):
+        precompressed = self.path + ENCODING_SUFFIXES[encoding]
+        if os.path.exists(precompressed):
+            with open(precompressed, 'rb') as f:
+                return f.read()
+        if self.mimetype not in COMPRESSIBLE_TYPES or self.size < COMPRESS_MIN_SIZE:
+            return None
+        if encoding == 'gzip':
+            return gzip.compress(self.data, compresslevel=9, mtime=0)
+        if brotli is not None:
+            return brotli.compress(self.data, quality=11)
+        return None
+
+    def choose_encoding(self):
+        """Pick the smallest variant the client accepts, or None for identity"""
+        for encoding in ENCODINGS:
+            if encoding in self.variants and request.accept_encodings[encoding]:
+                return encoding
+        return None
+
+    def response(self):
+        cache_seconds = IMMUTABLE_MAX_AGE if self.immutable else 0
+
+        if self.data is None:
+            response = send_file(self.path, mimetype=self.mimetype, conditional=True,
+                                 etag=self.etag, max_age=cache_seconds)
+        else:
+            encoding = self.choose_encoding()
+            body = self.variants[encoding] if encoding else self.data
+            response = Response(body, mimetype=self.mimetype)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+            if self.variants:
+                response.vary.add('Accept-Encoding')
+            response.set_etag(f"{self.etag}-{encoding}" if encoding else self.etag)
+            response.last_modified = self.modified_time
+            response.cache_control.max_age = cache_seconds
+            response.make_conditional(request)
+
+        if self.immutable:
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+        else:
+            # Always revalidate, so a new deploy is picked up on the next load
+            response.cache_control.no_cache = True
+        return response
+
+
+class StaticManifest:
+    """Index of every file in a static folder, built once"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.assets = {}
+        if not os.path.isdir(directory):
+            return
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if any(name.endswith(suffix) for suffix in ENCODING_SUFFIXES.values()):
+                    continue
+                path = os.path.join(root, name)
+                relative_path = os.path.relpath(path, directory).replace(os.sep, '/')
+                self.assets[relative_path] = StaticAsset(path, relative_path)
+
+    def get(self, path):
+        return self.assets.get(path)
+
+    def stats(self):
+        inline = [a for a in self.assets.values() if a.data is not None]
+        return {
+            'files': len(self.assets),
+            'bytes': sum(a.size for a in self.assets.values()),
+            'inline_bytes': sum(len(a.data) + sum(map(len, a.variants.values())) for a in inline),
+            'compressed_files': sum(1 for a in inline if a.variants),
+            'brotli': brotli is not None,
+        }
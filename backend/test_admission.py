@@ -0,0 +1,98 @@
+"""
+Tests for admission.AdmissionController
+
+Run from backend/: python -m pytest test_admission.py
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from admission import AdmissionController, Rejected
+
+
+def test_job_reserved_first_but_started_last_does_not_block_the_pool():
+    # An async upload reserves in the request; its job may start after later ones
+    admission = AdmissionController(max_active=8, per_client=10, queue_size=32)
+    pool = ThreadPoolExecutor(max_workers=4)
+    done = []
+
+    def job(ticket):
+        admission.wait(ticket)
+        try:
+            done.append(ticket)
+        finally:
+            admission.release(ticket)
+
+    first = admission.reserve('client')
+    later = [admission.reserve('client') for _ in range(4)]
+    futures = [pool.submit(job, ticket) for ticket in later]
+    futures.append(pool.submit(job, first))
+    for future in futures:
+        future.result(timeout=5)
+    pool.shutdown()
+
+    assert len(done) == 5
+    stats = admission.stats()
+    assert (stats['active'], stats['waiting'], stats['reserved']) == (0, 0, 0)
+
+
+def test_sync_wait_is_not_held_up_by_reserved_tickets():
+    admission = AdmissionController(max_active=1, per_client=10, queue_size=4)
+    admission.reserve('async-job')  # job not started yet
+    ticket = admission.reserve('sync')
+    admission.wait(ticket, timeout=1)
+    assert ticket.active
+    admission.release(ticket)
+
+
+def test_waiting_tickets_are_admitted_in_fifo_order():
+    admission = AdmissionController(max_active=1, per_client=10, queue_size=4)
+    running = admission.admit('a')
+    order = []
+
+    def waiter(name):
+        ticket = admission.reserve(name)
+        admission.wait(ticket, timeout=5)
+        order.append(name)
+        admission.release(ticket)
+
+    threads = []
+    for name in ('b', 'c'):
+        thread = threading.Thread(target=waiter, args=(name,))
+        thread.start()
+        threads.append(thread)
+        while admission.stats()['waiting'] < len(threads):
+            time.sleep(0.01)
+    admission.release(running)
+    for thread in threads:
+        thread.join(timeout=5)
+    assert order == ['b', 'c']
+
+
+def test_reserved_tickets_count_against_the_queue():
+    admission = AdmissionController(max_active=1, per_client=10, queue_size=1)
+    first = admission.reserve('a')
+    admission.reserve('b')
+    with pytest.raises(Rejected) as rejection:
+        admission.reserve('c')
+    assert rejection.value.reason == 'queue_full'
+
+    # Releasing a ticket that never waited gives its capacity back
+    admission.release(first)
+    assert admission.stats()['reserved'] == 1
+    admission.reserve('c')
+
+
+def test_limits_are_split_between_processes():
+    admission = AdmissionController(max_active=8, per_client=4, queue_size=32, processes=2)
+    assert (admission.max_active, admission.per_client, admission.queue_size) == (4, 2, 16)
+    admission.admit('client')
+    admission.admit('client')
+    with pytest.raises(Rejected) as rejection:
+        admission.reserve('client')
+    assert rejection.value.reason == 'client_limit'
+
+    # Never below one slot per process
+    assert AdmissionController(per_client=2, processes=4).per_client == 1
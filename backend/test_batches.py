@@ -0,0 +1,83 @@
+"""
+Tests for batches: ZIP streaming, duplicate detection and batch progress
+
+Run from backend/: python -m pytest test_batches.py
+"""
+import hashlib
+import io
+import os
+import time
+import zipfile
+
+import pytest
+
+from admission import AdmissionController
+from batches import BatchError, BatchTracker, iter_upload_entries, save_stream
+from project_store import ProjectStore
+
+
+def make_zip(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def test_zip_entries_are_streamed_skipping_non_pdfs_and_metadata():
+    archive = make_zip({'a.pdf': b'A', 'sub/B.PDF': b'B', 'notes.txt': b'x',
+                        '__MACOSX/a.pdf': b'x', 'sub/.hidden.pdf': b'x'})
+    entries = [(name, entry.read()) for name, entry in iter_upload_entries('batch.zip', archive, max_files=5)]
+    assert entries == [('a.pdf', b'A'), ('sub/B.PDF', b'B')]
+
+
+@pytest.mark.parametrize('filename, data', [
+    ('notes.txt', b'x'),
+    ('batch.zip', b'not a zip'),
+])
+def test_unusable_uploads_are_batch_errors(filename, data):
+    with pytest.raises(BatchError):
+        list(iter_upload_entries(filename, io.BytesIO(data), max_files=5))
+
+
+def test_zip_with_too_many_pdfs_is_rejected():
+    archive = make_zip({f'{i}.pdf': b'x' for i in range(3)})
+    with pytest.raises(BatchError):
+        list(iter_upload_entries('batch.zip', archive, max_files=2))
+
+
+def test_save_stream_hashes_and_removes_oversized_files(tmp_path):
+    path = str(tmp_path / 'upload.pdf')
+    assert save_stream(io.BytesIO(b'hello'), path, max_bytes=10) == (hashlib.sha256(b'hello').hexdigest(), 5)
+    with pytest.raises(BatchError):
+        save_stream(io.BytesIO(b'x' * 11), path, max_bytes=10)
+    assert not os.path.exists(path)
+
+
+def test_identical_files_are_converted_once(tmp_path):
+    store = ProjectStore(str(tmp_path / 'projects'), compact_interval=0, fsync=False)
+    store.create_project({'id': 'existing', 'original_pdf_sha256': hashlib.sha256(b'old').hexdigest()})
+    converted = []
+
+    def convert(path, filename):
+        converted.append(filename)
+        os.remove(path)
+        return store.create_project({'id': filename})
+
+    tracker = BatchTracker(str(tmp_path / 'batches'), store, convert, AdmissionController())
+    batch_id = tracker.create('client')
+    for i, data in enumerate([b'new', b'new', b'old']):
+        path = str(tmp_path / f'{i}.pdf')
+        digest, size = save_stream(io.BytesIO(data), path, max_bytes=100)
+        tracker.add_file(batch_id, f'{i}.pdf', f'{i}.pdf', path, digest, size)
+    assert not os.path.exists(tmp_path / '1.pdf') and not os.path.exists(tmp_path / '2.pdf')
+
+    tracker.start(batch_id)
+    deadline = time.monotonic() + 5
+    while tracker.get(batch_id)['status'] != 'done' and time.monotonic() < deadline:
+        time.sleep(0.01)
+    files = tracker.get(batch_id)['files']
+    assert converted == ['0.pdf']
+    assert [(f['status'], f['project_id']) for f in files] == [
+        ('done', '0.pdf'), ('duplicate', '0.pdf'), ('duplicate', 'existing')]
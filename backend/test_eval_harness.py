@@ -0,0 +1,57 @@
+"""
+Tests for benchmarks/eval_harness.py
+
+Run from backend/: python -m pytest test_eval_harness.py
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+
+import eval_harness  # noqa: E402
+
+BASELINE = {'documents': 3, 'failed': 0, 'mean_similarity': 0.9, 'compile_rate': 1.0,
+            'first_error_rate': 0.0, 'mean_seconds': 2.0, 'cost_usd': 0.1}
+
+
+def write_baseline(tmp_path):
+    path = tmp_path / 'baseline.json'
+    path.write_text(json.dumps({'summary': {'anthropic': BASELINE}}))
+    return str(path)
+
+
+def test_compare_passes_an_unchanged_run(tmp_path):
+    assert eval_harness.compare({'anthropic': dict(BASELINE)}, write_baseline(tmp_path), threshold=5)
+
+
+def test_compare_fails_a_run_that_lost_every_document(tmp_path):
+    # Replaying without recordings: every row is an error and the metrics are None
+    rows = [{'setting': 'anthropic', 'fixture': name, 'error': 'no recording'} for name in 'abc']
+    summary = eval_harness.summarize(rows)
+    assert summary['anthropic']['mean_similarity'] is None
+    assert not eval_harness.compare(summary, write_baseline(tmp_path), threshold=5)
+
+
+def test_compare_fails_new_failures_with_unchanged_means(tmp_path):
+    summary = {'anthropic': dict(BASELINE, documents=2, failed=1)}
+    assert not eval_harness.compare(summary, write_baseline(tmp_path), threshold=5)
+
+
+def test_replay_refuses_a_recording_made_with_another_prompt(tmp_path, monkeypatch):
+    monkeypatch.setattr(eval_harness, 'RECORDINGS_DIR', str(tmp_path))
+    setting = eval_harness.Setting('anthropic+terse', {'terse': 'Be terse.'})
+    path = eval_harness.recording_path(setting.name, 'notes')
+    os.makedirs(os.path.dirname(path))
+
+    def replay():
+        return eval_harness.evaluate(setting, 'notes', None, 'x', live=False, record=False, check_compile=False)
+
+    recording = {'prompt_sha256': setting.prompt_sha256, 'seconds': 1.0,
+                 'input_tokens': 0, 'output_tokens': 0, 'latex': 'x'}
+    with open(path, 'w') as f:
+        json.dump(recording, f)
+    assert replay()['similarity'] == 1.0
+
+    setting.prompt = 'Be thorough.'
+    assert 'different prompt' in replay()['error']
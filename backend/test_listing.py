@@ -0,0 +1,58 @@
+"""
+Tests for listing.paginate_projects and its cursors
+
+Run from backend/: python -m pytest test_listing.py
+"""
+import base64
+import json
+
+import pytest
+
+from listing import ListingError, encode_cursor, paginate_projects
+
+PROJECTS = [{'id': f'p{i}', 'name': f'n{i % 3}', 'updated_at': f'2024-01-0{i}'} for i in range(1, 8)]
+
+
+def all_pages(projects, **kwargs):
+    pages, cursor = [], None
+    while True:
+        page, cursor = paginate_projects(projects, cursor=cursor, **kwargs)
+        pages.append([p['id'] for p in page])
+        if cursor is None:
+            return pages
+
+
+def test_pages_cover_every_project_once_in_order():
+    assert all_pages(PROJECTS, limit=3) == [['p7', 'p6', 'p5'], ['p4', 'p3', 'p2'], ['p1']]
+    # Ties on the sort field are broken by id
+    pages = all_pages(PROJECTS, sort='name', order='asc', limit=2)
+    assert sum(pages, []) == ['p3', 'p6', 'p1', 'p4', 'p7', 'p2', 'p5']
+
+
+def test_pages_stay_stable_when_projects_are_deleted():
+    first, cursor = paginate_projects(PROJECTS, limit=3)
+    remaining = [p for p in PROJECTS if p['id'] not in ('p7', 'p4')]
+    page, _ = paginate_projects(remaining, limit=3, cursor=cursor)
+    assert [p['id'] for p in page] == ['p3', 'p2', 'p1']
+
+
+def raw_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode('utf-8')).decode('ascii')
+
+
+@pytest.mark.parametrize('cursor', [
+    'not a cursor!',
+    raw_cursor(['updated_at', 5, 'p1']),
+    raw_cursor(['updated_at', '2024-01-03', None]),
+    raw_cursor(['updated_at', ['2024'], 'p1']),
+    raw_cursor('abc'),
+    raw_cursor({'a': 1}),
+])
+def test_malformed_cursors_are_listing_errors(cursor):
+    with pytest.raises(ListingError):
+        paginate_projects(PROJECTS, cursor=cursor)
+
+
+def test_cursor_for_another_sort_is_rejected():
+    with pytest.raises(ListingError):
+        paginate_projects(PROJECTS, sort='name', cursor=encode_cursor('updated_at', '2024-01-03', 'p3'))
@@ -0,0 +1,32 @@
+"""
+Tests for metrics.Exporter
+
+Run from backend/: python -m pytest test_metrics.py
+"""
+import json
+import os
+
+from metrics import Counter, Exporter, Gauge, Registry, render
+
+
+def test_gauges_are_summed_over_live_processes_and_dropped_for_exited_ones(tmp_path):
+    registry = Registry()
+    active = registry.register(Gauge('test_active', 'Running'))
+    requests = registry.register(Counter('test_requests_total', 'Requests'))
+    active.set(3)
+    requests.inc(2)
+    exporter = Exporter(str(tmp_path), registry=registry, interval=3600)
+
+    with open(tmp_path / f'{os.getppid()}.json', 'w') as f:
+        json.dump({'test_active': {'[]': 4}, 'test_requests_total': {'[]': 5}}, f)
+    with open(tmp_path / '999999999.json', 'w') as f:
+        json.dump({'test_active': {'[]': 7}, 'test_requests_total': {'[]': 1}}, f)
+
+    text = render(exporter.collect(), registry=registry)
+    assert '# TYPE test_active gauge\ntest_active 7\n' in text
+    assert 'test_requests_total 8\n' in text
+
+    # The exited process's counters are kept, its gauge is not
+    text = render(exporter.collect(), registry=registry)
+    assert 'test_active 7\n' in text
+    assert 'test_requests_total 8\n' in text
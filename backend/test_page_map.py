@@ -0,0 +1,39 @@
+"""
+Tests for page_map.page_span and parse_region
+
+Run from backend/: python -m pytest test_page_map.py
+"""
+import pytest
+
+from page_map import PageMapError, page_span, parse_region
+
+LATEX = "\\begin{document}\n% Page 1\none\n\n  % Page 2  \ntwo\n\n\\end{document}\n"
+
+
+def content(latex, page):
+    start, end = page_span(latex, page)
+    return latex[start:end]
+
+
+def test_a_page_runs_to_the_next_marker_or_the_end_of_the_document():
+    assert content(LATEX, 1) == 'one\n\n'
+    assert content(LATEX, 2) == 'two\n\n'
+    assert content('% Page 1\nno end', 1) == 'no end'
+
+
+def test_markers_must_be_whole_lines():
+    with pytest.raises(PageMapError):
+        page_span('text % Page 1\nx\n', 1)
+    with pytest.raises(PageMapError):
+        page_span(LATEX, 3)
+
+
+@pytest.mark.parametrize('value', [[0, 0, 1], ['a', 0, 1, 1], [0.5, 0, 0.5, 1], [0, 0, 1, 1.5], 'left'])
+def test_invalid_regions_are_rejected(value):
+    with pytest.raises(PageMapError):
+        parse_region(value)
+
+
+def test_regions_are_fractions():
+    assert parse_region(None) is None
+    assert parse_region([0, '0.25', 1, 0.75]) == (0.0, 0.25, 1.0, 0.75)
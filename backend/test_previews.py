@@ -0,0 +1,72 @@
+"""
+Tests for previews.PreviewCache, with pdf2image replaced
+
+Run from backend/: python -m pytest test_previews.py
+"""
+import os
+import threading
+import time
+
+import pdf2image
+import pytest
+from PIL import Image
+
+from previews import PreviewCache
+
+DIGEST = 'ab' * 32
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    sources = []
+    started = threading.Barrier(2, timeout=5)
+
+    def pdfinfo_from_path(source):
+        sources.append(source)
+        # Keep both renders in flight at once
+        started.wait()
+        return {'Pages': 1}
+
+    def convert_from_path(source, **options):
+        assert os.path.exists(source)
+        time.sleep(0.05)
+        return [Image.new('RGB', (10, 10))]
+
+    monkeypatch.setattr(pdf2image, 'pdfinfo_from_path', pdfinfo_from_path)
+    monkeypatch.setattr(pdf2image, 'convert_from_path', convert_from_path)
+    return sources
+
+
+def wait_until_rendered(cache):
+    deadline = time.monotonic() + 5
+    while cache.status(DIGEST)['status'] == 'pending':
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_concurrent_renders_of_one_pdf_in_two_processes(tmp_path, renders):
+    # Two caches over one directory stand in for two server processes
+    first, second = PreviewCache(str(tmp_path)), PreviewCache(str(tmp_path))
+    first.schedule_bytes(DIGEST, b'%PDF-1.4')
+    second.schedule_bytes(DIGEST, b'%PDF-1.4')
+    wait_until_rendered(first)
+    wait_until_rendered(second)
+
+    assert len(set(renders)) == 2
+    for cache in (first, second):
+        assert cache.status(DIGEST)['status'] == 'ready'
+        assert cache.get(DIGEST, 'page-1.png')
+    assert os.listdir(first.staging_dir) == []
+    assert os.listdir(tmp_path / DIGEST[:2]) == [DIGEST]
+
+
+def test_schedule_stages_its_own_copy(tmp_path, renders):
+    source = tmp_path / 'upload.pdf'
+    source.write_bytes(b'%PDF-1.4')
+    first, second = PreviewCache(str(tmp_path / 'cache')), PreviewCache(str(tmp_path / 'cache'))
+    first.schedule(DIGEST, str(source))
+    second.schedule(DIGEST, str(source))
+    source.unlink()
+    wait_until_rendered(first)
+    wait_until_rendered(second)
+    assert first.status(DIGEST)['status'] == second.status(DIGEST)['status'] == 'ready'
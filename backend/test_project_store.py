@@ -0,0 +1,95 @@
+"""
+Tests for project_store.ProjectStore: log replay, repair, compaction and blob GC
+
+Run from backend/: python -m pytest test_project_store.py
+"""
+import os
+
+import pytest
+
+from blob_store import BlobStore
+from project_store import ProjectStore, RevisionConflict
+
+
+def open_store(directory, **kwargs):
+    kwargs.setdefault('attachments', {'original_pdf_sha256': BlobStore(os.path.join(directory, 'originals'), fsync=False)})
+    return ProjectStore(str(directory), compact_interval=0, fsync=False, **kwargs)
+
+
+def test_log_is_replayed_by_a_new_store_and_by_another_open_one(tmp_path):
+    writer, reader = open_store(tmp_path), open_store(tmp_path)
+    writer.create_project({'id': 'a', 'name': 'A', 'latex_code': 'hello world'})
+    writer.patch_project('a', 1, [[0, 5, 'goodbye']])
+    writer.update_project('a', {'name': 'renamed'})
+
+    for store in (reader, open_store(tmp_path)):
+        project = store.get_project('a')
+        assert (project['name'], project['revision'], project['latex_code']) == ('renamed', 2, 'goodbye world')
+    assert writer.history.get_text('a', 1) == 'hello world'
+
+
+def test_stale_base_revision_raises_a_conflict(tmp_path):
+    store = open_store(tmp_path)
+    store.create_project({'id': 'a', 'latex_code': 'x'})
+    store.patch_project('a', 1, [[0, 1, 'y']])
+    with pytest.raises(RevisionConflict) as conflict:
+        store.patch_project('a', 1, [[0, 1, 'z']])
+    assert conflict.value.project['revision'] == 2
+    assert store.get_project('a')['latex_code'] == 'y'
+
+
+def test_torn_tail_is_truncated_and_later_writes_survive(tmp_path):
+    store = open_store(tmp_path)
+    store.create_project({'id': 'a', 'latex_code': 'x'})
+    store.close()
+    log_path = os.path.join(tmp_path, 'projects.log')
+    intact = os.path.getsize(log_path)
+    with open(log_path, 'ab') as f:
+        f.write(b'{"op":"create","project":{"id":"b"')
+
+    store = open_store(tmp_path)
+    assert os.path.getsize(log_path) == intact
+    assert [p['id'] for p in store.list_projects()] == ['a']
+    store.create_project({'id': 'c', 'latex_code': 'y'})
+    assert [p['id'] for p in open_store(tmp_path).list_projects()] == ['a', 'c']
+
+
+def test_compaction_keeps_state_and_drops_unreferenced_bodies(tmp_path):
+    store, other = open_store(tmp_path), open_store(tmp_path)
+    store.create_project({'id': 'a', 'latex_code': 'first'})
+    store.create_project({'id': 'b', 'latex_code': 'gone'})
+    old_blob = store.get_project('a')['latex_blob']
+    store.update_project('a', {'latex_code': 'second'})
+    store.delete_project('b')
+    stale_log = open(os.path.join(tmp_path, 'projects.log'), 'rb').read()
+
+    store.compact()
+    assert os.path.getsize(os.path.join(tmp_path, 'projects.log')) == 0
+    assert set(store.blobs.digests()) == {store.get_project('a')['latex_blob']}
+    assert not store.blobs.exists(old_blob)
+    # A store that replayed the old log picks up the new snapshot
+    assert [(p['id'], p['revision']) for p in other.list_projects()] == [('a', 2)]
+
+    # Replaying the old records over the snapshot (a crash between the renames) changes nothing
+    with open(os.path.join(tmp_path, 'projects.log'), 'ab') as f:
+        f.write(stale_log)
+    reopened = open_store(tmp_path)
+    assert [(p['id'], p['revision']) for p in reopened.list_projects()] == [('a', 2)]
+    assert reopened.get_project('a')['latex_code'] == 'second'
+
+
+def test_attachments_are_shared_and_removed_with_the_last_reference(tmp_path):
+    store = open_store(tmp_path)
+    originals = store.attachments['original_pdf_sha256']
+    pdf = tmp_path / 'upload.pdf'
+    pdf.write_bytes(b'%PDF-1.4 same upload')
+    first = store.create_project({'id': 'a'}, attachments={'original_pdf_sha256': str(pdf)})
+    second = store.create_project({'id': 'b'}, attachments={'original_pdf_sha256': str(pdf)})
+    digest = first['original_pdf_sha256']
+    assert second['original_pdf_sha256'] == digest
+    assert list(originals.digests()) == [digest]
+
+    store.delete_project('a')
+    assert originals.exists(digest)
+    store.delete_project('b')
+    assert not originals.exists(digest)
@@ -0,0 +1,28 @@
+"""
+Tests for the provider modules in models/, with their API calls replaced
+
+Run from backend/: python -m pytest test_providers.py
+"""
+import pytest
+
+from models import openai_latex
+from models.text import strip_code_fences
+
+
+def test_openai_conversion_fails_if_any_page_fails(monkeypatch):
+    def convert_page(image_path, page_num, model=openai_latex.MODEL):
+        if page_num == 2:
+            raise RuntimeError('rate limited')
+        return f'page {page_num}'
+
+    monkeypatch.setattr(openai_latex, 'get_client', lambda: None)
+    monkeypatch.setattr(openai_latex, 'pdf_to_images', lambda pdf_path, output_dir: ['1.png', '2.png', '3.png'])
+    monkeypatch.setattr(openai_latex, 'generate_latex_from_image', convert_page)
+    with pytest.raises(RuntimeError, match='rate limited'):
+        openai_latex.generate_latex_from_pdf('notes.pdf', draft=True)
+
+
+def test_code_fences_are_stripped():
+    assert strip_code_fences('```latex\n\\frac{1}{2}\n```\n') == '\\frac{1}{2}'
+    assert strip_code_fences('```\nx\n```') == 'x'
+    assert strip_code_fences('  x  ') == 'x'
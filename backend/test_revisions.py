@@ -0,0 +1,44 @@
+"""
+Tests for revisions: text deltas and revision history
+
+Run from backend/: python -m pytest test_revisions.py
+"""
+import pytest
+
+from revisions import DeltaError, RevisionHistory, apply_delta, make_delta
+
+
+def test_apply_delta_replaces_each_range():
+    assert apply_delta('hello world', [[0, 5, 'goodbye'], [6, 11, 'moon']]) == 'goodbye moon'
+
+
+@pytest.mark.parametrize('delta', [
+    'not a list',
+    [[0, 1]],
+    [[2, 1, 'x']],
+    [[0, 99, 'x']],
+    [[3, 4, 'x'], [0, 1, 'y']],
+    [[0, 1, 2]],
+    [[False, True, 'x']],
+    [[0.0, 1, 'x']],
+])
+def test_apply_delta_rejects_malformed_edits(delta):
+    with pytest.raises(DeltaError):
+        apply_delta('hello', delta)
+
+
+def test_make_delta_round_trips():
+    old, new = 'the quick brown fox', 'the slow brown cat'
+    assert apply_delta(old, make_delta(old, new)) == new
+
+
+def test_history_rebuilds_every_revision_across_snapshots(tmp_path):
+    history = RevisionHistory(str(tmp_path), snapshot_every=3)
+    texts = ['a', 'ab', 'abc', 'xbc', 'xbcd', 'xd']
+    history.record('p', 1, texts[0])
+    for revision, (old, new) in enumerate(zip(texts, texts[1:]), start=2):
+        history.record('p', revision, new, make_delta(old, new))
+
+    assert [r['snapshot'] for r in history.list_revisions('p')] == [True, False, False, True, False, False]
+    assert [history.get_text('p', revision) for revision in range(1, 7)] == texts
+    assert history.get_text('p', 7) is None
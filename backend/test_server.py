@@ -0,0 +1,184 @@
+"""
+Tests for the API routes in server.py, with the provider and rasterizer replaced
+
+Run from backend/: python -m pytest test_server.py
+"""
+import io
+import json
+import os
+import time
+
+import pytest
+
+import server
+from config import load_config
+
+# A one-page PDF; only its bytes matter, nothing renders it
+PDF = b"%PDF-1.4\n1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n" \
+      b"2 0 obj << /Type /Pages /Kids [3 0 R] /Count 1 >> endobj\n" \
+      b"3 0 obj << /Type /Page /Parent 2 0 R >> endobj\ntrailer << /Root 1 0 R >>\n%%EOF\n"
+
+DOCUMENT = "\\documentclass{article}\n\\begin{document}\n% Page 1\nold page\n\n\\end{document}"
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # Default settings, with the relative storage folders landing in tmp_path
+    monkeypatch.chdir(tmp_path)
+    app = server.create_app(load_config())
+    svc = app.extensions['lascribe']
+    monkeypatch.setattr(svc, 'generate_latex_from_pdf', lambda path, draft=False: DOCUMENT)
+    monkeypatch.setattr(svc.provider, 'generate_latex_from_image', lambda path, page: 'new page')
+    monkeypatch.setattr(server, 'render_page', lambda pdf_path, page, output_path, region=None: output_path)
+    return app
+
+
+def upload(client):
+    response = client.post('/api/upload-pdf', data={'file': (io.BytesIO(PDF), 'notes.pdf')})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['project_id']
+
+
+def test_default_config_can_regenerate_a_page(app):
+    client = app.test_client()
+    project_id = upload(client)
+
+    response = client.post(f'/api/projects/{project_id}/regenerate', json={'page': 1})
+    assert response.status_code == 200, response.get_json()
+    project = response.get_json()['project']
+    assert project['revision'] == 2
+    assert '% Page 1\nnew page\n\n\\end{document}' in project['latex_code']
+
+
+def test_regenerate_splices_into_a_page_that_moved_while_converting(app):
+    svc = app.extensions['lascribe']
+    client = app.test_client()
+    project_id = upload(client)
+
+    def convert_page(path, page):
+        svc.store.patch_project(project_id, 1, [[0, 0, '% edited\n']])
+        return 'new page'
+
+    svc.provider.generate_latex_from_image = convert_page
+    response = client.post(f'/api/projects/{project_id}/regenerate', json={'page': 1})
+    assert response.status_code == 200, response.get_json()
+    project = response.get_json()['project']
+    assert project['revision'] == 3
+    assert project['latex_code'].startswith('% edited\n')
+    assert '% Page 1\nnew page\n\n\\end{document}' in project['latex_code']
+
+
+def refine(app, project_id, base_revision, convert):
+    svc = app.extensions['lascribe']
+    svc.generate_latex_from_pdf = convert
+    project = svc.store.get_project(project_id)
+    return svc.refine_job('job', project_id, base_revision, svc.originals.path(project['original_pdf_sha256']), False)
+
+
+def test_refine_replaces_an_untouched_draft(app):
+    project_id = upload(app.test_client())
+    result = refine(app, project_id, 1, lambda path, draft=False: 'refined')
+    assert result == {'project_id': project_id, 'revision': 2, 'refinement': 'done'}
+    project = app.extensions['lascribe'].store.get_project(project_id)
+    assert (project['latex_code'], project['refinement']) == ('refined', 'done')
+
+
+def test_refine_skips_an_edited_draft_without_calling_the_provider(app):
+    client = app.test_client()
+    project_id = upload(client)
+    client.patch(f'/api/projects/{project_id}', json={'base_revision': 1, 'delta': [[0, 0, '% edited\n']]})
+
+    def convert(path, draft=False):
+        raise AssertionError('provider called for an edited draft')
+
+    assert refine(app, project_id, 1, convert)['refinement'] == 'skipped'
+    project = app.extensions['lascribe'].store.get_project(project_id)
+    assert project['refinement'] == 'skipped'
+    assert project['latex_code'].startswith('% edited\n')
+
+
+def test_refine_keeps_an_edit_made_while_it_ran(app):
+    client = app.test_client()
+    project_id = upload(client)
+
+    def convert(path, draft=False):
+        client.patch(f'/api/projects/{project_id}', json={'base_revision': 1, 'delta': [[0, 0, '% edited\n']]})
+        return 'refined'
+
+    assert refine(app, project_id, 1, convert)['refinement'] == 'skipped'
+    project = app.extensions['lascribe'].store.get_project(project_id)
+    assert project['revision'] == 2
+    assert project['latex_code'].startswith('% edited\n')
+
+
+def test_refinements_have_their_own_admission_share(app):
+    svc = app.extensions['lascribe']
+    assert (svc.admission.max_active, svc.refine_admission.max_active) == (6, 2)
+    # Refinements filling their share leave every upload slot free
+    tickets = [svc.refine_admission.admit('refine') for _ in range(2)]
+    assert svc.admission.stats()['active'] == 0
+    svc.admission.release(svc.admission.admit('client'))
+    for ticket in tickets:
+        svc.refine_admission.release(ticket)
+
+
+def test_jobs_of_an_exited_process_are_failed_and_cleaned_up(app):
+    svc = app.extensions['lascribe']
+    project_id = upload(app.test_client())
+    svc.store.update_project(project_id, {'refinement': 'pending'})
+    upload_path = os.path.join(svc.config['UPLOAD_FOLDER'], 'orphan.pdf')
+    with open(upload_path, 'wb') as f:
+        f.write(PDF)
+    job = {'id': 'a' * 32, 'kind': 'refine', 'status': 'running', 'owner': '999999999:1',
+           'project_id': project_id, 'upload': 'orphan.pdf'}
+    with open(os.path.join(svc.jobs.directory, f"{job['id']}.json"), 'w') as f:
+        json.dump(job, f)
+    live_id = svc.jobs.submit('refine', lambda job_id: time.sleep(0.2), details={'project_id': project_id})
+
+    svc.recover_jobs()
+    assert svc.jobs.get(job['id'])['status'] == 'failed'
+    assert svc.jobs.get(live_id)['status'] in ('queued', 'running')
+    assert svc.store.get_project(project_id)['refinement'] == 'failed'
+    assert not os.path.exists(upload_path)
+
+
+def test_failed_conversion_creates_no_project(app):
+    def convert(path, draft=False):
+        raise RuntimeError('provider unavailable')
+
+    app.extensions['lascribe'].generate_latex_from_pdf = convert
+    client = app.test_client()
+    response = client.post('/api/upload-pdf', data={'file': (io.BytesIO(PDF), 'notes.pdf')})
+    assert response.status_code == 500
+    assert response.get_json()['error'] == 'provider unavailable'
+    assert app.extensions['lascribe'].store.list_projects() == []
+
+
+@pytest.mark.parametrize('body', [
+    {'base_revision': '1', 'delta': [[0, 0, 'x']]},
+    {'base_revision': True, 'delta': [[0, 0, 'x']]},
+    {'base_revision': 1, 'delta': [[False, True, 'x']]},
+    {'base_revision': '1', 'latex_code': 'x'},
+])
+def test_update_rejects_non_integer_revisions_and_offsets(app, body):
+    client = app.test_client()
+    project_id = upload(client)
+    response = client.patch(f'/api/projects/{project_id}', json=body)
+    assert response.status_code == 400, response.get_json()
+
+
+def test_stale_delta_is_a_conflict(app):
+    client = app.test_client()
+    project_id = upload(client)
+    assert client.patch(f'/api/projects/{project_id}', json={'base_revision': 1, 'delta': [[0, 0, 'a']]}).status_code == 200
+    response = client.patch(f'/api/projects/{project_id}', json={'base_revision': 1, 'delta': [[0, 0, 'b']]})
+    assert response.status_code == 409
+    assert response.get_json()['revision'] == 2
+
+
+@pytest.mark.parametrize('page', [True, 0, '1', 1.0, None])
+def test_regenerate_rejects_a_page_that_is_not_a_positive_integer(app, page):
+    client = app.test_client()
+    project_id = upload(client)
+    response = client.post(f'/api/projects/{project_id}/regenerate', json={'page': page})
+    assert response.status_code == 400, response.get_json()
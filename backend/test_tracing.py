@@ -0,0 +1,28 @@
+"""
+Tests for tracing request ids and RequestProfiler
+
+Run from backend/: python -m pytest test_tracing.py
+"""
+import os
+
+import pytest
+
+from tracing import RequestProfiler, new_request_id
+
+
+@pytest.mark.parametrize('incoming', ['../../etc/passwd', 'a b', 'x' * 65, ''])
+def test_unsafe_request_ids_are_replaced(incoming):
+    request_id = new_request_id(incoming)
+    assert request_id != incoming
+    assert len(request_id) == 16
+
+
+def test_profiles_with_the_same_request_id_do_not_overwrite_each_other(tmp_path):
+    profiler = RequestProfiler(str(tmp_path))
+    names = []
+    for _ in range(2):
+        profile = profiler.start()
+        names.append(profiler.stop(profile, 'client-id'))
+    assert names[0] != names[1]
+    assert all(name.startswith('client-id.') and name.endswith('.prof') for name in names)
+    assert sorted(os.listdir(tmp_path)) == sorted(names)
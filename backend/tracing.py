@@ -0,0 +1,159 @@
+"""
+Lightweight request tracing.
+
+Every request gets a request id (the client's ``X-Request-ID`` if it sent a
+sane one) and a trace that collects timed spans: ``metrics.timed()`` stages
+plus any ``span()`` blocks. When the request finishes the spans are returned
+in a ``Server-Timing`` header, which browser dev tools show per request, and
+printed as one JSON log line. Background jobs get traces of their own.
+
+Code outside a trace (scripts, tests) can call ``span()`` freely; it does nothing.
+
+``RequestProfiler`` captures a cProfile of a single request on demand, written
+to ``<directory>/<request id>.<pid>.<timestamp>.prof`` for ``snakeviz`` or
+``pstats``. The suffix keeps a client that reuses an ``X-Request-ID`` from
+overwriting an earlier profile.
+"""
+import contextvars
+import cProfile
+import hmac
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+REQUEST_ID_RE = re.compile(r'[A-Za-z0-9._-]{1,64}')
+
+_current = contextvars.ContextVar('lascribe_trace', default=None)
+
+
+def new_request_id(incoming=None):
+    """Use the caller's request id if it is safe to echo and log, else make one"""
+    if incoming and REQUEST_ID_RE.fullmatch(incoming):
+        return incoming
+    return uuid.uuid4().hex[:16]
+
+
+class Trace:
+    """Spans recorded for one request or job"""
+
+    def __init__(self, request_id, **fields):
+        self.request_id = request_id
+        self.fields = fields
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def add(self, name, duration):
+        self.spans.append((name, duration))
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def totals(self):
+        """Milliseconds per span name, in first-seen order (repeated spans are summed)"""
+        totals = {}
+        for name, duration in self.spans:
+            totals[name] = totals.get(name, 0) + duration * 1000
+        return totals
+
+    def server_timing(self):
+        entries = [f"{name};dur={ms:.1f}" for name, ms in self.totals().items()]
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ', '.join(entries)
+
+    def log(self, **fields):
+        record = {
+            'time': datetime.now().isoformat(),
+            'request_id': self.request_id,
+            **self.fields,
+            **fields,
+            'duration_ms': round(self.elapsed() * 1000, 1),
+            'spans': {name: round(ms, 1) for name, ms in self.totals().items()},
+        }
+        print(json.dumps(record), flush=True)
+
+
+def current():
+    return _current.get()
+
+
+def activate(trace):
+    """Make ``trace`` current; returns a token for ``deactivate``"""
+    return _current.set(trace)
+
+
+def deactivate(token):
+    try:
+        _current.reset(token)
+    except ValueError:
+        # Token from another context (e.g. a teardown on a different thread)
+        _current.set(None)
+
+
+@contextmanager
+def trace(request_id, **fields):
+    """Run a block under a new trace, e.g. a background job"""
+    new_trace = Trace(request_id, **fields)
+    token = activate(new_trace)
+    try:
+        yield new_trace
+    finally:
+        deactivate(token)
+
+
+def record_span(name, duration):
+    active = _current.get()
+    if active is not None:
+        active.add(name, duration)
+
+
+@contextmanager
+def span(name):
+    """Time a block into the current trace"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start)
+
+
+class RequestProfiler:
+    """Profiles single requests on demand, one at a time"""
+
+    def __init__(self, directory, token=''):
+        self.directory = directory
+        self.token = token
+        # Only one cProfile can be active per process
+        self._lock = threading.Lock()
+
+    def allowed(self, token):
+        """Profiling needs the configured token when one is set"""
+        return not self.token or hmac.compare_digest(token or '', self.token)
+
+    def start(self):
+        """Return an enabled profiler, or None if another request is being profiled"""
+        if not self._lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) is already active
+            self._lock.release()
+            return None
+        return profile
+
+    def stop(self, profile, request_id):
+        """Disable ``profile``, save it and return the file name"""
+        try:
+            profile.disable()
+            os.makedirs(self.directory, exist_ok=True)
+            filename = f"{request_id}.{os.getpid()}.{time.time_ns()}.prof"
+            profile.dump_stats(os.path.join(self.directory, filename))
+            return filename
+        finally:
+            self._lock.release()
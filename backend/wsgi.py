@@ -0,0 +1,10 @@
+"""
+Production entry point.
+
+    cd backend && gunicorn -c gunicorn.conf.py wsgi:app
+
+Configure with LASCRIBE_* environment variables (see config.py).
+"""
+from server import create_app
+
+app = create_app()
@@ -3,10 +3,11 @@ import { motion } from 'framer-motion';
 
 interface LaTeXViewerProps {
   code: string;
+  projectId?: string;
   onCodeChange?: (newCode: string) => void;
 }
 
-const LaTeXViewer = ({ code, onCodeChange }: LaTeXViewerProps) => {
+const LaTeXViewer = ({ code, projectId, onCodeChange }: LaTeXViewerProps) => {
   const [copied, setCopied] = useState(false);
   const [activeTab, setActiveTab] = useState<'code' | 'preview'>('code');
   const [editableCode, setEditableCode] = useState(code);
@@ -74,7 +75,8 @@ const LaTeXViewer = ({ code, onCodeChange }: LaTeXViewerProps) => {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ latex: editableCode }),
+        // project_id lets the backend attach previews of the result to the project
+        body: JSON.stringify({ latex: editableCode, project_id: projectId }),
       });
 
       console.log('Response status:', response.status);
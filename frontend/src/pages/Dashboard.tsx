@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { motion } from 'framer-motion';
 import Navbar from '../components/Navbar';
 import PDFUpload from '../components/PDFUpload';
@@ -10,10 +10,69 @@ interface Project {
   name: string;
   filename: string;
   latex_code: string;
+  revision?: number;
   created_at: string;
   updated_at: string;
 }
 
+type Delta = [number, number, string][];
+
+// The single edited range between two texts, from their common prefix/suffix,
+// in UTF-16 offsets that never split a surrogate pair
+const diffRange = (oldText: string, newText: string) => {
+  let start = 0;
+  const maxStart = Math.min(oldText.length, newText.length);
+  while (start < maxStart && oldText[start] === newText[start]) {
+    start++;
+  }
+  let oldEnd = oldText.length;
+  let newEnd = newText.length;
+  while (oldEnd > start && newEnd > start && oldText[oldEnd - 1] === newText[newEnd - 1]) {
+    oldEnd--;
+    newEnd--;
+  }
+  if (start > 0 && /[\uD800-\uDBFF]/.test(oldText[start - 1])) {
+    start--;
+  }
+  if (oldEnd < oldText.length && /[\uDC00-\uDFFF]/.test(oldText[oldEnd])) {
+    oldEnd++;
+    newEnd++;
+  }
+  return { start, oldEnd, newEnd };
+};
+
+// Single-edit delta from the common prefix/suffix. Offsets are counted in
+// code points to match the backend's Python string indexing.
+const computeDelta = (oldText: string, newText: string): Delta => {
+  const { start, oldEnd, newEnd } = diffRange(oldText, newText);
+  const codePoints = (text: string) => Array.from(text).length;
+  const from = codePoints(oldText.slice(0, start));
+  const to = from + codePoints(oldText.slice(start, oldEnd));
+  return [[from, to, newText.slice(start, newEnd)]];
+};
+
+// Apply our edit of ``base`` on top of theirs; null when the two edits overlap
+const rebase = (base: string, ours: string, theirs: string): string | null => {
+  if (ours === base || ours === theirs) {
+    return theirs;
+  }
+  if (theirs === base) {
+    return ours;
+  }
+  const a = diffRange(base, ours);
+  const b = diffRange(base, theirs);
+  if (a.oldEnd <= b.start && a.oldEnd < b.oldEnd) {
+    // Our edit is before theirs: offsets in theirs are unchanged up to it
+    return theirs.slice(0, a.start) + ours.slice(a.start, a.newEnd) + theirs.slice(a.oldEnd);
+  }
+  if (b.oldEnd <= a.start && b.oldEnd < a.oldEnd) {
+    // Our edit is after theirs: shift it by the length their edit added
+    const shift = b.newEnd - b.oldEnd;
+    return theirs.slice(0, a.start + shift) + ours.slice(a.start, a.newEnd) + theirs.slice(a.oldEnd + shift);
+  }
+  return null;
+};
+
 interface DashboardProps {
   onLogout?: () => void;
   selectedProject?: Project | null;
@@ -21,18 +80,60 @@ interface DashboardProps {
   onViewProjects?: () => void;
 }
 
+const REFINE_POLL_MS = 3000;
+const MAX_REBASE_ATTEMPTS = 3;
+
 const Dashboard = ({ onLogout, selectedProject, onProjectSelect, onViewProjects }: DashboardProps) => {
   const [uploadedFile, setUploadedFile] = useState<File | null>(null);
   const [isProcessing, setIsProcessing] = useState(false);
   const [latexCode, setLatexCode] = useState<string>('');
   const [error, setError] = useState<string>('');
   const [currentProject, setCurrentProject] = useState<Project | null>(selectedProject || null);
+  // Last text and revision the server acknowledged, used as the base for deltas
+  const savedRef = useRef<{ revision: number; code: string } | null>(null);
+  const pendingCodeRef = useRef<string | null>(null);
+  const savingRef = useRef(false);
+  const [refineJobId, setRefineJobId] = useState<string | null>(null);
+  // Newer version from the server whose changes overlap unsaved edits; saving stops until resolved
+  const [conflict, setConflict] = useState<Project | null>(null);
+
+  // Progressive uploads start as a fast draft; swap in the refined version if it is still untouched
+  useEffect(() => {
+    if (!refineJobId || !currentProject) {
+      return;
+    }
+    const projectId = currentProject.id;
+    const timer = setInterval(async () => {
+      try {
+        const job = await (await fetch(`http://localhost:5001/api/jobs/${refineJobId}`)).json();
+        if (job.status !== 'done' && job.status !== 'failed') {
+          return;
+        }
+        setRefineJobId(null);
+        const saved = savedRef.current;
+        if (job.result?.refinement !== 'done' || !saved || saved.revision !== 1 || savingRef.current) {
+          return;
+        }
+        const data = await (await fetch(`http://localhost:5001/api/projects/${projectId}`)).json();
+        if (savedRef.current === saved && data.success) {
+          savedRef.current = { revision: data.project.revision, code: data.project.latex_code };
+          setLatexCode(data.project.latex_code);
+          setCurrentProject(data.project);
+        }
+      } catch (err) {
+        console.error('Error checking refinement:', err);
+      }
+    }, REFINE_POLL_MS);
+    return () => clearInterval(timer);
+  }, [refineJobId, currentProject?.id]);
 
   // Handle project selection
   useEffect(() => {
     if (selectedProject) {
       setCurrentProject(selectedProject);
       setLatexCode(selectedProject.latex_code);
+      savedRef.current = { revision: selectedProject.revision ?? 1, code: selectedProject.latex_code };
+      setConflict(null);
       // Create a mock file for the PDF viewer
       const mockFile = new File([], selectedProject.filename, { type: 'application/pdf' });
       setUploadedFile(mockFile);
@@ -48,7 +149,7 @@ const Dashboard = ({ onLogout, selectedProject, onProjectSelect, onViewProjects
       const formData = new FormData();
       formData.append('file', file);
       
-      const response = await fetch('http://localhost:5001/api/upload-pdf', {
+      const response = await fetch('http://localhost:5001/api/upload-pdf?progressive=1', {
         method: 'POST',
         body: formData,
       });
@@ -63,10 +164,14 @@ const Dashboard = ({ onLogout, selectedProject, onProjectSelect, onViewProjects
           name: data.filename.replace('.pdf', ''),
           filename: data.filename,
           latex_code: data.latex,
+          revision: data.revision,
           created_at: new Date().toISOString(),
           updated_at: new Date().toISOString()
         };
         setCurrentProject(newProject);
+        savedRef.current = { revision: data.revision ?? 1, code: data.latex };
+        setConflict(null);
+        setRefineJobId(data.refine_job_id ?? null);
       } else {
         setError(data.error || 'Failed to process PDF');
       }
@@ -84,27 +189,113 @@ const Dashboard = ({ onLogout, selectedProject, onProjectSelect, onViewProjects
     }
   };
 
+  const saveProject = async (projectId: string, submitted: string) => {
+    const saved = savedRef.current;
+    let code = submitted;
+    if (saved && saved.code === code) {
+      return;
+    }
+    
+    // Send only the edit against the last saved revision
+    let response = await fetch(`http://localhost:5001/api/projects/${projectId}`, {
+      method: saved ? 'PATCH' : 'PUT',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify(
+        saved
+          ? { base_revision: saved.revision, delta: computeDelta(saved.code, code) }
+          : { latex_code: code }
+      ),
+    });
+    
+    // Someone else saved in between: rebase our edit onto their revision, never overwrite it
+    let base = saved;
+    for (let attempt = 0; response.status === 409 && base && attempt < MAX_REBASE_ATTEMPTS; attempt++) {
+      // The conflict body only carries metadata; fetch the current text
+      const current = await (await fetch(`http://localhost:5001/api/projects/${projectId}`)).json();
+      if (!current.success) {
+        return;
+      }
+      const merged = rebase(base.code, code, current.project.latex_code);
+      if (merged === null) {
+        setConflict(current.project);
+        pendingCodeRef.current = null;
+        return;
+      }
+      base = { revision: current.project.revision, code: current.project.latex_code };
+      code = merged;
+      response = await fetch(`http://localhost:5001/api/projects/${projectId}`, {
+        method: 'PATCH',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ base_revision: base.revision, delta: computeDelta(base.code, code) }),
+      });
+    }
+    
+    if (response.ok) {
+      const data = await response.json();
+      savedRef.current = { revision: data.project.revision, code };
+      setCurrentProject(prev => ({ ...prev, ...data.project, latex_code: code }));
+      if (code !== submitted) {
+        // Show the merged text, carrying over any keystrokes typed since this save started
+        const pending = pendingCodeRef.current;
+        const editorCode = pending === null ? code : rebase(submitted, pending, code);
+        if (editorCode === null) {
+          setConflict({ ...data.project, latex_code: code });
+          pendingCodeRef.current = null;
+          return;
+        }
+        if (pending !== null) {
+          pendingCodeRef.current = editorCode;
+        }
+        setLatexCode(editorCode);
+      }
+    }
+  };
+
+  // Resolve an overlapping edit by taking the other version, or by saving ours on top of it
+  const resolveConflict = (keepMine: boolean) => {
+    if (!conflict) {
+      return;
+    }
+    savedRef.current = { revision: conflict.revision ?? 1, code: conflict.latex_code };
+    setConflict(null);
+    if (keepMine) {
+      queueSave(conflict.id, latexCode);
+    } else {
+      setLatexCode(conflict.latex_code);
+      setCurrentProject(conflict);
+    }
+  };
+
+  // Keep one save in flight and coalesce keystrokes that arrive meanwhile
+  const queueSave = async (projectId: string, newCode: string) => {
+    pendingCodeRef.current = newCode;
+    if (savingRef.current) {
+      return;
+    }
+    savingRef.current = true;
+    try {
+      while (pendingCodeRef.current !== null) {
+        const code = pendingCodeRef.current;
+        pendingCodeRef.current = null;
+        await saveProject(projectId, code);
+      }
+    } catch (err) {
+      console.error('Error updating project:', err);
+    } finally {
+      savingRef.current = false;
+    }
+  };
+
   const handleLatexChange = async (newCode: string) => {
     setLatexCode(newCode);
     
     // Update project if it exists
-    if (currentProject) {
-      try {
-        const response = await fetch(`http://localhost:5001/api/projects/${currentProject.id}`, {
-          method: 'PUT',
-          headers: {
-            'Content-Type': 'application/json',
-          },
-          body: JSON.stringify({ latex_code: newCode }),
-        });
-        
-        if (response.ok) {
-          const data = await response.json();
-          setCurrentProject(data.project);
-        }
-      } catch (err) {
-        console.error('Error updating project:', err);
-      }
+    if (currentProject && !conflict) {
+      await queueSave(currentProject.id, newCode);
     }
   };
 
@@ -244,10 +435,30 @@ const Dashboard = ({ onLogout, selectedProject, onProjectSelect, onViewProjects
             {/* LaTeX Viewer - Right Side */}
             <div className="w-full lg:w-1/2 bg-gray-900">
               <div className="h-full flex flex-col">
+                {conflict && (
+                  <div className="flex items-center justify-between gap-4 px-4 py-3 bg-yellow-100 text-yellow-900 text-sm">
+                    <span>This project was changed elsewhere and your edits overlap. Your changes are not being saved.</span>
+                    <div className="flex shrink-0 space-x-2">
+                      <button
+                        onClick={() => resolveConflict(false)}
+                        className="bg-blue-600 text-white px-3 py-1 rounded hover:bg-blue-700 transition-colors"
+                      >
+                        Load latest version
+                      </button>
+                      <button
+                        onClick={() => resolveConflict(true)}
+                        className="bg-white text-gray-900 px-3 py-1 rounded border border-gray-300 hover:bg-gray-50 transition-colors"
+                      >
+                        Keep mine
+                      </button>
+                    </div>
+                  </div>
+                )}
                 {/* LaTeX Content */}
                 <div className="flex-1 p-4 overflow-auto">
                                   <LaTeXViewer 
                   code={latexCode} 
+                  projectId={currentProject?.id}
                   onCodeChange={handleLatexChange}
                 />
                 </div>
@@ -11,6 +11,18 @@ interface Project {
   updated_at: string;
 }
 
+interface ProjectSummary {
+  id: string;
+  name: string;
+  filename: string;
+  created_at: string;
+  updated_at: string;
+  latex_size: number;
+  page_count: number | null;
+  original_pdf_sha256?: string;
+  compiled_pdf_sha256?: string;
+}
+
 interface ProjectsProps {
   onLogout?: () => void;
   onProjectSelect?: (project: Project) => void;
@@ -18,7 +30,8 @@ interface ProjectsProps {
 }
 
 const Projects = ({ onLogout, onProjectSelect, onViewDashboard }: ProjectsProps) => {
-  const [projects, setProjects] = useState<Project[]>([]);
+  const [projects, setProjects] = useState<ProjectSummary[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string>('');
 
@@ -26,14 +39,21 @@ const Projects = ({ onLogout, onProjectSelect, onViewDashboard }: ProjectsProps)
     loadProjects();
   }, []);
 
-  const loadProjects = async () => {
+  const loadProjects = async (cursor?: string) => {
     try {
-      setLoading(true);
-      const response = await fetch('http://localhost:5001/api/projects');
+      if (!cursor) {
+        setLoading(true);
+      }
+      const params = new URLSearchParams({ fields: 'summary', limit: '30' });
+      if (cursor) {
+        params.set('cursor', cursor);
+      }
+      const response = await fetch(`http://localhost:5001/api/projects?${params}`);
       const data = await response.json();
       
       if (response.ok && data.success) {
-        setProjects(data.projects);
+        setProjects(cursor ? [...projects, ...data.projects] : data.projects);
+        setNextCursor(data.next_cursor);
       } else {
         setError(data.error || 'Failed to load projects');
       }
@@ -67,6 +87,22 @@ const Projects = ({ onLogout, onProjectSelect, onViewDashboard }: ProjectsProps)
     }
   };
 
+  const handleOpenProject = async (projectId: string) => {
+    try {
+      const response = await fetch(`http://localhost:5001/api/projects/${projectId}`);
+      const data = await response.json();
+      
+      if (response.ok && data.success) {
+        onProjectSelect?.(data.project);
+      } else {
+        setError(data.error || 'Failed to open project');
+      }
+    } catch (err) {
+      setError('Network error while opening project');
+      console.error('Error opening project:', err);
+    }
+  };
+
   const formatDate = (dateString: string) => {
     return new Date(dateString).toLocaleDateString('en-US', {
       year: 'numeric',
@@ -152,7 +188,7 @@ const Projects = ({ onLogout, onProjectSelect, onViewDashboard }: ProjectsProps)
               </h2>
               <p className="text-red-600 mb-4">{error}</p>
               <button
-                onClick={loadProjects}
+                onClick={() => loadProjects()}
                 className="bg-blue-600 text-white px-6 py-2 rounded-lg hover:bg-blue-700 transition-colors"
               >
                 Try Again
@@ -196,6 +232,15 @@ const Projects = ({ onLogout, onProjectSelect, onViewDashboard }: ProjectsProps)
                       transition={{ duration: 0.6, delay: index * 0.1 }}
                       className="bg-white rounded-xl shadow-lg hover:shadow-xl transition-shadow duration-300 overflow-hidden"
                     >
+                      {(project.original_pdf_sha256 || project.compiled_pdf_sha256) && (
+                        <img
+                          src={`http://localhost:5001/api/previews/${project.original_pdf_sha256 || project.compiled_pdf_sha256}/thumbnail.png`}
+                          alt={`${project.name} preview`}
+                          loading="lazy"
+                          className="w-full h-40 object-cover object-top bg-gray-100 border-b border-gray-100"
+                          onError={(e) => { e.currentTarget.style.display = 'none'; }}
+                        />
+                      )}
                       <div className="p-6">
                         <div className="flex items-start justify-between mb-4">
                           <div className="flex-1">
@@ -227,7 +272,7 @@ const Projects = ({ onLogout, onProjectSelect, onViewDashboard }: ProjectsProps)
                         
                         <div className="space-y-3">
                           <button
-                            onClick={() => onProjectSelect?.(project)}
+                            onClick={() => handleOpenProject(project.id)}
                             className="w-full bg-blue-600 text-white py-2 px-4 rounded-lg hover:bg-blue-700 transition-colors font-medium"
                           >
                             Open Project
@@ -238,6 +283,16 @@ const Projects = ({ onLogout, onProjectSelect, onViewDashboard }: ProjectsProps)
                   ))}
                 </div>
               )}
+              {nextCursor && (
+                <div className="text-center">
+                  <button
+                    onClick={() => loadProjects(nextCursor)}
+                    className="bg-white text-blue-600 border border-blue-600 px-6 py-2 rounded-lg hover:bg-blue-50 transition-colors"
+                  >
+                    Load More
+                  </button>
+                </div>
+              )}
             </motion.div>
           )}
         </div>